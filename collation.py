@@ -0,0 +1,75 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+_DIGITS = re.compile(r"\d+")
+_HAN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+
+# 排序键中的标记字符：数字排在所有字符之前，汉字排在拉丁字母之后
+_NUMBER_MARK = "\x01"
+_SYLLABLE_END = "\x02"  # 拼音音节结束，让 "xi an" 排在 "xian" 前面
+_HAN_MARK = "一"
+_TIE_BREAK = "\x00"
+
+
+@lru_cache(maxsize=None)
+def han_pinyin(char: str) -> Optional[str]:
+    # 单个汉字的拼音(不带声调)；没有安装 pypinyin 时返回 None
+    if lazy_pinyin is None:
+        return None
+    spelled = lazy_pinyin(char)
+    return spelled[0] if spelled and spelled[0] != char else None
+
+
+@lru_cache(maxsize=None)
+def _han_key(char: str) -> str:
+    spelled = han_pinyin(char)
+    if spelled is None:
+        # 没有拼音数据时按 GBK 编码排序，一级汉字在 GBK 中就是按拼音排列的
+        try:
+            spelled = char.encode("gbk").decode("latin-1")
+        except UnicodeEncodeError:
+            spelled = char
+    return _HAN_MARK + spelled + _SYLLABLE_END
+
+
+def _number_key(match: re.Match) -> str:
+    # 数字按数值比较：先比位数再比各位，"第2章" 排在 "第10章" 前面
+    digits = match.group().lstrip("0") or "0"
+    return _NUMBER_MARK + chr(0x20 + len(digits)) + digits
+
+
+def _han_run_key(match: re.Match) -> str:
+    return "".join(map(_han_key, match.group()))
+
+
+def natural_key(name: str) -> str:
+    # 文件名的排序键：自然数字顺序、忽略大小写、汉字按拼音；
+    # 整个键是一个字符串，排序时只做 C 层面的字符串比较
+    folded = name.casefold()
+    key = _HAN.sub(_han_run_key, _DIGITS.sub(_number_key, folded))
+    # 排序键相同(如 "a01" 和 "a1")时按原始名称区分，保证顺序确定
+    return key + _TIE_BREAK + folded + _TIE_BREAK + name
+
+
+def _han_spelling(match: re.Match, initials: bool) -> str:
+    parts = []
+    for char in match.group():
+        spelled = han_pinyin(char)
+        parts.append(char if spelled is None else spelled[0] if initials else spelled)
+    return "".join(parts)
+
+
+def pinyin_full(text: str) -> str:
+    # "报告单2024" -> "baogaodan2024"，没有拼音数据时原样返回
+    return _HAN.sub(lambda match: _han_spelling(match, False), text)
+
+
+def pinyin_initials(text: str) -> str:
+    # "报告单2024" -> "bgd2024"
+    return _HAN.sub(lambda match: _han_spelling(match, True), text)
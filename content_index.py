@@ -0,0 +1,239 @@
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_index import _chunks
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+CONTENT_EXTENSIONS = ['.pdf', '.docx', '.xlsx', '.txt']
+
+# 每个文件最多保存的文字数，超大的文件只索引开头部分，提取进程的内存也不会无限增长
+MAX_TEXT_CHARS = 200_000
+# 三元组分词，少于 3 个字的搜索词无法使用索引
+MIN_TERM_LENGTH = 3
+SEARCH_LIMIT = 1000
+# 提取进程处理这么多个文件后重新启动，释放解析大文件时占用的内存
+TASKS_PER_WORKER = 50
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# 每积累这么多个文件写入一次数据库
+COMMIT_BATCH = 50
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ---------------------------------------------------------------- 文字提取(在子进程中运行)
+
+def extract_text(file_path: str) -> str:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.pdf':
+        parts = _pdf_text(file_path)
+    elif ext == '.docx':
+        parts = _docx_text(file_path)
+    elif ext == '.xlsx':
+        parts = _xlsx_text(file_path)
+    elif ext == '.txt':
+        parts = [_plain_text(file_path)]
+    else:
+        return ""
+    return _WHITESPACE.sub(" ", " ".join(_limited(parts))).strip()[:MAX_TEXT_CHARS]
+
+
+def _limited(parts: Iterable[str]) -> Iterator[str]:
+    # 凑够 MAX_TEXT_CHARS 个字就不再继续解析
+    total = 0
+    for part in parts:
+        if part:
+            yield part
+            total += len(part)
+            if total >= MAX_TEXT_CHARS:
+                return
+
+
+def _pdf_text(file_path: str) -> Iterator[str]:
+    if PdfReader is None:
+        return
+    for page in PdfReader(file_path).pages:
+        yield page.extract_text() or ""
+
+
+def _docx_text(file_path: str) -> Iterator[str]:
+    from docx import Document
+
+    document = Document(file_path)
+    for paragraph in document.paragraphs:
+        yield paragraph.text
+    for table in document.tables:
+        for row in table.rows:
+            yield " ".join(cell.text for cell in row.cells)
+
+
+def _xlsx_text(file_path: str) -> Iterator[str]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            for row in worksheet.iter_rows(values_only=True):
+                yield " ".join(str(value) for value in row if value is not None)
+    finally:
+        workbook.close()
+
+
+def _plain_text(file_path: str) -> str:
+    # 中文文本文件常见 UTF-8 和 GBK 两种编码
+    with open(file_path, 'rb') as f:
+        data = f.read(MAX_TEXT_CHARS * 4)
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return data.decode("utf-8", "replace")
+
+
+def _extract(file_path: str) -> Optional[Tuple[str, int, float, str]]:
+    # 返回 (路径, 大小, 修改时间, 文字)；以提取前 stat 到的版本为准，文件打不开时返回 None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    try:
+        text = extract_text(file_path)
+    except Exception:
+        text = ""  # 损坏或加密的文件记为没有文字，文件变化之前不再重试
+    return file_path, stat.st_size, stat.st_mtime, text
+
+
+# ---------------------------------------------------------------- 索引
+
+def _split_query(text: str) -> Tuple[List[str], List[str], List[str]]:
+    # 搜索框文字 -> (能用索引的词, 太短的词, 扩展名)，和文件名搜索的写法一致
+    terms = text.casefold().split()
+    extensions = [term for term in terms if term.startswith(".") and len(term) > 1]
+    words = [term for term in terms if term not in extensions]
+    return ([word for word in words if len(word) >= MIN_TERM_LENGTH],
+            [word for word in words if len(word) < MIN_TERM_LENGTH], extensions)
+
+
+def _like_pattern(word: str) -> str:
+    return "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class ContentIndex:
+    # 文件内容的全文索引(SQLite FTS5，三元组分词，中文也能按任意片段搜索)
+    # 按路径记录提取时的 (大小, 修改时间)，文件变化后重新提取
+    def __init__(self, db_path: str = "content_index.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS contents USING fts5(body, tokenize='trigram');
+        """)
+        self._conn.commit()
+
+    def stale(self, files: List[Tuple[str, int, float]]) -> List[str]:
+        # files: (路径, 大小, 修改时间)；返回还没有索引或已经变化的文件
+        known = {}
+        with self._lock:
+            for chunk in _chunks([os.path.normpath(path) for path, _, _ in files]):
+                placeholders = ",".join("?" * len(chunk))
+                for path, size, mtime in self._conn.execute(
+                        f"SELECT path, size, mtime FROM documents WHERE path IN ({placeholders})", chunk):
+                    known[path] = (size, mtime)
+        return [path for path, size, mtime in files if known.get(os.path.normpath(path)) != (size, mtime)]
+
+    def store(self, rows: List[Tuple[str, int, float, str]]):
+        # rows: (路径, 大小, 修改时间, 文字)
+        if not rows:
+            return
+        with self._lock:
+            for path, size, mtime, text in rows:
+                path = os.path.normpath(path)
+                doc_id = self._conn.execute("""
+                    INSERT INTO documents (path, size, mtime) VALUES (?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime
+                    RETURNING id
+                """, (path, size, mtime)).fetchone()[0]
+                self._conn.execute("DELETE FROM contents WHERE rowid = ?", (doc_id,))
+                if text:
+                    self._conn.execute("INSERT INTO contents (rowid, body) VALUES (?, ?)", (doc_id, text))
+            self._conn.commit()
+
+    def remove(self, file_paths: Iterable[str]):
+        file_paths = [os.path.normpath(p) for p in file_paths]
+        if not file_paths:
+            return
+        with self._lock:
+            for chunk in _chunks(file_paths):
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(f"DELETE FROM contents WHERE rowid IN "
+                                   f"(SELECT id FROM documents WHERE path IN ({placeholders}))", chunk)
+                self._conn.execute(f"DELETE FROM documents WHERE path IN ({placeholders})", chunk)
+            self._conn.commit()
+
+    def search(self, text: str, root: str, limit: int = SEARCH_LIMIT) -> Dict[str, str]:
+        # 返回 root 下内容包含所有搜索词的文件：路径 -> 摘要(命中处用【】标出)
+        # 至少要有一个 3 个字以上的词走索引，太短的词只在索引命中的文件里逐个确认
+        words, short_words, extensions = _split_query(text)
+        if not words:
+            return {}
+        query = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+        prefix = os.path.normpath(root).rstrip(os.sep) + os.sep
+        conditions = "".join(" AND contents.body LIKE ? ESCAPE '\\'" for _ in short_words)
+        params = [query, prefix, prefix[:-1] + chr(ord(os.sep) + 1)] + [_like_pattern(w) for w in short_words]
+        with self._lock:
+            try:
+                rows = self._conn.execute(f"""
+                    SELECT documents.path, snippet(contents, 0, '【', '】', '…', 24)
+                    FROM contents JOIN documents ON documents.id = contents.rowid
+                    WHERE contents MATCH ? AND documents.path >= ? AND documents.path < ?{conditions}
+                    ORDER BY rank LIMIT ?
+                """, params + [limit]).fetchall()
+            except sqlite3.OperationalError:
+                return {}
+        if extensions:
+            rows = [row for row in rows if os.path.splitext(row[0])[1].lower() in extensions]
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def index_contents(index: ContentIndex, file_paths: List[str], cancel_event: threading.Event,
+                   max_workers: int = DEFAULT_WORKERS) -> Iterator[int]:
+    # 在进程池中提取文字(解析 PDF/Office 是 CPU 密集的)，批量写入索引，每写入一批产出一次数量
+    # 同时提交的文件不超过进程数的两倍，结果不会在内存中堆积
+    max_in_flight = max_workers * 2
+    pending = list(reversed(file_paths))
+    running = set()
+    rows = []
+    executor = ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=TASKS_PER_WORKER)
+    try:
+        while pending or running:
+            if cancel_event.is_set():
+                return
+            while pending and len(running) < max_in_flight:
+                running.add(executor.submit(_extract, pending.pop()))
+            done, running = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+            rows.extend(row for row in (future.result() for future in done) if row is not None)
+            if len(rows) >= COMMIT_BATCH or (rows and not pending and not running):
+                index.store(rows)
+                yield len(rows)
+                rows = []
+    finally:
+        executor.shutdown(wait=not cancel_event.is_set(), cancel_futures=True)
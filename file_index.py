@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 文件头标识 -> 实际类型，用来识别扩展名和内容不符的文件
+_MAGIC = [
+    (b"%PDF", "pdf"),
+    (b"PK\x03\x04", "zip"),  # docx/xlsx 等 Office Open XML
+    (b"\xd0\xcf\x11\xe0", "ole"),  # doc/xls 等旧版 Office
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG", "png"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"GIF8", "gif"),
+    (b"BM", "bmp"),
+]
+
+# SQLite 单条语句的参数个数有上限
+_MAX_PARAMS = 500
+
+
+def sniff_type(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        head = f.read(8)
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    return "text" if head and b"\x00" not in head else "unknown"
+
+
+def _chunks(items: List, size: int = _MAX_PARAMS):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class FileIndex:
+    # 扫描过的文件的元数据索引，按路径存储，(大小, 修改时间) 不变时派生数据(页数等)继续有效
+    DERIVED_COLUMNS = ("kind", "pages")
+
+    def __init__(self, db_path: str = "file_index.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL 模式下扫描线程写入时界面线程仍然可以读取
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                kind TEXT,
+                pages INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS files_dir_name ON files (dir, name COLLATE NOCASE);
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _scope(root: str, recursive: bool) -> Tuple[str, list]:
+        # 子文件夹用范围查询，可以走 dir 上的索引
+        root = os.path.normpath(root)
+        if not recursive:
+            return "dir = ?", [root]
+        prefix = root.rstrip(os.sep) + os.sep
+        return "(dir = ? OR (dir >= ? AND dir < ?))", [root, prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+
+    def folder_records(self, root: str, recursive: bool = False) -> List[Dict]:
+        # 返回索引中该文件夹下的文件记录，'name' 为相对 root 的路径，按路径排序
+        where, params = self._scope(root, recursive)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, ext, size, mtime, pages FROM files WHERE {where} ORDER BY path COLLATE NOCASE",
+                params).fetchall()
+        root = os.path.normpath(root)
+        return [{
+            'name': os.path.relpath(path, root),
+            'ext': ext,
+            'size': size,
+            'mtime': mtime,
+            'path': path,
+            'pages': pages
+        } for path, ext, size, mtime, pages in rows]
+
+    def sync(self, records: List[Dict]) -> List[Dict]:
+        # 写入扫描结果，返回新增或 (大小, 修改时间) 变化的记录
+        if not records:
+            return []
+        known = {}
+        with self._lock:
+            for chunk in _chunks([os.path.normpath(r['path']) for r in records]):
+                placeholders = ",".join("?" * len(chunk))
+                for path, size, mtime in self._conn.execute(
+                        f"SELECT path, size, mtime FROM files WHERE path IN ({placeholders})", chunk):
+                    known[path] = (size, mtime)
+
+            changed = [r for r in records if known.get(os.path.normpath(r['path'])) != (r['size'], r['mtime'])]
+            if changed:
+                # 文件变化后页数等派生数据一并作废
+                self._conn.executemany("""
+                    INSERT INTO files (path, dir, name, ext, size, mtime) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(path) DO UPDATE SET
+                        size = excluded.size, mtime = excluded.mtime,
+                        kind = NULL, pages = NULL
+                """, [self._row(r['path'], r['size'], r['mtime']) for r in changed])
+                self._conn.commit()
+        return changed
+
+    @staticmethod
+    def _row(file_path: str, size: int, mtime: float):
+        file_path = os.path.normpath(file_path)
+        name = os.path.basename(file_path)
+        return (file_path, os.path.dirname(file_path), name, os.path.splitext(name)[1].lower(), size, mtime)
+
+    def remove(self, file_paths: Iterable[str]):
+        file_paths = [os.path.normpath(p) for p in file_paths]
+        if not file_paths:
+            return
+        with self._lock:
+            for chunk in _chunks(file_paths):
+                self._conn.execute(f"DELETE FROM files WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            self._conn.commit()
+
+    def get_pages(self, file_path: str, size: int, mtime: float) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages FROM files WHERE path = ? AND size = ? AND mtime = ?",
+                (os.path.normpath(file_path), size, mtime)).fetchone()
+        return row[0] if row else None
+
+    def set_pages(self, rows: List[Tuple[str, int, float, int, Optional[str]]]):
+        # rows: (路径, 大小, 修改时间, 页数, 实际类型)
+        self._set_derived(("pages", "kind"), rows)
+
+    def _set_derived(self, columns: Tuple[str, ...], rows: List[tuple]):
+        # 以调用方 stat 到的 (大小, 修改时间) 为准：文件已变化时其他派生数据作废，
+        # 索引中还没有的文件同时补上基本信息
+        if not rows:
+            return
+        params = [self._row(row[0], row[1], row[2]) + tuple(row[3:]) for row in rows]
+        assignments = [f"{column} = excluded.{column}" for column in columns]
+        assignments += [f"{column} = CASE WHEN size = excluded.size AND mtime = excluded.mtime THEN {column} END"
+                        for column in self.DERIVED_COLUMNS if column not in columns]
+        with self._lock:
+            self._conn.executemany(f"""
+                INSERT INTO files (path, dir, name, ext, size, mtime, {", ".join(columns)})
+                VALUES ({", ".join("?" * len(params[0]))})
+                ON CONFLICT(path) DO UPDATE SET {", ".join(assignments)},
+                    size = excluded.size, mtime = excluded.mtime
+            """, params)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
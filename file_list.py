@@ -0,0 +1,676 @@
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from PyQt6.QtCore import (Qt, QAbstractItemModel, QAbstractProxyModel, QAbstractTableModel, QModelIndex,
+                          QPersistentModelIndex, pyqtSignal)
+
+import pdf_tools
+from collation import natural_key
+from file_scanner import _compile_patterns
+
+(COLUMN_CHECK, COLUMN_NAME, COLUMN_EXT, COLUMN_PAPER, COLUMN_ORIENTATION, COLUMN_PAGE_RANGE,
+ COLUMN_COLOR, COLUMN_SIDES, COLUMN_COPIES, COLUMN_PREVIEW) = range(10)
+
+HEADERS = ["", "文件名", "格式", "纸张", "方向", "页面范围", "颜色", "单双面", "份数", ""]
+COLUMN_WIDTHS = [40, 250, 80, 100, 100, 120, 100, 100, 100, 70]
+
+# 下拉选择的列及可选项
+CHOICES = {
+    COLUMN_PAPER: ["A4", "A3", "B5", "Letter", "Legal"],
+    COLUMN_ORIENTATION: ["纵向", "横向"],
+    COLUMN_COLOR: ["彩色", "黑白"],
+    COLUMN_SIDES: ["单面", "双面长边", "双面短边"],
+}
+
+# 可编辑的列 -> FileEntry 字段
+FIELDS = {
+    COLUMN_PAPER: 'paper_size',
+    COLUMN_ORIENTATION: 'orientation',
+    COLUMN_PAGE_RANGE: 'page_range',
+    COLUMN_COLOR: 'color_mode',
+    COLUMN_SIDES: 'sides_option',
+    COLUMN_COPIES: 'copies',
+}
+
+# 页面范围格式错误时为 True
+INVALID_ROLE = Qt.ItemDataRole.UserRole + 10
+SNIPPET_ROLE = Qt.ItemDataRole.UserRole + 11  # 按内容搜索到的文件显示命中处的摘要
+PAGE_RANGE_HINT = "输入格式：1-3,5,7-9"
+
+
+@dataclass(eq=False, slots=True)
+class FileEntry:
+    # 列表中的一个文件及它的打印设置；10 万个文件时每行只占一个小对象
+    name: str  # 相对所选文件夹的路径
+    ext: str
+    size: int
+    mtime: float
+    path: str
+    pages: Optional[int] = None  # 未统计时为 None
+    sort_name: str = ""  # 名称的排序键，创建时计算一次
+    checked: bool = False
+    paper_size: str = "A4"
+    orientation: str = "纵向"
+    page_range: str = ""
+    color_mode: str = "彩色"
+    sides_option: str = "单面"
+    copies: int = 1
+    page_range_error: Optional[str] = None
+
+    @classmethod
+    def from_record(cls, record: Dict) -> 'FileEntry':
+        return cls(record['name'], record['ext'], record['size'], record.get('mtime', 0.0), record['path'],
+                   record.get('pages'), natural_key(record['name']))
+
+    def same_record(self, record: Dict) -> bool:
+        return self.path == record['path'] and self.size == record['size'] and \
+            self.mtime == record.get('mtime', 0.0)
+
+    def update_record(self, record: Dict):
+        if self.name != record['name']:
+            self.sort_name = natural_key(record['name'])
+        self.name = record['name']
+        self.ext = record['ext']
+        self.size = record['size']
+        self.mtime = record.get('mtime', 0.0)
+        self.path = record['path']
+        self.pages = record.get('pages')
+
+
+def _pages_key(entry: FileEntry) -> int:
+    return -1 if entry.pages is None else entry.pages
+
+
+# 可排序的字段 -> 取排序键的函数
+SORT_FIELDS = {
+    'name': attrgetter('sort_name'),
+    'ext': attrgetter('ext'),
+    'size': attrgetter('size'),
+    'mtime': attrgetter('mtime'),
+    'pages': _pages_key,
+}
+
+# 排序方式：((字段, 是否降序), ...)，前面的字段优先
+SortSpec = Tuple[Tuple[str, bool], ...]
+DEFAULT_SORT: SortSpec = (('name', False),)
+# 一批新行插入的位置超过这么多处时改为整体重新排列
+MAX_INSERT_GROUPS = 8
+
+
+class _Descending:
+    # 组合排序键中降序的部分，只在插入时二分查找用到
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def normalize_sort(spec: Iterable[Tuple[str, bool]]) -> SortSpec:
+    # 最后总是按名称排序，名称唯一，顺序因此完全确定
+    spec = tuple((field, bool(descending)) for field, descending in spec if field in SORT_FIELDS)
+    if not any(field == 'name' for field, _ in spec):
+        spec += DEFAULT_SORT
+    return spec
+
+
+def sort_entries(entries: Iterable[FileEntry], spec: SortSpec) -> List[FileEntry]:
+    # 从次要字段到主要字段依次做稳定排序，每一趟只比较一种简单的键
+    entries = list(entries)
+    for field, descending in reversed(spec):
+        entries.sort(key=SORT_FIELDS[field], reverse=descending)
+    return entries
+
+
+@dataclass
+class SelectionFilter:
+    # 按条件批量选择文件，各个条件同时满足，留空的条件不限
+    extensions: List[str] = field(default_factory=list)
+    patterns: List[str] = field(default_factory=list)  # 和扫描规则的写法相同，匹配文件名或相对路径
+    min_size: int = 0
+    max_size: Optional[int] = None
+    modified_after: Optional[float] = None
+    modified_before: Optional[float] = None
+
+    def __post_init__(self):
+        self._extensions = {ext.lower() if ext.startswith(".") else "." + ext.lower() for ext in self.extensions}
+        self._path_regex, self._name_regex = _compile_patterns(self.patterns)
+
+    def __call__(self, entry: FileEntry) -> bool:
+        if self._extensions and entry.ext not in self._extensions:
+            return False
+        if entry.size < self.min_size or (self.max_size is not None and entry.size > self.max_size):
+            return False
+        if (self.modified_after is not None and entry.mtime < self.modified_after) or \
+                (self.modified_before is not None and entry.mtime >= self.modified_before):
+            return False
+        if self.patterns:
+            name = entry.name.lower()
+            return bool((self._name_regex and self._name_regex.match(os.path.basename(name))) or
+                        (self._path_regex and self._path_regex.match(name.replace(os.sep, "/"))))
+        return True
+
+
+class FileListModel(QAbstractTableModel):
+    checked_count_changed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: List[FileEntry] = []
+        self._by_name: Dict[str, FileEntry] = {}
+        self.checked_count = 0
+        # 行始终按 _sort 排列；用过的排序方式的结果缓存起来，行没有变化时切换回去不用重新排序
+        self._sort: SortSpec = DEFAULT_SORT
+        self._order_cache: Dict[SortSpec, List[FileEntry]] = {}
+
+    # ------------------------------------------------------------ Qt 接口
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        column = index.column()
+        if column == COLUMN_CHECK:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        elif column in FIELDS:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.EditRole:
+            if column == COLUMN_NAME:
+                return entry.name
+            if column == COLUMN_EXT:
+                return entry.ext[1:].upper()
+            if column in FIELDS:
+                return getattr(entry, FIELDS[column])
+            if column == COLUMN_PREVIEW:
+                return "预览"
+        elif role == Qt.ItemDataRole.CheckStateRole and column == COLUMN_CHECK:
+            return Qt.CheckState.Checked if entry.checked else Qt.CheckState.Unchecked
+        elif role == Qt.ItemDataRole.ToolTipRole:
+            if column == COLUMN_NAME:
+                return entry.name
+            if column == COLUMN_PAGE_RANGE:
+                return entry.page_range_error or PAGE_RANGE_HINT
+        elif role == INVALID_ROLE:
+            return column == COLUMN_PAGE_RANGE and entry.page_range_error is not None
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid():
+            return False
+        entry = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.CheckStateRole and column == COLUMN_CHECK:
+            self._set_checked(entry, Qt.CheckState(value) == Qt.CheckState.Checked)
+        elif role == Qt.ItemDataRole.EditRole and column in FIELDS:
+            if column == COLUMN_PAGE_RANGE:
+                # 输入时只检查格式，页码是否越界在打印时按实际页数校验
+                value = value.strip()
+                try:
+                    pdf_tools.parse_page_range(value)
+                    entry.page_range_error = None
+                except pdf_tools.PageRangeError as e:
+                    entry.page_range_error = str(e)
+            setattr(entry, FIELDS[column], value)
+        else:
+            return False
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    # ------------------------------------------------------------ 增删改
+
+    def entry(self, row: int) -> FileEntry:
+        return self._rows[row]
+
+    def entries(self) -> List[FileEntry]:
+        return self._rows
+
+    def find(self, name: str) -> Optional[FileEntry]:
+        return self._by_name.get(name)
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._by_name = {}
+        self._order_cache.clear()
+        self.endResetModel()
+        self._set_checked_count(0)
+
+    def add_records(self, records: Iterable[Dict]) -> int:
+        # 已经在列表中的文件只更新文件信息(保留选中状态和打印设置)
+        new_entries = []
+        for record in records:
+            entry = self._by_name.get(record['name'])
+            if entry is None:
+                entry = FileEntry.from_record(record)
+                self._by_name[entry.name] = entry
+                new_entries.append(entry)
+            elif not entry.same_record(record):
+                entry.update_record(record)
+                self._reposition(entry)
+        if new_entries:
+            self._insert_sorted(new_entries)
+        return len(new_entries)
+
+    def _insert_sorted(self, entries: List[FileEntry]):
+        # 新行先排好序，再二分查找各自在现有行中的位置，插到同一位置的行一次插入
+        self._order_cache.clear()
+        entries = sort_entries(entries, self._sort)
+        key = self._sort_key()
+        groups = []
+        position = 0
+        for entry in entries:
+            position = bisect_right(self._rows, key(entry), lo=position, key=key)
+            if groups and groups[-1][0] == position:
+                groups[-1][1].append(entry)
+            else:
+                groups.append((position, [entry]))
+        if len(groups) <= MAX_INSERT_GROUPS:
+            # 从后往前插入，前面的位置不受影响
+            for position, group in reversed(groups):
+                self.beginInsertRows(QModelIndex(), position, position + len(group) - 1)
+                self._rows[position:position] = group
+                self.endInsertRows()
+            return
+
+        # 新行分散在很多位置时，逐段插入会让代理模型和视图每次都更新整个映射；
+        # 改为先一次追加到末尾，再整体重新排列
+        rows = []
+        start = 0
+        for position, group in groups:
+            rows += self._rows[start:position]
+            rows += group
+            start = position
+        rows += self._rows[start:]
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        self._rows.extend(entries)
+        self.endInsertRows()
+        self._apply_order(rows)
+
+    def _reposition(self, entry: FileEntry):
+        # 排序键变化后把这一行移到新的位置
+        self._order_cache.clear()
+        row = self._rows.index(entry)
+        del self._rows[row]
+        key = self._sort_key()
+        position = bisect_right(self._rows, key(entry), key=key)
+        self._rows.insert(row, entry)
+        if position != row:
+            # beginMoveRows 的目标位置按移动前的行号计算
+            destination = position if position < row else position + 1
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination)
+            del self._rows[row]
+            self._rows.insert(position, entry)
+            self.endMoveRows()
+        self.dataChanged.emit(self.index(position, 0), self.index(position, len(HEADERS) - 1))
+
+    def _sort_key(self):
+        # 二分查找用的组合键；只按一个字段升序时(默认按名称)直接用字段本身
+        if len(self._sort) == 1 and not self._sort[0][1]:
+            return SORT_FIELDS[self._sort[0][0]]
+        getters = [SORT_FIELDS[field] if not descending else
+                   (lambda entry, get=SORT_FIELDS[field]: _Descending(get(entry)))
+                   for field, descending in self._sort]
+        return lambda entry: tuple([get(entry) for get in getters])
+
+    def remove_names(self, names: Iterable[str]):
+        entries = [self._by_name.pop(name) for name in names if name in self._by_name]
+        if not entries:
+            return
+        self._order_cache.clear()
+        # 删除很多行时一次遍历找出行号，少量时直接查找
+        if len(entries) > 32:
+            removed = set(map(id, entries))
+            rows = [i for i, entry in enumerate(self._rows) if id(entry) in removed]
+        else:
+            rows = sorted(self._rows.index(entry) for entry in entries)
+
+        # 连续的行一次删除，从后往前删行号不会变
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        unchecked = sum(1 for entry in entries if entry.checked)
+        if unchecked:
+            self._set_checked_count(self.checked_count - unchecked)
+
+    def rename(self, old_name: str, record: Dict) -> bool:
+        # 重命名时保留原来的选中状态和打印设置
+        entry = self._by_name.get(old_name)
+        if entry is None:
+            return False
+        if record['name'] in self._by_name and record['name'] != old_name:
+            self.remove_names([record['name']])  # 覆盖了列表中已有的文件
+        del self._by_name[old_name]
+        entry.update_record(record)
+        self._by_name[entry.name] = entry
+        self._reposition(entry)
+        return True
+
+    def set_pages(self, counts: Dict[str, int]):
+        # counts: 路径 -> 页数；按页数排序时重新排列
+        changed = False
+        for entry in self._rows:
+            pages = counts.get(entry.path)
+            if pages is not None and pages != entry.pages:
+                entry.pages = pages
+                changed = True
+        if not changed:
+            return
+        # 缓存中按页数排序的结果都已过期，按其他字段排序的不受影响
+        for spec in [spec for spec in self._order_cache if any(f == 'pages' for f, _ in spec)]:
+            del self._order_cache[spec]
+        if self.sorts_by('pages'):
+            self._apply_order(sort_entries(self._rows, self._sort))
+
+    # ------------------------------------------------------------ 排序
+
+    @property
+    def sort_spec(self) -> SortSpec:
+        return self._sort
+
+    def sorts_by(self, field: str) -> bool:
+        return any(f == field for f, _ in self._sort)
+
+    def sort_by(self, spec: Iterable[Tuple[str, bool]]):
+        spec = normalize_sort(spec)
+        if spec == self._sort:
+            return
+        self._order_cache[self._sort] = self._rows
+        rows = self._order_cache.get(spec)
+        if rows is None:
+            reverse = tuple((field, not descending) for field, descending in spec)
+            if reverse in self._order_cache:
+                # 名称唯一，所有字段都反向时顺序正好反过来
+                rows = self._order_cache[reverse][::-1]
+            elif spec[-1] == DEFAULT_SORT[0] and DEFAULT_SORT in self._order_cache:
+                # 从按名称排好的顺序开始，只需要再按前面的字段排
+                rows = sort_entries(self._order_cache[DEFAULT_SORT], spec[:-1])
+            else:
+                rows = sort_entries(self._rows, spec)
+            self._order_cache[spec] = rows
+        self._sort = spec
+        self._apply_order(list(rows))
+
+    def _apply_order(self, rows: List[FileEntry]):
+        # 整体重新排列，更新视图中正在编辑等的持久索引
+        hint = QAbstractItemModel.LayoutChangeHint.VerticalSortHint
+        self.layoutAboutToBeChanged.emit([], hint)
+        persistent = self.persistentIndexList()
+        moved = [(self._rows[index.row()], index.column()) for index in persistent]
+        self._rows = rows
+        if persistent:
+            positions = {id(entry): row for row, entry in enumerate(rows)}
+            self.changePersistentIndexList(persistent, [self.index(positions[id(entry)], column)
+                                                        for entry, column in moved])
+        self.layoutChanged.emit([], hint)
+
+    # ------------------------------------------------------------ 选中状态
+
+    def checked_entries(self) -> List[FileEntry]:
+        return [entry for entry in self._rows if entry.checked]
+
+    def set_all_checked(self, checked: bool):
+        for entry in self._rows:
+            entry.checked = checked
+        if self._rows:
+            self.dataChanged.emit(self.index(0, COLUMN_CHECK), self.index(len(self._rows) - 1, COLUMN_CHECK),
+                                  [Qt.ItemDataRole.CheckStateRole])
+        self._set_checked_count(len(self._rows) if checked else 0)
+
+    # 批量操作都只遍历一遍，最后发一次 dataChanged 和一次数量变化，不会每行触发一次界面更新
+    # rows 为 None 时作用于所有行，否则只作用于给定的行(如搜索结果)
+
+    def set_checked_where(self, predicate: Callable[[FileEntry], bool], checked: bool = True,
+                          rows: Optional[Iterable[int]] = None, only: bool = False) -> int:
+        # 符合条件的行设为 checked，only 为 True 时其他行同时设为相反状态；返回状态变化的行数
+        return self._update_checked(
+            rows, lambda entry: checked if predicate(entry) else (not checked if only else entry.checked))
+
+    def invert_checked(self, rows: Optional[Iterable[int]] = None) -> int:
+        return self._update_checked(rows, lambda entry: not entry.checked)
+
+    def set_rows_checked(self, rows: Iterable[int], checked: bool) -> int:
+        return self._update_checked(rows, lambda entry: checked)
+
+    def _update_checked(self, rows: Optional[Iterable[int]], state: Callable[[FileEntry], bool]) -> int:
+        if rows is None:
+            rows = range(len(self._rows))
+        first = last = None
+        delta = changed = 0
+        for row in rows:
+            entry = self._rows[row]
+            checked = state(entry)
+            if checked != entry.checked:
+                entry.checked = checked
+                delta += 1 if checked else -1
+                changed += 1
+                first = row if first is None or row < first else first
+                last = row if last is None or row > last else last
+        if changed:
+            self.dataChanged.emit(self.index(first, COLUMN_CHECK), self.index(last, COLUMN_CHECK),
+                                  [Qt.ItemDataRole.CheckStateRole])
+            self._set_checked_count(self.checked_count + delta)
+        return changed
+
+    def _set_checked(self, entry: FileEntry, checked: bool):
+        if entry.checked != checked:
+            entry.checked = checked
+            self._set_checked_count(self.checked_count + (1 if checked else -1))
+
+    def _set_checked_count(self, count: int):
+        self.checked_count = count
+        self.checked_count_changed.emit(count)
+
+
+class FileFilterProxyModel(QAbstractProxyModel):
+    # 按搜索结果筛选文件列表，结果按匹配程度排在前面，程度相同时保持列表的排序
+    # QSortFilterProxyModel 对每一行都要回调一次 Python，这里一次算出整个行号映射；
+    # 没有搜索时直接透传源模型的信号
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._matches: Optional[Dict[str, int]] = None  # 名称 -> 匹配程度，None 表示不筛选
+        self._snippets: Dict[str, str] = {}  # 名称 -> 内容摘要
+        self._source_rows: List[int] = []  # 代理行 -> 源行
+        self._proxy_rows: Dict[int, int] = {}  # 源行 -> 代理行
+        self._positions: Optional[Dict[FileEntry, int]] = None  # 条目 -> 源行，源模型的行变化后重建
+        self._saved_persistent = []
+
+    def setSourceModel(self, model: FileListModel):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self._positions = None
+        model.rowsAboutToBeInserted.connect(self._rows_about_to_be_inserted)
+        model.rowsInserted.connect(self._rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._rows_removed)
+        model.rowsAboutToBeMoved.connect(self._rows_about_to_be_moved)
+        model.rowsMoved.connect(self._rows_moved)
+        model.layoutAboutToBeChanged.connect(self._layout_about_to_be_changed)
+        model.layoutChanged.connect(self._layout_changed)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._model_reset)
+        model.dataChanged.connect(self._data_changed)
+        self._remap()
+        self.endResetModel()
+
+    @property
+    def filtering(self) -> bool:
+        return self._matches is not None
+
+    def source_rows(self) -> Iterable[int]:
+        # 当前显示的各行在源模型中的行号，按显示顺序
+        return self._source_rows if self.filtering else range(self.sourceModel().rowCount())
+
+    def set_matches(self, matches: Optional[Dict[str, int]], snippets: Optional[Dict[str, str]] = None):
+        self.beginResetModel()
+        self._matches = matches
+        self._snippets = snippets or {}
+        self._remap()
+        self.endResetModel()
+
+    def _remap(self):
+        if self._matches is None:
+            self._source_rows = []
+            self._proxy_rows = {}
+            return
+        # 行位置表在源模型的行不变时可以反复使用，每次搜索只需要处理命中的条目
+        model = self.sourceModel()
+        if self._positions is None:
+            self._positions = {entry: row for row, entry in enumerate(model.entries())}
+        positions = self._positions
+        hits = []
+        for name, score in self._matches.items():
+            entry = model.find(name)
+            if entry is not None:
+                hits.append((score, positions[entry]))
+        hits.sort()
+        self._source_rows = [row for _, row in hits]
+        self._proxy_rows = {row: position for position, row in enumerate(self._source_rows)}
+
+    # ------------------------------------------------------------ Qt 接口
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return len(self._source_rows) if self.filtering else self.sourceModel().rowCount()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < self.rowCount() and 0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def sibling(self, row, column, index):
+        return self.index(row, column)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if self._snippets and index.isValid() and index.column() == COLUMN_NAME and \
+                role in (SNIPPET_ROLE, Qt.ItemDataRole.ToolTipRole):
+            name = self.sourceModel().entry(self.mapToSource(index).row()).name
+            snippet = self._snippets.get(name)
+            if snippet is not None:
+                return snippet if role == SNIPPET_ROLE else name + "\n" + snippet
+        return super().data(index, role)
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        row = self._source_rows[proxy_index.row()] if self.filtering else proxy_index.row()
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self._proxy_rows.get(source_index.row()) if self.filtering else source_index.row()
+        return QModelIndex() if row is None else self.createIndex(row, source_index.column())
+
+    # ------------------------------------------------------------ 源模型变化
+    # 不筛选时原样转发；筛选时行号映射整体重算
+
+    def _rows_about_to_be_inserted(self, parent, first, last):
+        if self.filtering:
+            self.beginResetModel()
+        else:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _rows_inserted(self, parent, first, last):
+        self._positions = None
+        if self.filtering:
+            self._remap()
+            self.endResetModel()
+        else:
+            self.endInsertRows()
+
+    def _rows_about_to_be_removed(self, parent, first, last):
+        if self.filtering:
+            self.beginResetModel()
+        else:
+            self.beginRemoveRows(QModelIndex(), first, last)
+
+    def _rows_removed(self, parent, first, last):
+        self._positions = None
+        if self.filtering:
+            self._remap()
+            self.endResetModel()
+        else:
+            self.endRemoveRows()
+
+    def _rows_about_to_be_moved(self, parent, first, last, destination_parent, destination):
+        if self.filtering:
+            self.beginResetModel()
+        else:
+            self.beginMoveRows(QModelIndex(), first, last, QModelIndex(), destination)
+
+    def _rows_moved(self, parent, first, last, destination_parent, destination):
+        self._positions = None
+        if self.filtering:
+            self._remap()
+            self.endResetModel()
+        else:
+            self.endMoveRows()
+
+    def _layout_about_to_be_changed(self, parents=None, hint=QAbstractItemModel.LayoutChangeHint.NoLayoutChangeHint):
+        self.layoutAboutToBeChanged.emit([], hint)
+        # 记下视图持有的索引对应的源索引，重新排列后再换算回来
+        persistent = self.persistentIndexList()
+        self._saved_persistent = [(index, QPersistentModelIndex(self.mapToSource(index))) for index in persistent]
+
+    def _layout_changed(self, parents=None, hint=QAbstractItemModel.LayoutChangeHint.NoLayoutChangeHint):
+        self._positions = None
+        self._remap()
+        if self._saved_persistent:
+            self.changePersistentIndexList([index for index, _ in self._saved_persistent],
+                                           [self.mapFromSource(QModelIndex(source))
+                                            for _, source in self._saved_persistent])
+            self._saved_persistent = []
+        self.layoutChanged.emit([], hint)
+
+    def _model_reset(self):
+        self._positions = None
+        self._remap()
+        self.endResetModel()
+
+    def _data_changed(self, top_left, bottom_right, roles=()):
+        if not self.filtering:
+            self.dataChanged.emit(self.index(top_left.row(), top_left.column()),
+                                  self.index(bottom_right.row(), bottom_right.column()), roles)
+        elif self._source_rows:
+            # 视图只重绘可见的部分，直接通知整个范围
+            self.dataChanged.emit(self.index(0, top_left.column()),
+                                  self.index(len(self._source_rows) - 1, bottom_right.column()), roles)
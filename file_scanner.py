@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import queue
+import fnmatch
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SUPPORTED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.jpg', '.jpeg', '.png']
+
+# 第一批尽量小，让界面尽快显示出内容
+FIRST_BATCH_SIZE = 50
+BATCH_SIZE = 500
+# 距离上一批超过这个时间就先把已有的结果发出去(秒)
+BATCH_INTERVAL = 0.05
+# 扫描线程每积累这么多条记录就交给汇总线程
+CHUNK_SIZE = 64
+# 网络共享上列目录主要在等 IO，线程数可以比 CPU 核数多
+DEFAULT_WORKERS = 8
+
+
+def parse_patterns(text: str) -> List[str]:
+    # "*.pdf; 报表/*" -> ['*.pdf', '报表/*']
+    return [part for part in re.split(r"[;,；，\s]+", text or "") if part]
+
+
+def _compile_patterns(patterns: List[str]):
+    # 统一用小写和 "/" 匹配；不含 "/" 的规则只匹配文件名
+    path_patterns = [fnmatch.translate(p.lower().replace("\\", "/")) for p in patterns if "/" in p or "\\" in p]
+    name_patterns = [fnmatch.translate(p.lower()) for p in patterns if "/" not in p and "\\" not in p]
+    path_regex = re.compile("|".join(path_patterns)) if path_patterns else None
+    name_regex = re.compile("|".join(name_patterns)) if name_patterns else None
+    return path_regex, name_regex
+
+
+@dataclass
+class ScanRules:
+    extensions: List[str] = field(default_factory=lambda: list(SUPPORTED_EXTENSIONS))  # 为空表示不限
+    include: List[str] = field(default_factory=list)  # 为空表示全部包含
+    exclude: List[str] = field(default_factory=list)  # 同时用于跳过整个子文件夹
+    recursive: bool = False
+    max_depth: Optional[int] = None  # 子文件夹层数，None 表示不限
+    min_size: int = 0
+    max_size: Optional[int] = None
+
+    def __post_init__(self):
+        self._extensions = {ext.lower() if ext.startswith(".") else "." + ext.lower()
+                            for ext in self.extensions}
+        self._include = _compile_patterns(self.include)
+        self._exclude = _compile_patterns(self.exclude)
+
+    @staticmethod
+    def _match(patterns, rel_path: str, name: str) -> bool:
+        path_regex, name_regex = patterns
+        return bool((name_regex and name_regex.match(name.lower())) or
+                    (path_regex and path_regex.match(rel_path.lower().replace(os.sep, "/"))))
+
+    def match_dir(self, rel_path: str, name: str, depth: int) -> bool:
+        if not self.recursive or (self.max_depth is not None and depth > self.max_depth):
+            return False
+        return not self._match(self._exclude, rel_path, name)
+
+    def match_name(self, rel_path: str, name: str) -> bool:
+        # 只看名称的规则在 stat 之前判断，减少网络访问
+        if self._extensions and os.path.splitext(name)[1].lower() not in self._extensions:
+            return False
+        if (self.include and not self._match(self._include, rel_path, name)) or \
+                self._match(self._exclude, rel_path, name):
+            return False
+        return True
+
+    def match_size(self, size: int) -> bool:
+        return size >= self.min_size and (self.max_size is None or size <= self.max_size)
+
+    def match_parents(self, rel_path: str) -> bool:
+        # rel_path 所在的各级子文件夹是否都会被扫描
+        parts = rel_path.split(os.sep)
+        for depth in range(1, len(parts)):
+            if not self.match_dir(os.sep.join(parts[:depth]), parts[depth - 1], depth):
+                return False
+        return True
+
+    def match_record(self, record: Dict) -> bool:
+        # 对索引中已有的记录套用同样的规则(包括所在子文件夹是否被排除)
+        rel_path = record['name']
+        return self.match_parents(rel_path) and self.match_name(rel_path, os.path.basename(rel_path)) and \
+            self.match_size(record['size'])
+
+
+def file_record(entry: os.DirEntry, name: Optional[str] = None) -> Dict:
+    # 直接使用 scandir 带回的 stat 结果(Windows 上不需要再访问文件)
+    return _record(entry.path, name or entry.name, entry.stat())
+
+
+def record_for_path(file_path: str, name: str) -> Dict:
+    return _record(file_path, name, os.stat(file_path))
+
+
+def _record(file_path: str, name: str, stat: os.stat_result) -> Dict:
+    return {
+        'name': name,
+        'ext': os.path.splitext(file_path)[1].lower(),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'path': file_path
+    }
+
+
+def _scan_dir(path: str, rel_path: str, depth: int, rules: ScanRules,
+              records: queue.SimpleQueue, stop) -> List[Tuple[str, str, int]]:
+    # 列出一个文件夹：文件记录分块放入 records，返回需要继续扫描的子文件夹
+    subdirs = []
+    chunk = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if stop():
+                    break
+                rel_name = os.path.join(rel_path, entry.name) if rel_path else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rules.match_dir(rel_name, entry.name, depth + 1):
+                            subdirs.append((entry.path, rel_name, depth + 1))
+                        continue
+                    if not rules.match_name(rel_name, entry.name) or not entry.is_file():
+                        continue
+                    record = file_record(entry, rel_name)
+                except OSError:
+                    continue  # 扫描过程中被删除或无权限的文件直接跳过
+                if rules.match_size(record['size']):
+                    chunk.append(record)
+                    if len(chunk) >= CHUNK_SIZE:
+                        records.put(chunk)
+                        chunk = []
+    except OSError:
+        if depth == 0:
+            raise  # 选择的文件夹本身打不开时报告给调用方
+    if chunk:
+        records.put(chunk)
+    return subdirs
+
+
+def scan_folder(path: str, rules: Optional[ScanRules] = None,
+                cancel_event: Optional[threading.Event] = None,
+                max_workers: int = DEFAULT_WORKERS, max_in_flight: Optional[int] = None,
+                first_batch_size: int = FIRST_BATCH_SIZE, batch_size: int = BATCH_SIZE,
+                batch_interval: float = BATCH_INTERVAL) -> Iterator[List[Dict]]:
+    # 逐批产出文件记录，cancel_event 置位后尽快停止
+    # 递归扫描时各个子文件夹在线程池中并行列出，同时进行的文件夹数量不超过 max_in_flight
+    rules = rules or ScanRules()
+    if not rules.recursive:
+        max_workers = 1
+    max_in_flight = max_in_flight or max_workers * 2
+    stopped = threading.Event()
+
+    def stop():
+        return stopped.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    pending = deque([(path, "", 0)])
+    running = set()
+    batch: List[Dict] = []
+    limit = first_batch_size
+    last_flush = time.monotonic()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while pending or running or not records.empty():
+            if stop():
+                return
+            while pending and len(running) < max_in_flight:
+                running.add(executor.submit(_scan_dir, *pending.popleft(), rules, records, stop))
+            if running:
+                done, running = wait(running, timeout=batch_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.extend(future.result())
+
+            while not records.empty():
+                batch.extend(records.get())
+            if batch and (len(batch) >= limit or time.monotonic() - last_flush >= batch_interval):
+                yield batch
+                batch = []
+                limit = batch_size
+                last_flush = time.monotonic()
+        if batch and not stop():
+            yield batch
+    finally:
+        # 提前结束(取消或调用方不再读取)时让扫描线程尽快退出
+        stopped.set()
+        executor.shutdown(wait=True)
@@ -0,0 +1,354 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from file_scanner import ScanRules, scan_folder, record_for_path
+
+ADDED = "added"
+MODIFIED = "modified"
+REMOVED = "removed"
+RENAMED = "renamed"
+RESCAN = "rescan"  # 事件丢失(队列溢出等)，需要重新扫描整个文件夹
+
+# 连续的事件合并后再通知，编辑器保存、复制大文件时会产生很多事件
+DEBOUNCE_INTERVAL = 0.2
+MAX_DEBOUNCE_DELAY = 1.0
+POLL_INTERVAL = 2.0
+
+
+@dataclass
+class FileChange:
+    kind: str
+    name: str  # 相对监视文件夹的路径
+    record: Optional[Dict] = None  # ADDED/MODIFIED/RENAMED 时为新的文件记录
+    old_name: Optional[str] = None  # RENAMED 时的原路径
+    is_dir: bool = False  # REMOVED 时表示整个子文件夹被删除或移走
+
+
+class FolderWatcher:
+    # 在后台线程监视文件夹，文件变化按批通过 callback(changes) 通知(在监视线程中调用)
+    def __init__(self, root: str, rules: ScanRules, callback: Callable[[List[FileChange]], None]):
+        self.root = os.path.normpath(root)
+        self.rules = rules
+        self.callback = callback
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"watch:{self.root}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _record(self, name: str) -> Optional[Dict]:
+        # 文件不存在或不符合筛选规则时返回 None
+        if not self.rules.match_parents(name) or not self.rules.match_name(name, os.path.basename(name)):
+            return None
+        try:
+            record = record_for_path(os.path.join(self.root, name), name)
+        except OSError:
+            return None
+        return record if self.rules.match_size(record['size']) else None
+
+    def _notify(self, changes: List[FileChange]):
+        if changes and not self._stop_event.is_set():
+            self.callback(changes)
+
+
+class PollingWatcher(FolderWatcher):
+    # 定期重新扫描并和上一次的结果比较，适用于所有平台和网络共享
+    def __init__(self, root: str, rules: ScanRules, callback, interval: float = POLL_INTERVAL):
+        super().__init__(root, rules, callback)
+        self.interval = interval
+
+    def snapshot(self) -> Dict[str, Dict]:
+        files = {}
+        for batch in scan_folder(self.root, self.rules, cancel_event=self._stop_event):
+            for record in batch:
+                files[record['name']] = record
+        return files
+
+    def _run(self):
+        try:
+            previous = self.snapshot()
+        except OSError:
+            previous = {}
+        while not self._stop_event.wait(self.interval):
+            try:
+                current = self.snapshot()
+            except OSError:
+                continue  # 网络暂时不可用时保留上一次的结果
+            if self._stop_event.is_set():
+                break
+            self._notify(diff_snapshots(previous, current))
+            previous = current
+
+
+def diff_snapshots(previous: Dict[str, Dict], current: Dict[str, Dict]) -> List[FileChange]:
+    changes = []
+    removed = [name for name in previous if name not in current]
+    added = [name for name in current if name not in previous]
+
+    # 重命名不改变大小和修改时间，按这两项配对
+    removed_by_stamp: Dict[tuple, List[str]] = {}
+    for name in removed:
+        removed_by_stamp.setdefault((previous[name]['size'], previous[name]['mtime']), []).append(name)
+    for name in added:
+        record = current[name]
+        candidates = removed_by_stamp.get((record['size'], record['mtime']))
+        if candidates:
+            old_name = candidates.pop(0)
+            changes.append(FileChange(RENAMED, name, record, old_name=old_name))
+        else:
+            changes.append(FileChange(ADDED, name, record))
+    for names in removed_by_stamp.values():
+        changes.extend(FileChange(REMOVED, name) for name in names)
+
+    for name, record in current.items():
+        old = previous.get(name)
+        if old and (old['size'], old['mtime']) != (record['size'], record['mtime']):
+            changes.append(FileChange(MODIFIED, name, record))
+    return changes
+
+
+# ---------------------------------------------------------------- inotify
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            _libc = libc
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def inotify_available() -> bool:
+    return _load_libc() is not None
+
+
+class InotifyWatcher(FolderWatcher):
+    # Linux 上由内核推送变化，开销只和变化的文件数有关
+    def __init__(self, root: str, rules: ScanRules, callback):
+        super().__init__(root, rules, callback)
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs: Dict[int, str] = {}  # wd -> 相对路径
+        self._pending: Dict[str, FileChange] = {}
+        self._moves: Dict[int, tuple] = {}  # cookie -> (相对路径, 是否文件夹)
+        try:
+            self._add_tree("", 0)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def stop(self, timeout: float = 2.0):
+        started = self._thread is not None
+        super().stop(timeout)
+        if not started:
+            os.close(self._fd)  # 没有启动时监视线程不会关闭它
+
+    def _add_watch(self, rel_dir: str) -> bool:
+        path = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            if not rel_dir:
+                raise OSError(ctypes.get_errno(), f"无法监视文件夹: {path}")
+            return False
+        self._dirs[wd] = rel_dir
+        return True
+
+    def _add_tree(self, rel_dir: str, depth: int, report: bool = False):
+        # 监视 rel_dir 及符合规则的子文件夹；report 为 True 时把其中已有的文件作为新增文件报告
+        if not self._add_watch(rel_dir):
+            return
+        path = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return
+        for entry in entries:
+            name = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if self.rules.match_dir(name, entry.name, depth + 1):
+                    self._add_tree(name, depth + 1, report)
+            elif report:
+                self._pending[name] = FileChange(ADDED, name)
+
+    def _remove_tree(self, rel_dir: str):
+        prefix = rel_dir + os.sep
+        for wd, name in list(self._dirs.items()):
+            if name == rel_dir or name.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def _rename_tree(self, old_dir: str, new_dir: str):
+        prefix = old_dir + os.sep
+        for wd, name in list(self._dirs.items()):
+            if name == old_dir:
+                self._dirs[wd] = new_dir
+            elif name.startswith(prefix):
+                self._dirs[wd] = new_dir + name[len(old_dir):]
+
+    def _run(self):
+        first_event = last_event = None
+        try:
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([self._fd], [], [], DEBOUNCE_INTERVAL)
+                now = time.monotonic()
+                if ready:
+                    try:
+                        data = os.read(self._fd, 64 * 1024)
+                    except OSError as e:
+                        if e.errno == errno.EAGAIN:
+                            continue
+                        raise
+                    self._handle(data)
+                    first_event = first_event or now
+                    last_event = now
+                if first_event and (now - last_event >= DEBOUNCE_INTERVAL or
+                                    now - first_event >= MAX_DEBOUNCE_DELAY):
+                    self._flush()
+                    first_event = last_event = None
+        finally:
+            os.close(self._fd)
+
+    def _handle(self, data: bytes):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._pending = {"": FileChange(RESCAN, "")}
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue  # 子文件夹自身的删除/移动由上一级文件夹的事件处理
+            entry_name = os.fsdecode(raw_name)
+            name = os.path.join(rel_dir, entry_name) if rel_dir else entry_name
+            self._handle_event(name, entry_name, mask, cookie)
+
+    def _handle_event(self, name: str, entry_name: str, mask: int, cookie: int):
+        is_dir = bool(mask & IN_ISDIR)
+        if mask & IN_MOVED_FROM:
+            self._moves[cookie] = (name, is_dir)
+            return
+
+        if mask & IN_MOVED_TO and cookie in self._moves:
+            old_name, _ = self._moves.pop(cookie)
+            if is_dir:
+                self._rename_tree(old_name, name)
+                self._pending[old_name] = FileChange(REMOVED, old_name, is_dir=True)
+                self._report_dir(name, entry_name)
+            else:
+                previous = self._pending.pop(old_name, None)
+                kind = ADDED if previous and previous.kind == ADDED else RENAMED
+                self._pending[name] = FileChange(kind, name, old_name=old_name)
+            return
+
+        if is_dir:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._report_dir(name, entry_name)
+            elif mask & IN_DELETE:
+                self._pending[name] = FileChange(REMOVED, name, is_dir=True)
+            return
+
+        if mask & (IN_CREATE | IN_MOVED_TO):
+            self._pending[name] = FileChange(ADDED, name)
+        elif mask & IN_DELETE:
+            previous = self._pending.pop(name, None)
+            if not (previous and previous.kind == ADDED):
+                self._pending[name] = FileChange(REMOVED, name)
+        elif mask & (IN_CLOSE_WRITE | IN_ATTRIB):
+            if name not in self._pending:
+                self._pending[name] = FileChange(MODIFIED, name)
+
+    def _report_dir(self, name: str, entry_name: str):
+        depth = name.count(os.sep) + 1
+        if self.rules.match_dir(name, entry_name, depth) and self.rules.match_parents(name):
+            self._add_tree(name, depth, report=True)
+
+    def _flush(self):
+        # 没有配对的 MOVED_FROM 表示移出了监视范围
+        for name, is_dir in self._moves.values():
+            if is_dir:
+                self._remove_tree(name)
+            self._pending[name] = FileChange(REMOVED, name, is_dir=is_dir)
+        self._moves.clear()
+
+        changes = []
+        for change in self._pending.values():
+            if change.kind in (ADDED, MODIFIED, RENAMED):
+                change.record = self._record(change.name)
+                if change.record is None:
+                    # 已经被删除或不符合筛选规则
+                    if change.kind == RENAMED:
+                        changes.append(FileChange(REMOVED, change.old_name))
+                    continue
+            changes.append(change)
+        self._pending = {}
+        self._notify(changes)
+
+
+def create_watcher(root: str, rules: ScanRules, callback, poll_interval: float = POLL_INTERVAL) -> FolderWatcher:
+    # 优先使用 inotify，不可用(非 Linux、监视数达到上限等)时定期扫描
+    if inotify_available():
+        try:
+            return InotifyWatcher(root, rules, callback)
+        except OSError:
+            pass
+    return PollingWatcher(root, rules, callback, poll_interval)
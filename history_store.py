@@ -0,0 +1,184 @@
+import os
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 数据库中最多保留的记录数，超过后把最早的一批归档到压缩文件
+MAX_RECORDS = 100_000
+ARCHIVE_BATCH = 20_000
+# 每追加这么多条检查一次是否需要归档
+MAINTENANCE_INTERVAL = 1000
+# 历史记录列表每次向前加载的条数
+PAGE_SIZE = 200
+
+COLUMNS = ("file_name", "file_path", "status", "start_time", "end_time", "error_message", "printer_name",
+           "total_pages")
+
+
+class HistoryStore:
+    # 打印历史记录：每个任务结束时追加一行，不再整体重写
+    # SQLite WAL 模式，每次追加是一个事务，写到一半崩溃也不会损坏已有的记录
+    def __init__(self, db_path: str = "print_history.db", legacy_json: Optional[str] = "print_history.json"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                start_time REAL,
+                end_time REAL,
+                error_message TEXT,
+                printer_name TEXT,
+                total_pages INTEGER,
+                settings TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            -- 各状态的记录数和页数，写入时由触发器累加，统计时不用扫描整个表；归档的记录仍计入
+            CREATE TABLE IF NOT EXISTS history_stats (
+                status TEXT PRIMARY KEY,
+                records INTEGER NOT NULL,
+                pages INTEGER NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS history_stats_insert AFTER INSERT ON history BEGIN
+                INSERT INTO history_stats (status, records, pages) VALUES (new.status, 1, COALESCE(new.total_pages, 0))
+                ON CONFLICT(status) DO UPDATE SET records = records + 1, pages = pages + excluded.pages;
+            END;
+        """)
+        self._conn.commit()
+        self._appended = 0
+        self._build_stats()
+        if legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+
+    def _build_stats(self):
+        # 之前的版本没有统计表，按已有的记录补算一次
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'stats_built'").fetchone():
+                return
+            with self._conn:
+                self._conn.execute("DELETE FROM history_stats")
+                self._conn.execute("""
+                    INSERT INTO history_stats (status, records, pages)
+                    SELECT status, COUNT(*), SUM(COALESCE(total_pages, 0)) FROM history GROUP BY status
+                """)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('stats_built', '1')")
+
+    def _import_legacy(self, json_path: str):
+        # 旧版本整体写入的 print_history.json 导入一次，导入标记和记录在同一个事务中
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error importing print history: {str(e)}")
+                records = []
+            with self._conn:
+                self._insert(records)
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', ?)", (json_path,))
+        try:
+            os.replace(json_path, json_path + ".imported")
+        except OSError:
+            pass
+
+    def _insert(self, records: List[Dict]) -> List[int]:
+        sql = f"INSERT INTO history ({', '.join(COLUMNS)}, settings) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+        return [self._conn.execute(sql, tuple(record.get(column) for column in COLUMNS) +
+                                   (json.dumps(record.get('settings', {}), ensure_ascii=False),)).lastrowid
+                for record in records]
+
+    def append(self, records: List[Dict]) -> List[int]:
+        # 返回各条记录的 id
+        if not records:
+            return []
+        with self._lock:
+            with self._conn:
+                ids = self._insert(records)
+            self._appended += len(records)
+            if self._appended >= MAINTENANCE_INTERVAL:
+                self._appended = 0
+                self._maintain()
+        return ids
+
+    def tail(self, limit: int) -> List[Dict]:
+        # 最新的 limit 条记录，按写入顺序
+        return list(reversed(self.page(None, limit)))
+
+    def page(self, before_id: Optional[int], limit: int = PAGE_SIZE) -> List[Dict]:
+        # id 小于 before_id 的 limit 条记录，从新到旧；before_id 为 None 时从最新的开始
+        sql = f"SELECT id, {', '.join(COLUMNS)}, settings FROM history"
+        with self._lock:
+            if before_id is None:
+                rows = self._conn.execute(sql + " ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._conn.execute(sql + " WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                          (before_id, limit)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def counts(self) -> Dict[str, Tuple[int, int]]:
+        # 状态 -> (记录数, 页数)
+        with self._lock:
+            rows = self._conn.execute("SELECT status, records, pages FROM history_stats").fetchall()
+        return {status: (records, pages) for status, records, pages in rows}
+
+    def get_meta(self, key: str, default=None):
+        # 和历史记录一起保存的少量设置(如学到的打印速度)，值按 JSON 保存
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                                   "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                                   (key, json.dumps(value, ensure_ascii=False)))
+
+    @staticmethod
+    def _record(row) -> Dict:
+        # row: (id, 各列..., settings)
+        record = dict(zip(('id',) + COLUMNS, row))
+        record['settings'] = json.loads(row[-1])
+        return record
+
+    def maintain(self):
+        with self._lock:
+            self._maintain()
+
+    def _maintain(self):
+        # 记录超过上限时把最早的一批写入压缩的 JSONL 归档文件(先写临时文件再改名)，再从数据库删除
+        count = self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        if count > MAX_RECORDS:
+            rows = self._conn.execute(f"SELECT id, {', '.join(COLUMNS)}, settings FROM history "
+                                      f"ORDER BY id LIMIT ?", (count - MAX_RECORDS + ARCHIVE_BATCH,)).fetchall()
+            base = os.path.splitext(self.db_path)[0]
+            archive_path = f"{base}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+            suffix = 1
+            while os.path.exists(archive_path):  # 同一秒内归档多次时不覆盖之前的文件
+                archive_path = f"{base}-{time.strftime('%Y%m%d-%H%M%S')}-{suffix}.jsonl.gz"
+                suffix += 1
+            temp_path = archive_path + ".tmp"
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(self._record(row), ensure_ascii=False) + "\n")
+            os.replace(temp_path, archive_path)
+            with self._conn:
+                self._conn.execute("DELETE FROM history WHERE id <= ?", (rows[-1][0],))
+        # 把 WAL 合并回数据库文件，WAL 不会一直变大
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
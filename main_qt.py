@@ -1,29 +1,110 @@
 import sys
 import os
-import win32print
-import win32api
-import win32con
 import math
 import time
-import json
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
 from datetime import datetime
 from enum import Enum
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, List, Optional, Tuple
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QComboBox, QLineEdit, 
                             QPushButton, QScrollArea, QFrame, QSpinBox,
                             QFileDialog, QMessageBox, QStyledItemDelegate, QStyle, 
                             QCheckBox, QProgressBar, QTabWidget, QTableWidget,
-                            QTableWidgetItem, QMenu)
-from PyQt6.QtCore import Qt, QPropertyAnimation, QRect, QEasingCurve, QSize, QTimer, QUrl, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon, QPainter, QColor, QPixmap, QImage
+                            QTableWidgetItem, QMenu, QInputDialog, QDialog, QDialogButtonBox,
+                            QFormLayout, QTableView, QHeaderView, QAbstractItemView, QDateEdit,
+                            QAbstractItemDelegate)
+from PyQt6.QtCore import (Qt, QPropertyAnimation, QRect, QEasingCurve, QSize, QTimer, QUrl, pyqtSignal,
+                          QObject, QRunnable, QThreadPool, QRectF, QPointF,
+                          QElapsedTimer, QDate, QDateTime, QTime, QAbstractTableModel, QModelIndex)
+from PyQt6.QtGui import QFont, QFontMetrics, QIcon, QPainter, QColor, QPixmap, QImage
 from PyQt6.QtPdf import QPdfDocument
 from PyQt6.QtPdfWidgets import QPdfView
 from docx import Document
 from openpyxl import load_workbook
 from PIL import Image
 import io
+import pdf_tools
+from print_backend import (create_backend, spool_file, supports_native_copies, settings_key,
+                           DEFAULT_CHUNK_SIZE, PRINTER_STATUS_UNAVAILABLE, JOB_STATUS_PRINTED, JOB_STATUS_PRINTING,
+                           JOB_STATUS_PAUSED, JOB_STATUS_ERROR, JOB_STATUS_DELETING, JOB_STATUS_DELETED)
+from page_count import PageCounter
+from file_index import FileIndex
+from file_scanner import scan_folder, ScanRules, parse_patterns, record_for_path
+import folder_watcher
+from file_list import (FileListModel, FileFilterProxyModel, CHOICES, COLUMN_WIDTHS, COLUMN_CHECK, COLUMN_NAME,
+                       COLUMN_PAGE_RANGE, COLUMN_SIDES, COLUMN_COPIES, COLUMN_PREVIEW, FIELDS,
+                       INVALID_ROLE, SNIPPET_ROLE, SelectionFilter)
+from search_index import SearchIndex
+from content_index import ContentIndex, CONTENT_EXTENSIONS, index_contents
+from task_queue import TaskQueue, aging_rank, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_NAMES
+from history_store import HistoryStore, PAGE_SIZE
+from print_estimator import (ThroughputModel, work_pages, POLICY_FIFO, POLICY_SJF, POLICY_EDF, POLICY_NAMES,
+                             JOB_OVERHEAD_SECONDS)
+
+class AnimationClock(QObject):
+    # 全程序共用一个动画定时器：控件需要动画时订阅，没有订阅者或程序不在前台(最小化、切到后台)时停止
+    INTERVAL = 16  # 约60fps
+    _instance = None
+    
+    @classmethod
+    def instance(cls) -> 'AnimationClock':
+        if cls._instance is None:
+            cls._instance = cls(QApplication.instance())
+        return cls._instance
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._subscribers: Dict[QWidget, object] = {}  # 控件 -> 回调(参数为时钟启动后经过的毫秒数)
+        self._elapsed = QElapsedTimer()
+        self._elapsed.start()
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.INTERVAL)
+        self._timer.timeout.connect(self._tick)
+        QApplication.instance().applicationStateChanged.connect(self._update_timer)
+    
+    def subscribe(self, widget: QWidget, callback):
+        self._subscribers[widget] = callback
+        self._update_timer()
+    
+    def unsubscribe(self, widget: QWidget):
+        if self._subscribers.pop(widget, None) is not None:
+            self._update_timer()
+    
+    def _update_timer(self, *args):
+        active = QApplication.applicationState() == Qt.ApplicationState.ApplicationActive
+        if self._subscribers and active:
+            if not self._timer.isActive():
+                self._timer.start()
+        else:
+            self._timer.stop()
+    
+    def _tick(self):
+        elapsed = self._elapsed.elapsed()
+        for widget, callback in list(self._subscribers.items()):
+            try:
+                callback(elapsed)
+            except RuntimeError:
+                self.unsubscribe(widget)  # 控件已被删除
+
+# 排序选项 -> ((字段, 是否降序), ...)，名称相同的比较由模型统一按名称排
+SORT_OPTIONS = {
+    "名称升序": (('name', False),),
+    "名称降序": (('name', True),),
+    "类型升序": (('ext', False), ('name', False)),
+    "类型降序": (('ext', True), ('name', False)),
+    "大小升序": (('size', False), ('name', False)),
+    "大小降序": (('size', True), ('name', False)),
+    "修改时间升序": (('mtime', False), ('name', False)),
+    "修改时间降序": (('mtime', True), ('name', False)),
+    "页数升序": (('pages', False), ('name', False)),
+    "页数降序": (('pages', True), ('name', False)),
+}
 
 class CustomComboBox(QComboBox):
     def __init__(self, parent=None):
@@ -37,16 +118,13 @@ class CustomComboBox(QComboBox):
         self.animation.setDuration(200)
         self.animation.setEasingCurve(QEasingCurve.Type.OutQuad)
         
-        # 添加呼吸动画定时器
+        # 呼吸动画只在弹出框打开时订阅全局动画时钟
         self._opacity = 1.0
         self._scale = 1.0
         self.animation_step = 0
-        self.breath_timer = QTimer(self)
-        self.breath_timer.timeout.connect(self._update_opacity)
-        self.breath_timer.start(16)  # 约60fps的更新频率
         
         # 动画参数
-        self.animation_speed = 0.03  # 控制动画速度
+        self.animation_speed = 0.03  # 每帧(16ms)的相位增量，控制动画速度
         self.base_scale = 1.0  # 基础缩放
         self.scale_range = 0.05  # 缩放范围 ±5%
         self.opacity_min = 0.6  # 最小透明度
@@ -138,9 +216,19 @@ class CustomComboBox(QComboBox):
         geo.setHeight(popup_height)
         self.animation.setEndValue(geo)
         self.animation.start()
+        AnimationClock.instance().subscribe(self, self._update_opacity)
+
+    def hidePopup(self):
+        AnimationClock.instance().unsubscribe(self)
+        super().hidePopup()
 
-    def _update_opacity(self):
-        self.animation_step += self.animation_speed
+    def _update_opacity(self, elapsed):
+        if not self.view().isVisible():
+            # 弹出框被其他方式关闭时不再占用时钟
+            AnimationClock.instance().unsubscribe(self)
+            return
+        # 按经过的时间计算相位，掉帧时动画速度不变
+        self.animation_step = elapsed / AnimationClock.INTERVAL * self.animation_speed
         
         # 使用多个正弦函数组合创建更自然的动画效果
         wave1 = math.sin(self.animation_step)
@@ -158,9 +246,8 @@ class CustomComboBox(QComboBox):
         scale_factor = normalized_wave * 2 - 1  # 转回 -1 到 1
         self._scale = self.base_scale + self.scale_range * self._ease_in_out(scale_factor)
         
-        # 强制更新视图
+        # 只需重绘弹出的列表
         self.view().viewport().update()
-        self.update()
 
     def _ease_in_out(self, t):
         # 使用三次方缓动函数使动画更平滑
@@ -402,6 +489,137 @@ class SidesComboBox(QComboBox):
         self.animation.setEndValue(geo)
         self.animation.start()
 
+class FileItemDelegate(QStyledItemDelegate):
+    # 文件列表的单元格直接绘制，编辑器只在编辑当前单元格时创建
+    def paint(self, painter, option, index):
+        column = index.column()
+        if column == COLUMN_CHECK:
+            super().paint(painter, option, index)
+            return
+        
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(option.rect, QColor("#f8f9fa"))
+        box = QRectF(option.rect.adjusted(4, 5, -4, -5))
+        text = str(index.data(Qt.ItemDataRole.DisplayRole))
+        hover = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        
+        if column == COLUMN_PREVIEW:
+            # 预览按钮
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor("#2980b9" if hover else "#3498db"))
+            painter.drawRoundedRect(box, 4, 4)
+            painter.setPen(QColor("white"))
+            painter.drawText(box, Qt.AlignmentFlag.AlignCenter, text)
+            painter.restore()
+            return
+        
+        if index.data(INVALID_ROLE):
+            border = "#e74c3c"
+        elif hover and column in FIELDS:
+            border = "#3498db"
+        else:
+            border = "#dcdde1"
+        painter.setPen(QColor(border))
+        painter.setBrush(QColor("white"))
+        painter.drawRoundedRect(box, 4, 4)
+        
+        text_rect = box.adjusted(8, 0, -8, 0)
+        if column in CHOICES:
+            # 下拉箭头
+            text_rect.adjust(0, 0, -14, 0)
+            center = QPointF(box.right() - 14, box.center().y())
+            painter.setPen(QColor("#7f8c8d"))
+            painter.drawPolyline([center + QPointF(-4, -2), center + QPointF(0, 2), center + QPointF(4, -2)])
+        
+        if column == COLUMN_PAGE_RANGE and not text:
+            painter.setPen(QColor("#a4b0be"))
+            text = "全部"
+        else:
+            painter.setPen(QColor("#2c3e50"))
+        snippet = index.data(SNIPPET_ROLE) if column == COLUMN_NAME else None
+        if snippet:
+            # 名称下面用小一号的灰色字显示内容摘要
+            name_rect, snippet_rect = QRectF(text_rect), QRectF(text_rect)
+            name_rect.setBottom(text_rect.center().y())
+            snippet_rect.setTop(text_rect.center().y())
+            text_rect = name_rect
+            font = QFont(option.font)
+            font.setPointSizeF(max(6.0, font.pointSizeF() - 1.5))
+            metrics = QFontMetrics(font)
+            painter.save()
+            painter.setFont(font)
+            painter.setPen(QColor("#7f8c8d"))
+            painter.drawText(snippet_rect, Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft,
+                             metrics.elidedText(snippet, Qt.TextElideMode.ElideRight, int(snippet_rect.width())))
+            painter.restore()
+        text = option.fontMetrics.elidedText(text, Qt.TextElideMode.ElideMiddle, int(text_rect.width()))
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, text)
+        painter.restore()
+    
+    def createEditor(self, parent, option, index):
+        column = index.column()
+        if column in CHOICES:
+            editor = SidesComboBox(parent) if column == COLUMN_SIDES else CustomComboBox(parent)
+            editor.addItems(CHOICES[column])
+            editor.activated.connect(lambda _, e=editor: self.commit_and_close(e))
+            QTimer.singleShot(0, editor.showPopup)  # 单击就展开选项
+            return editor
+        if column == COLUMN_PAGE_RANGE:
+            editor = QLineEdit(parent)
+            editor.setPlaceholderText("全部")
+            editor.setStyleSheet("""
+                QLineEdit {
+                    padding: 4px 8px;
+                    border: 1px solid #3498db;
+                    border-radius: 4px;
+                    background: white;
+                }
+            """)
+            return editor
+        if column == COLUMN_COPIES:
+            editor = QSpinBox(parent)
+            editor.setRange(1, 99)
+            editor.setStyleSheet("""
+                QSpinBox {
+                    padding: 4px 8px;
+                    border: 1px solid #3498db;
+                    border-radius: 4px;
+                    background: white;
+                }
+            """)
+            return editor
+        return super().createEditor(parent, option, index)
+    
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.ItemDataRole.EditRole)
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(value)
+        elif isinstance(editor, QSpinBox):
+            editor.setValue(value)
+        elif isinstance(editor, QLineEdit):
+            editor.setText(value)
+        else:
+            super().setEditorData(editor, index)
+    
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText())
+        elif isinstance(editor, QSpinBox):
+            editor.interpretText()
+            model.setData(index, editor.value())
+        elif isinstance(editor, QLineEdit):
+            model.setData(index, editor.text())
+        else:
+            super().setModelData(editor, model, index)
+    
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect.adjusted(4, 3, -4, -3))
+    
+    def commit_and_close(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
 class PreviewWindow(QMainWindow):
     def __init__(self, file_path, parent=None):
         super().__init__(parent)
@@ -540,6 +758,7 @@ class PrintSettings:
     color_mode: str
     sides_option: str
     copies: int
+    collate: bool = True  # 多份时逐份打印
 
 class PrintTask:
     def __init__(self, file_path: str, settings: PrintSettings):
@@ -551,8 +770,19 @@ class PrintTask:
         self.start_time: Optional[float] = None
         self.end_time: Optional[float] = None
         self.error_message: Optional[str] = None
+        self.printer_name: Optional[str] = None  # 派发时绑定的打印机
         self.total_pages = 1
         self.current_page = 0
+        self.bytes_sent = 0
+        self.bytes_total = 0
+        self.temp_dir: Optional[str] = None
+        self.deadline: Optional[float] = None  # 截止时间优先调度时使用
+        self.history_id: Optional[int] = None  # 写入历史记录后的记录 id
+        
+        # 暂停/取消的同步原语，打印线程在这里阻塞等待而不是轮询
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._cancel_event = threading.Event()
     
     def start(self):
         self.status = PrintStatus.PRINTING
@@ -571,133 +801,856 @@ class PrintTask:
     def cancel(self):
         self.status = PrintStatus.CANCELLED
         self.end_time = time.time()
+        self._cancel_event.set()
+        self._resume_event.set()  # 唤醒暂停中的打印线程
     
     def pause(self):
         if self.status == PrintStatus.PRINTING:
             self.status = PrintStatus.PAUSED
+            self._resume_event.clear()
     
     def resume(self):
         if self.status == PrintStatus.PAUSED:
             self.status = PrintStatus.PRINTING
+            self._resume_event.set()
     
-    def update_progress(self, current_page: int, total_pages: int):
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+    
+    def wait_if_paused(self) -> bool:
+        # 暂停时阻塞，返回 False 表示任务已被取消
+        self._resume_event.wait()
+        return not self.is_cancelled()
+    
+    def update_progress(self, current_page: int, total_pages: int,
+                        bytes_sent: Optional[int] = None, bytes_total: Optional[int] = None):
         self.current_page = current_page
         self.total_pages = total_pages
-        self.progress = int((current_page / total_pages) * 100)
+        if bytes_total:
+            # 按已发送的字节数计算进度
+            self.bytes_sent = bytes_sent
+            self.bytes_total = bytes_total
+            self.progress = int(bytes_sent * 100 / bytes_total)
+        else:
+            self.progress = int((current_page / total_pages) * 100)
+    
+    def set_page_count(self, page_count: int):
+        # 按文档页数和页面范围计算实际打印的页数
+        try:
+            ranges = pdf_tools.parse_page_range(self.settings.page_range, page_count)
+        except pdf_tools.PageRangeError:
+            ranges = []  # 范围无效时先按全部页数显示，打印时再报错
+        self.total_pages = pdf_tools.count_range_pages(ranges, page_count)
+    
+    def prepare_spool_file(self) -> str:
+        # 返回实际发送给打印机的文件，在打印线程中调用
+        if not pdf_tools.parse_page_range(self.settings.page_range):
+            return self.file_path
+        
+        # 指定了页面范围时只发送这些页
+        if not pdf_tools.is_available():
+            raise ValueError("指定页面范围需要安装 pypdf")
+        if not pdf_tools.can_merge(self.file_path):
+            raise ValueError("只有 PDF 和图片文件支持指定页面范围")
+        self.temp_dir = tempfile.mkdtemp(prefix="print_all_")
+        extracted_path = os.path.join(self.temp_dir, "pages.pdf")
+        self.total_pages = pdf_tools.extract_pages(self.file_path, self.settings.page_range, extracted_path)
+        return extracted_path
+    
+    def cleanup_spool_file(self):
+        if self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+    
+    def history_tasks(self) -> List['PrintTask']:
+        # 写入历史记录的任务
+        return [self]
+    
+    @property
+    def work(self) -> float:
+        # 折算成单面页数的工作量，用来估计打印时间
+        return work_pages(self.total_pages, self.settings.copies, self.settings.sides_option)
+
+class CoalescedPrintTask(PrintTask):
+    # 把连续的同设置小文件合并成一个后台打印任务，每个源文件仍单独统计进度和历史
+    def __init__(self, members: List[PrintTask]):
+        super().__init__(members[0].file_path, members[0].settings)
+        self.members = members
+        self.file_name = f"{members[0].file_name} 等 {len(members)} 个文件(合并打印)"
+        self.member_pages = [member.total_pages for member in members]
+        self.total_pages = sum(self.member_pages)
+    
+    def start(self):
+        super().start()
+        for member in self.members:
+            member.start()
+    
+    def complete(self):
+        super().complete()
+        for member in self.members:
+            member.complete()
+    
+    def fail(self, error_message: str):
+        super().fail(error_message)
+        for member in self.members:
+            member.fail(error_message)
+    
+    def cancel(self):
+        super().cancel()
+        for member in self.members:
+            member.cancel()
+    
+    def update_progress(self, current_page: int, total_pages: int,
+                        bytes_sent: Optional[int] = None, bytes_total: Optional[int] = None):
+        super().update_progress(current_page, total_pages, bytes_sent, bytes_total)
+        # 按页数比例把合并任务的进度分配给各个源文件
+        done = total_pages * self.progress / 100
+        first_page = 0
+        for member, pages in zip(self.members, self.member_pages):
+            member_done = min(max(done - first_page, 0), pages)
+            member.update_progress(int(member_done), pages)
+            first_page += pages
+    
+    def prepare_spool_file(self) -> str:
+        self.temp_dir = tempfile.mkdtemp(prefix="print_all_")
+        merged_path = os.path.join(self.temp_dir, "merged.pdf")
+        self.member_pages = pdf_tools.merge_documents([member.file_path for member in self.members], merged_path,
+                                                      [member.settings.page_range for member in self.members])
+        self.total_pages = sum(self.member_pages)
+        return merged_path
+    
+    def history_tasks(self) -> List[PrintTask]:
+        return list(self.members)
+
+def coalesce_tasks(tasks: List[PrintTask], max_pages: int = 200, max_bytes: int = 50 * 1024 * 1024) -> List[PrintTask]:
+    # 连续的、设置相同的 PDF/图片任务在页数和字节预算内合并，各自的页面范围在合并时生效
+    result: List[PrintTask] = []
+    group: List[PrintTask] = []
+    group_pages = group_bytes = 0
+    
+    def flush():
+        if len(group) > 1:
+            result.append(CoalescedPrintTask(list(group)))
+        else:
+            result.extend(group)
+        group.clear()
+    
+    for task in tasks:
+        if not pdf_tools.can_merge(task.file_path):
+            flush()
+            result.append(task)
+            continue
+        
+        try:
+            size = os.path.getsize(task.file_path)
+        except OSError:
+            # 入队后文件被删除或改名，不合并，打印时按普通任务报错
+            flush()
+            result.append(task)
+            continue
+        same_settings = group and settings_key(group[0].settings, True) == settings_key(task.settings, True)
+        if not same_settings or group_pages + task.total_pages > max_pages or group_bytes + size > max_bytes:
+            flush()
+            group_pages = group_bytes = 0
+        group.append(task)
+        group_pages += task.total_pages
+        group_bytes += size
+    flush()
+    return result
 
 class PrintQueue:
-    def __init__(self):
-        self.waiting_tasks: List[PrintTask] = []
-        self.current_task: Optional[PrintTask] = None
-        self.completed_tasks: List[PrintTask] = []
-        self.history_file = "print_history.json"
+    # 没有设置截止时间的任务在截止时间优先调度时按入队后这么久截止
+    DEFAULT_DEADLINE_SECONDS = 1800.0
+    # 内存中只保留最近结束的这么多个任务(启动时也只加载这么多条)，更早的只在历史记录库中，
+    # 历史记录列表滚动时再按页读取；长时间运行内存不会一直增长
+    COMPLETED_WINDOW = 500
+    
+    def __init__(self, completed_window: int = COMPLETED_WINDOW):
+        # 等待中的任务按优先级和等待时间排队，取消、移到最前、调整优先级都不需要移动整个列表
+        self.waiting = TaskQueue(self.task_rank)
+        self.waiting_work = 0.0  # 等待中任务的总工作量，估计全部完成时间时不用遍历队列
+        self.active_tasks: List[PrintTask] = []
+        # 超出窗口的任务从左边移出，它们在结束时已经写入历史记录库
+        self.completed_tasks: Deque[PrintTask] = deque(maxlen=max(1, completed_window))
+        # 历史记录只追加，旧版本的 print_history.json 第一次启动时导入
+        self.history = HistoryStore("print_history.db", legacy_json="print_history.json")
+        # 按打印设置分组派发，减少打印机重新配置的次数
+        self.group_by_settings = False
+        self.group_order: Dict[tuple, int] = {}  # 打印设置 -> 分组第一次出现的顺序
+        self.policy = POLICY_FIFO
+        # 各打印机的打印速度，用来估计任务时长和完成时间；printer_slots 是调度器当前使用的打印槽位
+        self.throughput = ThroughputModel()
+        self.printer_slots: List[str] = []
+        self.last_printed: Dict[str, float] = {}  # 打印机 -> 上一个任务打印完的时间
         self.load_history()
     
-    def add_task(self, task: PrintTask):
-        self.waiting_tasks.append(task)
+    def task_rank(self, task: PrintTask, priority: int, enqueued: float):
+        # 分组时先按分组排，分组内再按调度策略；优先级和等待时间(见 aging_rank)在各个策略中都起作用
+        group = 0
+        if self.group_by_settings:
+            group = self.group_order.setdefault(settings_key(task.settings, True), len(self.group_order))
+        rank = aging_rank(task, priority, enqueued)
+        if self.policy == POLICY_SJF:
+            # 相当于按"入队时间 + 预计时长"排序：同时等待的任务短的先打，长任务等得越久越靠前
+            rank += self.throughput.seconds(task.work)
+        elif self.policy == POLICY_EDF:
+            # 有截止时间的任务只按截止时间排，不再考虑优先级和等待时间；没有截止时间的任务按
+            # aging_rank 折算一个截止时间
+            rank = task.deadline if task.deadline is not None else rank + self.DEFAULT_DEADLINE_SECONDS
+        return group, rank
+    
+    def add_task(self, task: PrintTask, priority: int = PRIORITY_NORMAL):
+        self.waiting.push(task, priority)
+        self.waiting_work += task.work
+    
+    def set_policy(self, policy: str):
+        if policy != self.policy:
+            self.policy = policy
+            self.waiting.rerank()
+    
+    def set_deadline(self, task: PrintTask, deadline: Optional[float]):
+        task.deadline = deadline
+        priority = self.waiting.priority(task)
+        if priority is not None:
+            self.waiting.set_priority(task, priority)  # 优先级不变，按新的截止时间重新排序
+    
+    def set_group_by_settings(self, enabled: bool):
+        self.group_by_settings = enabled
+        # 按当前队列中每个分组第一次出现的位置重新排序
+        self.group_order = {}
+        if enabled:
+            for task in self.waiting.ordered():
+                self.group_order.setdefault(settings_key(task.settings, True), len(self.group_order))
+        self.waiting.rerank()
+    
+    def move_to_front(self, task: PrintTask):
+        self.waiting.move_to_front(task)
+    
+    def change_priority(self, task: PrintTask, delta: int):
+        # delta < 0 提高优先级
+        priority = self.waiting.priority(task)
+        if priority is not None:
+            self.waiting.set_priority(task, priority + delta)
     
     def start_next_task(self) -> Optional[PrintTask]:
-        if not self.current_task and self.waiting_tasks:
-            self.current_task = self.waiting_tasks.pop(0)
-            self.current_task.start()
-            return self.current_task
-        return None
+        task = self.waiting.pop()
+        if task is not None:
+            self._remove_work(task)
+            task.start()
+            self.active_tasks.append(task)
+        return task
     
-    def complete_current_task(self):
-        if self.current_task:
-            self.current_task.complete()
-            self.completed_tasks.append(self.current_task)
-            self.current_task = None
-            self.save_history()
+    def _remove_work(self, task: PrintTask):
+        self.waiting_work = self.waiting_work - task.work if self.waiting else 0.0
     
-    def fail_current_task(self, error_message: str):
-        if self.current_task:
-            self.current_task.fail(error_message)
-            self.completed_tasks.append(self.current_task)
-            self.current_task = None
-            self.save_history()
+    def complete_task(self, task: PrintTask):
+        # 任务可能已在打印线程结束前被取消
+        if task in self.active_tasks:
+            self.active_tasks.remove(task)
+            task.complete()
+            self.save_history(task.history_tasks())
     
-    def cancel_task(self, task: PrintTask):
-        if task == self.current_task:
-            task.cancel()
-            self.completed_tasks.append(task)
-            self.current_task = None
+    def task_printed(self, task: PrintTask, printed_at: float):
+        # 打印机报告任务打印完成后修正打印速度；打印时长从开始派发或这台打印机上一个任务打印完算起，
+        # 不计在打印机队列中排队的时间
+        start = max(task.start_time or printed_at, self.last_printed.get(task.printer_name, 0.0))
+        self.last_printed[task.printer_name] = printed_at
+        self.throughput.observe(task.printer_name, task.work, printed_at - start)
+        self.history.set_meta('throughput', self.throughput.state())
+    
+    def fail_task(self, task: PrintTask, error_message: str):
+        if task in self.active_tasks:
+            self.active_tasks.remove(task)
+            task.fail(error_message)
+            self.save_history(task.history_tasks())
+    
+    def cancel_task(self, task: PrintTask) -> bool:
+        # 列表刷新前任务可能已经结束，这时不再改状态，也不重复写历史记录
+        if self.waiting.remove(task):
+            self._remove_work(task)
+        elif task in self.active_tasks:
+            self.active_tasks.remove(task)
         else:
-            self.waiting_tasks.remove(task)
-            task.cancel()
-            self.completed_tasks.append(task)
-        self.save_history()
-    
-    def pause_current_task(self):
-        if self.current_task:
-            self.current_task.pause()
-    
-    def resume_current_task(self):
-        if self.current_task:
-            self.current_task.resume()
-    
-    def save_history(self):
-        history_data = []
-        for task in self.completed_tasks:
-            history_data.append({
-                'file_name': task.file_name,
-                'file_path': task.file_path,
-                'status': task.status.value,
-                'start_time': task.start_time,
-                'end_time': task.end_time,
-                'error_message': task.error_message,
-                'settings': {
-                    'paper_size': task.settings.paper_size,
-                    'orientation': task.settings.orientation,
-                    'page_range': task.settings.page_range,
-                    'color_mode': task.settings.color_mode,
-                    'sides_option': task.settings.sides_option,
-                    'copies': task.settings.copies
-                }
-            })
-        
-        with open(self.history_file, 'w', encoding='utf-8') as f:
-            json.dump(history_data, f, ensure_ascii=False, indent=2)
+            return False
+        task.cancel()
+        self.save_history(task.history_tasks())
+        return True
+    
+    def estimate_seconds(self, task: PrintTask, printer_name: Optional[str] = None) -> float:
+        return self.throughput.seconds(task.work, printer_name or task.printer_name)
+    
+    def estimate_finish(self, limit: int) -> Tuple[List[PrintTask], List[float], float]:
+        # 估计完成时间：返回 (最前面 limit 个等待任务, 它们各自的完成时间, 全部任务的完成时间)
+        # 前面的任务按打印槽位逐个模拟，后面的只按总工作量和打印机池的总速度估算
+        now = time.time()
+        slots = [[now, name] for name in (self.printer_slots or [None])]
+        for task in self.active_tasks:
+            remaining = max(0.0, self.estimate_seconds(task) - (now - (task.start_time or now)))
+            slot = min((slot for slot in slots if slot[1] == task.printer_name), default=min(slots))
+            slot[0] += remaining
+        
+        tasks = self.waiting.ordered(limit)
+        finish_times = []
+        shown_work = 0.0
+        for task in tasks:
+            slot = min(slots)
+            slot[0] += self.estimate_seconds(task, slot[1])
+            finish_times.append(slot[0])
+            shown_work += task.work
+        
+        rest = len(self.waiting) - len(tasks)
+        if rest <= 0:
+            return tasks, finish_times, max(slot[0] for slot in slots)
+        rate = self.throughput.combined_rate([slot[1] for slot in slots if slot[1]])
+        tail = rest * JOB_OVERHEAD_SECONDS / len(slots) + max(0.0, self.waiting_work - shown_work) * 60 / rate
+        average = sum(slot[0] for slot in slots) / len(slots)
+        return tasks, finish_times, max(max(slot[0] for slot in slots), average + tail)
+    
+    def pause_active_tasks(self):
+        for task in self.active_tasks:
+            task.pause()
+    
+    def resume_active_tasks(self):
+        for task in self.active_tasks:
+            task.resume()
+    
+    def save_history(self, tasks: List[PrintTask]):
+        # 只追加这次结束的任务，先写入历史记录库再放进内存窗口
+        ids = self.history.append([self.history_record(task) for task in tasks])
+        for task, history_id in zip(tasks, ids):
+            task.history_id = history_id
+        self.completed_tasks.extend(tasks)
+    
+    @staticmethod
+    def history_record(task: PrintTask) -> Dict:
+        return {
+            'file_name': task.file_name,
+            'file_path': task.file_path,
+            'status': task.status.value,
+            'start_time': task.start_time,
+            'end_time': task.end_time,
+            'error_message': task.error_message,
+            'printer_name': task.printer_name,
+            'total_pages': task.total_pages,
+            'settings': {
+                'paper_size': task.settings.paper_size,
+                'orientation': task.settings.orientation,
+                'page_range': task.settings.page_range,
+                'color_mode': task.settings.color_mode,
+                'sides_option': task.settings.sides_option,
+                'copies': task.settings.copies,
+                'collate': task.settings.collate
+            }
+        }
+    
+    @staticmethod
+    def task_from_record(task_data: Dict) -> PrintTask:
+        settings = PrintSettings(
+            paper_size=task_data['settings']['paper_size'],
+            orientation=task_data['settings']['orientation'],
+            page_range=task_data['settings']['page_range'],
+            color_mode=task_data['settings']['color_mode'],
+            sides_option=task_data['settings']['sides_option'],
+            copies=task_data['settings']['copies'],
+            collate=task_data['settings'].get('collate', True)
+        )
+        
+        task = PrintTask(task_data['file_path'], settings)
+        task.file_name = task_data['file_name']
+        task.status = PrintStatus(task_data['status'])
+        task.start_time = task_data['start_time']
+        task.end_time = task_data['end_time']
+        task.error_message = task_data['error_message']
+        task.printer_name = task_data.get('printer_name')
+        task.total_pages = task_data.get('total_pages') or 1
+        task.history_id = task_data.get('id')
+        return task
     
     def load_history(self):
-        if not os.path.exists(self.history_file):
-            return
-        
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
-            
-            for task_data in history_data:
-                settings = PrintSettings(
-                    paper_size=task_data['settings']['paper_size'],
-                    orientation=task_data['settings']['orientation'],
-                    page_range=task_data['settings']['page_range'],
-                    color_mode=task_data['settings']['color_mode'],
-                    sides_option=task_data['settings']['sides_option'],
-                    copies=task_data['settings']['copies']
-                )
-                
-                task = PrintTask(task_data['file_path'], settings)
-                task.file_name = task_data['file_name']
-                task.status = PrintStatus(task_data['status'])
-                task.start_time = task_data['start_time']
-                task.end_time = task_data['end_time']
-                task.error_message = task_data['error_message']
-                
-                self.completed_tasks.append(task)
+            self.completed_tasks.extend(self.task_from_record(task_data)
+                                        for task_data in self.history.tail(self.completed_tasks.maxlen))
+            # 上次运行时学到的各打印机速度
+            self.throughput.restore(self.history.get_meta('throughput', {}))
+        except Exception as e:
+            print(f"Error loading print history: {str(e)}")
+    
+    def history_page(self, before_id: Optional[int]) -> List[PrintTask]:
+        # 历史记录列表向前翻页：id 小于 before_id 的一页任务，从新到旧
+        try:
+            return [self.task_from_record(task_data) for task_data in self.history.page(before_id)]
         except Exception as e:
             print(f"Error loading print history: {str(e)}")
+            return []
+    
+    def history_counts(self) -> Dict[str, Tuple[int, int]]:
+        # 状态 -> (记录数, 页数)，来自历史记录的统计表
+        return self.history.counts()
 
-class PrintQueueWidget(QWidget):
+class PageCountSignals(QObject):
+    finished = pyqtSignal(object, object)  # 任务列表, {文件路径: 页数}
+
+class PageCountRunnable(QRunnable):
+    # 在后台线程统计页数，完成后通过信号交回界面线程
+    def __init__(self, page_counter: PageCounter, tasks: List['PrintTask'], signals: PageCountSignals):
+        super().__init__()
+        self.page_counter = page_counter
+        self.tasks = tasks
+        self.signals = signals
+    
+    def run(self):
+        paths = [task.file_path for task in self.tasks]
+        counts = dict(self.page_counter.iter_counts(paths))
+        self.signals.finished.emit(self.tasks, counts)
+
+class FolderScanSignals(QObject):
+    batch_ready = pyqtSignal(int, object)  # 扫描编号, 文件记录列表
+    files_removed = pyqtSignal(int, object)  # 扫描编号, 文件路径列表
+    finished = pyqtSignal(int)
+    pages_ready = pyqtSignal(int, object)  # 扫描编号, {路径: 页数}
+    contents_indexed = pyqtSignal(int, int)  # 扫描编号, 新写入全文索引的文件数
+
+class FolderScanRunnable(QRunnable):
+    # 在后台线程扫描文件夹，和索引对比后只把新增/变化/删除的文件交给界面线程
+    def __init__(self, scan_id: int, path: str, rules: ScanRules, index: FileIndex, known: List[Dict],
+                 search_index: SearchIndex, cancel_event: threading.Event, signals: FolderScanSignals):
+        super().__init__()
+        self.scan_id = scan_id
+        self.path = path
+        self.rules = rules
+        self.index = index
+        self.known = known  # 已经按索引显示出来的文件
+        self.search_index = search_index
+        self.cancel_event = cancel_event
+        self.signals = signals
+    
+    def run(self):
+        try:
+            # 搜索索引也在后台建立，界面线程只做查询
+            self.search_index.add(record['name'] for record in self.known)
+            seen = set()
+            for batch in scan_folder(self.path, self.rules, cancel_event=self.cancel_event):
+                seen.update(os.path.normpath(record['path']) for record in batch)
+                changed = self.index.sync(batch)
+                if changed:
+                    self.search_index.add(record['name'] for record in changed)
+                    self.signals.batch_ready.emit(self.scan_id, changed)
+            
+            if not self.cancel_event.is_set():
+                # 索引里有但这次没扫描到：文件已删除，或者不再符合筛选规则
+                removed = [record['path'] for record in self.known if record['path'] not in seen]
+                self.index.remove([path for path in removed if not os.path.exists(path)])
+                if removed:
+                    self.signals.files_removed.emit(self.scan_id, removed)
+        except OSError as e:
+            print(f"Error scanning folder: {str(e)}")
+        finally:
+            self.signals.finished.emit(self.scan_id)
+
+class FolderPagesRunnable(QRunnable):
+    # 按页数排序时在后台统计列表中还没有页数的文件，分批交给界面线程
+    BATCH_SIZE = 200
+    
+    def __init__(self, scan_id: int, page_counter: PageCounter, paths: List[str],
+                 cancel_event: threading.Event, signals: FolderScanSignals):
+        super().__init__()
+        self.scan_id = scan_id
+        self.page_counter = page_counter
+        self.paths = paths
+        self.cancel_event = cancel_event
+        self.signals = signals
+    
+    def run(self):
+        counts = {}
+        for file_path, pages in self.page_counter.iter_counts(self.paths):
+            if self.cancel_event.is_set():
+                return
+            counts[file_path] = pages
+            if len(counts) >= self.BATCH_SIZE:
+                self.signals.pages_ready.emit(self.scan_id, counts)
+                counts = {}
+        if counts:
+            self.signals.pages_ready.emit(self.scan_id, counts)
+
+class ContentIndexRunnable(QRunnable):
+    # 把列表中内容还没有索引或已经变化的文件交给提取进程，写入全文索引
+    def __init__(self, scan_id: int, content_index: ContentIndex, files: List[tuple],
+                 cancel_event: threading.Event, signals: FolderScanSignals):
+        super().__init__()
+        self.scan_id = scan_id
+        self.content_index = content_index
+        self.files = files  # (路径, 大小, 修改时间)
+        self.cancel_event = cancel_event
+        self.signals = signals
+    
+    def run(self):
+        try:
+            paths = self.content_index.stale(self.files)
+            for count in index_contents(self.content_index, paths, self.cancel_event):
+                self.signals.contents_indexed.emit(self.scan_id, count)
+        except Exception as e:
+            print(f"Error indexing file contents: {str(e)}")
+
+class FolderWatchSignals(QObject):
+    changes_ready = pyqtSignal(int, object)  # 扫描编号, FileChange 列表
+
+class PrintJobRunnable(QRunnable):
+    def __init__(self, dispatcher, task: PrintTask, printer_name: str):
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.task = task
+        self.printer_name = printer_name
+    
+    def run(self):
+        self.dispatcher.run_task(self.task, self.printer_name)
+
+class JobPollRunnable(QRunnable):
+    # 在后台线程查询打印机队列，网络打印机响应慢也不会卡住界面
+    def __init__(self, dispatcher):
+        super().__init__()
+        self.dispatcher = dispatcher
+    
+    def run(self):
+        self.dispatcher.run_poll()
+
+@dataclass
+class SpooledJob:
+    # 已提交给打印机、还没有打印完的任务
+    task: 'PrintTask'
+    printer_name: str
+    job_id: int
+    spooled_at: float
+    printing: bool = False  # 查询时见过正在打印或已打印的状态
+
+class PrintDispatcher(QObject):
+    # 打印线程通过信号把进度送回界面线程(跨线程自动排队)
+    task_started = pyqtSignal(object)
+    task_progress = pyqtSignal(object, 'qint64', 'qint64')  # 已发送字节数, 总字节数
+    task_completed = pyqtSignal(object)
+    task_failed = pyqtSignal(object, str)
+    task_cancelled = pyqtSignal(object)
+    task_printed = pyqtSignal(object, float)  # 任务, 打印机报告打印完的时间
+    
+    # Windows 下 close_job 在任务写入后台处理队列后就返回，要查询任务状态才知道什么时候真正打印完
+    JOB_POLL_INTERVAL = 2000
+    # 超过这么久还没有打印完的任务(打印机离线、暂停等)不再跟踪
+    JOB_WATCH_SECONDS = 3600.0
+    
+    def __init__(self, backend, max_workers: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.spooled: List[SpooledJob] = []
+        self._spooled_lock = threading.Lock()
+        self.poll_pool = QThreadPool(self)
+        self.poll_pool.setMaxThreadCount(1)
+        self._polling = False  # 上一次查询还没有结束
+        self.job_timer = QTimer(self)
+        self.job_timer.setInterval(self.JOB_POLL_INTERVAL)
+        self.job_timer.timeout.connect(self.poll_jobs)
+        # 信号从打印线程发出，在界面线程中启动定时器
+        self.task_completed.connect(self.watch_jobs)
+    
+    def dispatch(self, task: PrintTask, printer_name: str):
+        self.pool.start(PrintJobRunnable(self, task, printer_name))
+    
+    def shutdown(self, timeout_ms: int = 5000) -> bool:
+        self.job_timer.stop()
+        self.pool.clear()
+        done = self.pool.waitForDone(timeout_ms)
+        return self.poll_pool.waitForDone(timeout_ms) and done
+    
+    def run_task(self, task: PrintTask, printer_name: str):
+        # 在线程池中执行，不能直接修改界面或打印队列
+        self.task_started.emit(task)
+        copies = task.settings.copies
+        try:
+            # 打印机支持时把份数交给驱动，否则在同一个任务里重复发送文件内容
+            capabilities = self.backend.get_capabilities(printer_name)
+            native_copies = supports_native_copies(capabilities, copies, task.settings.collate)
+            repeats = 1 if native_copies else copies
+            
+            # 合并打印等任务在这里生成实际发送的文件
+            spool_path = task.prepare_spool_file()
+            file_size = os.path.getsize(spool_path)
+            total = file_size * repeats
+            reported = [-1]
+            
+            def on_chunk(sent):
+                # 进度百分比变化时才发信号；暂停时在这里阻塞
+                percent = sent * 100 // total if total else 100
+                if percent != reported[0]:
+                    reported[0] = percent
+                    self.task_progress.emit(task, sent, total)
+                return task.wait_if_paused()
+            
+            # 流式打印文件，所有份数只占用一个后台打印任务
+            if task.wait_if_paused():
+                # 打印设置随任务提交，不修改打印机的全局配置
+                job = self.backend.open_job(printer_name, task.file_name, task.total_pages * repeats,
+                                            task.settings, native_copies)
+                finished = False
+                try:
+                    for copy_index in range(repeats):
+                        offset = copy_index * file_size
+                        spool_file(self.backend, job, spool_path, self.chunk_size,
+                                   on_chunk=lambda sent: on_chunk(offset + sent))
+                        if not task.wait_if_paused():
+                            break
+                    else:
+                        finished = True
+                finally:
+                    # 取消或出错时中止任务，写了一半的数据不能提交给打印机
+                    if finished:
+                        self.backend.close_job(job)
+                        with self._spooled_lock:
+                            self.spooled.append(SpooledJob(task, printer_name, job.job_id, time.time()))
+                    else:
+                        self.backend.abort_job(job)
+        
+        except Exception as e:
+            self.task_failed.emit(task, f"打印失败: {str(e)}")
+            return
+        finally:
+            task.cleanup_spool_file()
+        
+        if task.is_cancelled():
+            self.task_cancelled.emit(task)
+        else:
+            self.task_completed.emit(task)
+
+    def watch_jobs(self, *args):
+        if not self.job_timer.isActive():
+            self.job_timer.start()
+    
+    def poll_jobs(self):
+        # 定时器在界面线程中触发，查询放到后台线程
+        if self._polling:
+            return
+        with self._spooled_lock:
+            if not self.spooled:
+                self.job_timer.stop()
+                return
+        self._polling = True
+        self.poll_pool.start(JobPollRunnable(self))
+    
+    def run_poll(self):
+        # 每台打印机只查询一次队列；只有确认打印完的任务才用来修正打印速度
+        try:
+            with self._spooled_lock:
+                jobs, self.spooled = self.spooled, []
+            statuses: Dict[str, Optional[Dict[int, int]]] = {}
+            for printer_name in {job.printer_name for job in jobs}:
+                try:
+                    statuses[printer_name] = self.backend.get_job_statuses(printer_name)
+                except Exception:
+                    statuses[printer_name] = None  # 暂时查询不到，下次再查
+            now = time.time()
+            pending = []
+            for job in jobs:
+                queue = statuses[job.printer_name]
+                status = queue.get(job.job_id) if queue is not None else 0
+                if status is None:
+                    # 已不在队列中：之前见过正在打印才算打印完，否则可能是被删除、出错后被丢弃或被清除
+                    if job.printing:
+                        self.task_printed.emit(job.task, now)
+                elif status & JOB_STATUS_PRINTED:
+                    self.task_printed.emit(job.task, now)
+                elif status & (JOB_STATUS_ERROR | JOB_STATUS_PAUSED | JOB_STATUS_DELETING | JOB_STATUS_DELETED):
+                    pass  # 出错、暂停或正在删除，时长不能反映打印速度，不再跟踪
+                elif now - job.spooled_at < self.JOB_WATCH_SECONDS:
+                    job.printing = job.printing or bool(status & JOB_STATUS_PRINTING)
+                    pending.append(job)
+            with self._spooled_lock:
+                self.spooled.extend(pending)
+        finally:
+            self._polling = False
+
+class PrinterPoolScheduler:
+    # 打印机池调度：每台打印机一个工作槽位，从共享队列取任务并在派发时绑定打印机
+    def __init__(self, print_queue: PrintQueue, dispatcher: PrintDispatcher, get_status=None):
+        self.print_queue = print_queue
+        self.dispatcher = dispatcher
+        self.get_status = get_status
+        self.printers: List[str] = []
+        self.limits: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.skip_unavailable = True
+    
+    def set_printers(self, printers: List[str], limit: int = 1, skip_unavailable: bool = True):
+        self.printers = list(printers)
+        self.limits = {name: max(1, limit) for name in self.printers}
+        self.skip_unavailable = skip_unavailable
+        # 没有学到速度的打印机先用驱动报告的速度
+        throughput = self.print_queue.throughput
+        for name in self.printers:
+            if not throughput.has_rate(name):
+                throughput.seed(name, self.dispatcher.backend.get_capabilities(name).get('ppm'))
+        self.print_queue.printer_slots = [name for name in self.printers for _ in range(self.limits[name])]
+        for name in self.printers:
+            self.in_flight.setdefault(name, 0)
+        # 线程数至少覆盖所有打印机的并发上限，仍在打印的旧打印机任务也要计入
+        busy = sum(count for name, count in self.in_flight.items() if name not in self.limits)
+        self.dispatcher.pool.setMaxThreadCount(max(1, sum(self.limits.values()) + busy))
+    
+    def is_available(self, printer_name: str) -> bool:
+        if not self.skip_unavailable or not self.get_status:
+            return True
+        return not (self.get_status(printer_name) & PRINTER_STATUS_UNAVAILABLE)
+    
+    def schedule(self):
+        # 轮流给每台空闲打印机派发一个任务，直到队列为空或所有槽位占满
+        # 打印机状态每次调度只取一次
+        available = [name for name in self.printers if self.is_available(name)]
+        dispatched = True
+        while dispatched and self.print_queue.waiting:
+            dispatched = False
+            for name in available:
+                if not self.print_queue.waiting:
+                    break
+                if self.in_flight[name] >= self.limits[name]:
+                    continue
+                task = self.print_queue.start_next_task()
+                task.printer_name = name
+                self.in_flight[name] += 1
+                self.dispatcher.dispatch(task, name)
+                dispatched = True
+    
+    def task_finished(self, task: PrintTask):
+        if self.in_flight.get(task.printer_name):
+            self.in_flight[task.printer_name] -= 1
+
+def format_clock(timestamp: float) -> str:
+    # 今天以内只显示时间
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.strftime("%H:%M:%S" if moment.date() == datetime.now().date() else "%m-%d %H:%M")
+
+class HistoryModel(QAbstractTableModel):
+    # 历史记录列表，最新的在最上面；启动时只有内存中最新的一段，滚动到底部时从历史记录库按页读取更早的
+    # 有新记录时移除看不到的旧行(见 trim)，再滚动到底部时重新读取
+    HEADERS = ["文件名", "打印时间", "打印设置", "状态", "耗时", "备注"]
+    STATUS_COLORS = {PrintStatus.COMPLETED: QColor("#2ecc71"), PrintStatus.FAILED: QColor("#e74c3c")}
+    
     def __init__(self, print_queue: PrintQueue, parent=None):
         super().__init__(parent)
         self.print_queue = print_queue
+        self.tasks: List[PrintTask] = list(reversed(print_queue.completed_tasks))
+        self.newest_id = max((task.history_id or 0 for task in self.tasks), default=0)
+        self.exhausted = False  # 更早的记录已经全部读取
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.BackgroundRole and column == 3:
+            return self.STATUS_COLORS.get(task.status)
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if column == 0:
+            return task.file_name
+        if column == 1:
+            return datetime.fromtimestamp(task.start_time).strftime("%Y-%m-%d %H:%M:%S") if task.start_time else None
+        if column == 2:
+            return f"{task.settings.paper_size}, {task.settings.orientation}, {task.settings.color_mode}"
+        if column == 3:
+            return task.status.value
+        if column == 4:
+            return f"{task.end_time - task.start_time:.1f}秒" if task.start_time and task.end_time else None
+        return task.error_message
+    
+    def oldest_id(self) -> Optional[int]:
+        # 还没有写入历史记录库的任务没有 id，从最早一个有 id 的任务往前读
+        for task in reversed(self.tasks):
+            if task.history_id is not None:
+                return task.history_id
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        page = self.print_queue.history_page(self.oldest_id())
+        if len(page) < PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.tasks), len(self.tasks) + len(page) - 1)
+            self.tasks.extend(page)
+            self.endInsertRows()
+    
+    def refresh(self) -> bool:
+        # 把新结束的任务插到最上面，返回是否有新记录
+        new_tasks = []
+        for task in reversed(self.print_queue.completed_tasks):
+            if task.history_id is None or task.history_id <= self.newest_id:
+                break
+            new_tasks.append(task)
+        else:
+            if new_tasks and len(new_tasks) == self.print_queue.completed_tasks.maxlen:
+                # 两次刷新之间结束的任务比窗口还多，中间有一段不在内存中，从窗口重新开始
+                self.beginResetModel()
+                self.tasks = new_tasks
+                self.newest_id = new_tasks[0].history_id
+                self.exhausted = False
+                self.endResetModel()
+                return True
+        if not new_tasks:
+            return False
+        self.newest_id = new_tasks[0].history_id
+        self.beginInsertRows(QModelIndex(), 0, len(new_tasks) - 1)
+        self.tasks[:0] = new_tasks
+        self.endInsertRows()
+        return True
+    
+    def trim(self, keep: int):
+        # 只保留最上面的 keep 行
+        if len(self.tasks) > keep:
+            self.beginRemoveRows(QModelIndex(), keep, len(self.tasks) - 1)
+            del self.tasks[keep:]
+            self.endRemoveRows()
+            self.exhausted = False
+
+class PrintQueueWidget(QWidget):
+    # 等待列表只显示最前面的这么多个任务，队列很长时刷新也不会卡
+    MAX_WAITING_ROWS = 500
+    CANCEL_COLUMN = 6
+    
+    def __init__(self, print_queue: PrintQueue, dispatcher: Optional[PrintDispatcher] = None, parent=None):
+        super().__init__(parent)
+        self.print_queue = print_queue
+        self.waiting_rows: List[PrintTask] = []  # 等待列表各行对应的任务
         self.setup_ui()
         
-        # 更新定时器
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_display)
-        self.update_timer.start(1000)  # 每秒更新一次
+        # 合并短时间内的多次刷新，批量打印时不会每个信号都重建表格
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(200)
+        self.refresh_timer.timeout.connect(self.update_display)
+        
+        if dispatcher:
+            dispatcher.task_started.connect(self.schedule_refresh)
+            dispatcher.task_progress.connect(self.update_current_task)
+            dispatcher.task_completed.connect(self.schedule_refresh)
+            dispatcher.task_failed.connect(self.schedule_refresh)
+            dispatcher.task_cancelled.connect(self.schedule_refresh)
+        
+        self.update_display()
     
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -727,22 +1680,43 @@ class PrintQueueWidget(QWidget):
         
         control_layout.addWidget(self.pause_btn)
         control_layout.addWidget(self.cancel_btn)
+        control_layout.addStretch()
+        
+        # 调度策略
+        control_layout.addWidget(QLabel("调度策略:"))
+        self.policy_combo = QComboBox()
+        for policy, name in POLICY_NAMES.items():
+            self.policy_combo.addItem(name, policy)
+        self.policy_combo.setCurrentIndex(self.policy_combo.findData(self.print_queue.policy))
+        self.policy_combo.currentIndexChanged.connect(self.change_policy)
+        control_layout.addWidget(self.policy_combo)
         current_layout.addLayout(control_layout)
         
         # 等待任务列表
         self.waiting_table = QTableWidget()
-        self.waiting_table.setColumnCount(5)
-        self.waiting_table.setHorizontalHeaderLabels(["文件名", "页数", "打印设置", "状态", "操作"])
+        self.waiting_table.setColumnCount(7)
+        self.waiting_table.setHorizontalHeaderLabels(["文件名", "页数", "打印设置", "优先级", "预计完成", "状态", "操作"])
+        self.waiting_table.cellClicked.connect(self.on_waiting_cell_clicked)
+        self.waiting_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.waiting_table.customContextMenuRequested.connect(self.show_waiting_menu)
         current_layout.addWidget(self.waiting_table)
+        self.waiting_summary = QLabel()
+        current_layout.addWidget(self.waiting_summary)
         
         # 历史记录选项卡
         history_tab = QWidget()
         history_layout = QVBoxLayout(history_tab)
         
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(6)
-        self.history_table.setHorizontalHeaderLabels(["文件名", "打印时间", "打印设置", "状态", "耗时", "备注"])
+        # 历史记录可能有几十万条，用模型按需读取，滚动到底部时再加载更早的一页
+        self.history_model = HistoryModel(self.print_queue, self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.history_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         history_layout.addWidget(self.history_table)
+        self.history_summary = QLabel()
+        history_layout.addWidget(self.history_summary)
+        self.update_history_summary()
         
         # 添加选项卡
         tabs.addTab(current_tab, "当前任务")
@@ -750,29 +1724,49 @@ class PrintQueueWidget(QWidget):
         
         layout.addWidget(tabs)
     
-    def update_display(self):
-        # 更新当前任务信息
-        if self.print_queue.current_task:
-            task = self.print_queue.current_task
-            self.current_task_info.setText(
-                f"正在打印: {task.file_name}\n"
-                f"页数: {task.current_page}/{task.total_pages}"
-            )
-            self.progress_bar.setValue(task.progress)
+    def schedule_refresh(self, *args):
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+    
+    def update_current_task(self, *args):
+        # 更新正在打印的任务信息(打印机池模式下可能有多个)
+        active_tasks = self.print_queue.active_tasks
+        if active_tasks:
+            lines = []
+            for task in active_tasks[:5]:
+                printer = f" → {task.printer_name}" if task.printer_name else ""
+                line = f"正在打印: {task.file_name}{printer}  页数: {task.current_page}/{task.total_pages}"
+                if task.bytes_total:
+                    line += f"  已发送: {task.bytes_sent / 1048576:.1f}/{task.bytes_total / 1048576:.1f} MB"
+                if task.start_time:
+                    finish = max(time.time(), task.start_time + self.print_queue.estimate_seconds(task))
+                    line += f"  预计 {format_clock(finish)} 完成"
+                lines.append(line)
+            if len(active_tasks) > 5:
+                lines.append(f"…… 共 {len(active_tasks)} 个任务正在打印")
+            self.current_task_info.setText("\n".join(lines))
+            self.progress_bar.setValue(sum(task.progress for task in active_tasks) // len(active_tasks))
             
             # 更新按钮状态
             self.pause_btn.setEnabled(True)
             self.cancel_btn.setEnabled(True)
-            self.pause_btn.setText("继续" if task.status == PrintStatus.PAUSED else "暂停")
+            paused = all(task.status == PrintStatus.PAUSED for task in active_tasks)
+            self.pause_btn.setText("继续" if paused else "暂停")
         else:
             self.current_task_info.setText("当前没有打印任务")
             self.progress_bar.setValue(0)
             self.pause_btn.setEnabled(False)
             self.cancel_btn.setEnabled(False)
-        
-        # 更新等待任务列表
-        self.waiting_table.setRowCount(len(self.print_queue.waiting_tasks))
-        for i, task in enumerate(self.print_queue.waiting_tasks):
+    
+    def update_display(self):
+        self.update_current_task()
+        
+        # 更新等待任务列表，操作列用文字单元格代替按钮控件
+        waiting = self.print_queue.waiting
+        self.waiting_rows, finish_times, batch_finish = self.print_queue.estimate_finish(self.MAX_WAITING_ROWS)
+        self.waiting_table.setUpdatesEnabled(False)
+        self.waiting_table.setRowCount(len(self.waiting_rows))
+        for i, (task, finish) in enumerate(zip(self.waiting_rows, finish_times)):
             self.waiting_table.setItem(i, 0, QTableWidgetItem(task.file_name))
             self.waiting_table.setItem(i, 1, QTableWidgetItem(str(task.total_pages)))
             self.waiting_table.setItem(i, 2, QTableWidgetItem(
@@ -780,62 +1774,109 @@ class PrintQueueWidget(QWidget):
                 f"{task.settings.orientation}, "
                 f"{task.settings.color_mode}"
             ))
-            self.waiting_table.setItem(i, 3, QTableWidgetItem(task.status.value))
-            
-            # 添加取消按钮
-            cancel_btn = QPushButton("取消")
-            cancel_btn.clicked.connect(lambda checked, t=task: self.cancel_task(t))
-            self.waiting_table.setCellWidget(i, 4, cancel_btn)
-        
-        # 更新历史记录
-        self.history_table.setRowCount(len(self.print_queue.completed_tasks))
-        for i, task in enumerate(reversed(self.print_queue.completed_tasks)):
-            self.history_table.setItem(i, 0, QTableWidgetItem(task.file_name))
-            
-            # 格式化打印时间
-            if task.start_time:
-                start_time = datetime.fromtimestamp(task.start_time).strftime("%Y-%m-%d %H:%M:%S")
-                self.history_table.setItem(i, 1, QTableWidgetItem(start_time))
-            
-            self.history_table.setItem(i, 2, QTableWidgetItem(
-                f"{task.settings.paper_size}, "
-                f"{task.settings.orientation}, "
-                f"{task.settings.color_mode}"
-            ))
+            self.waiting_table.setItem(i, 3, QTableWidgetItem(PRIORITY_NAMES[waiting.priority(task)]))
+            finish_item = QTableWidgetItem(format_clock(finish))
+            if task.deadline is not None:
+                finish_item.setToolTip(f"截止时间: {format_clock(task.deadline)}")
+                if finish > task.deadline:
+                    finish_item.setForeground(QColor("#e74c3c"))  # 预计赶不上截止时间
+            self.waiting_table.setItem(i, 4, finish_item)
+            self.waiting_table.setItem(i, 5, QTableWidgetItem(task.status.value))
             
-            status_item = QTableWidgetItem(task.status.value)
-            if task.status == PrintStatus.COMPLETED:
-                status_item.setBackground(QColor("#2ecc71"))  # 绿色
-            elif task.status == PrintStatus.FAILED:
-                status_item.setBackground(QColor("#e74c3c"))  # 红色
-            self.history_table.setItem(i, 3, status_item)
-            
-            # 计算耗时
-            if task.start_time and task.end_time:
-                duration = task.end_time - task.start_time
-                duration_str = f"{duration:.1f}秒"
-                self.history_table.setItem(i, 4, QTableWidgetItem(duration_str))
-            
-            # 添加错误信息或备注
-            if task.error_message:
-                self.history_table.setItem(i, 5, QTableWidgetItem(task.error_message))
+            cancel_item = QTableWidgetItem("取消")
+            cancel_item.setForeground(QColor("#3498db"))
+            self.waiting_table.setItem(i, self.CANCEL_COLUMN, cancel_item)
+        self.waiting_table.setUpdatesEnabled(True)
+        if waiting or self.print_queue.active_tasks:
+            summary = f"共 {len(waiting)} 个任务等待中"
+            hidden = len(waiting) - len(self.waiting_rows)
+            if hidden > 0:
+                summary += f"(列表只显示前 {len(self.waiting_rows)} 个)"
+            minutes = max(0.0, batch_finish - time.time()) / 60
+            summary += f"，预计 {format_clock(batch_finish)} 全部完成(约 {minutes:.0f} 分钟)"
+            self.waiting_summary.setText(summary)
+        else:
+            self.waiting_summary.setText("")
+        
+        # 更新历史记录，只插入新增的记录(最新的在最上面)
+        if self.history_model.refresh():
+            self.update_history_summary()
+            # 列表中的行不超过内存窗口，正在查看的行和下面一页保留
+            bottom = self.history_table.rowAt(self.history_table.viewport().height() - 1)
+            if bottom < 0:
+                bottom = self.history_model.rowCount()
+            self.history_model.trim(max(self.print_queue.completed_tasks.maxlen, bottom + PAGE_SIZE))
+    
+    def update_history_summary(self):
+        # 各状态的数量来自历史记录库的统计表，不需要把记录全部读出来
+        counts = self.print_queue.history_counts()
+        total = sum(records for records, _ in counts.values())
+        if not total:
+            self.history_summary.setText("")
+            return
+        parts = [f"{status.value} {counts[status.value][0]}" for status in
+                 (PrintStatus.COMPLETED, PrintStatus.FAILED, PrintStatus.CANCELLED) if status.value in counts]
+        pages = counts.get(PrintStatus.COMPLETED.value, (0, 0))[1]
+        self.history_summary.setText(f"共 {total} 条记录：{'，'.join(parts)}，已打印 {pages} 页")
+    
+    def on_waiting_cell_clicked(self, row: int, column: int):
+        if column == self.CANCEL_COLUMN and row < len(self.waiting_rows):
+            self.cancel_task(self.waiting_rows[row])
+    
+    def show_waiting_menu(self, pos):
+        row = self.waiting_table.rowAt(pos.y())
+        if not 0 <= row < len(self.waiting_rows):
+            return
+        task = self.waiting_rows[row]
+        if task not in self.print_queue.waiting:
+            return  # 已经开始打印
+        priority = self.print_queue.waiting.priority(task)
+        menu = QMenu(self)
+        menu.addAction("移到最前", lambda: self.reorder(self.print_queue.move_to_front, task))
+        menu.addAction("提高优先级", lambda: self.reorder(self.print_queue.change_priority, task, -1)) \
+            .setEnabled(priority > PRIORITY_HIGH)
+        menu.addAction("降低优先级", lambda: self.reorder(self.print_queue.change_priority, task, 1)) \
+            .setEnabled(priority < PRIORITY_LOW)
+        menu.addAction("设置截止时间...", lambda: self.edit_deadline(task))
+        menu.addSeparator()
+        menu.addAction("取消", lambda: self.cancel_task(task))
+        menu.exec(self.waiting_table.viewport().mapToGlobal(pos))
+    
+    def edit_deadline(self, task: PrintTask):
+        current = 0 if task.deadline is None else max(1, round((task.deadline - time.time()) / 60))
+        minutes, ok = QInputDialog.getInt(self, "设置截止时间", "多少分钟内完成(0 表示不限):", current, 0, 7 * 24 * 60)
+        if ok and task in self.print_queue.waiting:
+            self.print_queue.set_deadline(task, time.time() + minutes * 60 if minutes else None)
+            self.update_display()
+    
+    def change_policy(self, index: int):
+        self.print_queue.set_policy(self.policy_combo.itemData(index))
+        self.update_display()
+    
+    def reorder(self, action, task: PrintTask, *args):
+        action(task, *args)
+        self.update_display()
     
     def toggle_pause(self):
-        if self.print_queue.current_task:
-            if self.print_queue.current_task.status == PrintStatus.PAUSED:
-                self.print_queue.resume_current_task()
+        active_tasks = self.print_queue.active_tasks
+        if active_tasks:
+            if all(task.status == PrintStatus.PAUSED for task in active_tasks):
+                self.print_queue.resume_active_tasks()
             else:
-                self.print_queue.pause_current_task()
+                self.print_queue.pause_active_tasks()
+            self.update_current_task()
     
     def cancel_current(self):
-        if self.print_queue.current_task:
-            self.print_queue.cancel_task(self.print_queue.current_task)
+        for task in list(self.print_queue.active_tasks):
+            self.print_queue.cancel_task(task)
+        self.schedule_refresh()
     
     def cancel_task(self, task: PrintTask):
         self.print_queue.cancel_task(task)
+        self.schedule_refresh()
 
 class PrintQueueWindow(QMainWindow):
-    def __init__(self, print_queue: PrintQueue, parent=None):
+    def __init__(self, print_queue: PrintQueue, dispatcher: Optional[PrintDispatcher] = None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("打印任务管理")
         self.setMinimumSize(800, 600)
@@ -846,7 +1887,7 @@ class PrintQueueWindow(QMainWindow):
         layout = QVBoxLayout(central_widget)
         
         # 添加打印队列管理器
-        self.queue_widget = PrintQueueWidget(print_queue)
+        self.queue_widget = PrintQueueWidget(print_queue, dispatcher)
         layout.addWidget(self.queue_widget)
         
         # 设置窗口样式
@@ -922,6 +1963,135 @@ class PrintQueueWindow(QMainWindow):
             }
         """)
 
+class ScanRulesDialog(QDialog):
+    # 编辑文件夹扫描的筛选规则
+    def __init__(self, rules: ScanRules, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("筛选规则")
+        layout = QFormLayout(self)
+        
+        self.extensions_input = QLineEdit("; ".join(rules.extensions))
+        self.extensions_input.setPlaceholderText("留空表示全部格式")
+        layout.addRow("文件格式:", self.extensions_input)
+        
+        self.include_input = QLineEdit("; ".join(rules.include))
+        self.include_input.setPlaceholderText("例如: *合同*; 2024/*")
+        layout.addRow("包含:", self.include_input)
+        
+        self.exclude_input = QLineEdit("; ".join(rules.exclude))
+        self.exclude_input.setPlaceholderText("例如: ~$*; 备份")
+        self.exclude_input.setToolTip("匹配的文件和子文件夹都会被跳过")
+        layout.addRow("排除:", self.exclude_input)
+        
+        self.depth_spin = QSpinBox()
+        self.depth_spin.setRange(-1, 99)
+        self.depth_spin.setSpecialValueText("不限")
+        self.depth_spin.setValue(-1 if rules.max_depth is None else rules.max_depth)
+        layout.addRow("子文件夹层数:", self.depth_spin)
+        
+        self.min_size_spin = QSpinBox()
+        self.min_size_spin.setRange(0, 10 * 1024 * 1024)
+        self.min_size_spin.setSuffix(" KB")
+        self.min_size_spin.setSpecialValueText("不限")
+        self.min_size_spin.setValue(rules.min_size // 1024)
+        layout.addRow("最小大小:", self.min_size_spin)
+        
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 10 * 1024 * 1024)
+        self.max_size_spin.setSuffix(" KB")
+        self.max_size_spin.setSpecialValueText("不限")
+        self.max_size_spin.setValue(0 if rules.max_size is None else rules.max_size // 1024)
+        layout.addRow("最大大小:", self.max_size_spin)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+    
+    def rules(self, recursive: bool) -> ScanRules:
+        return ScanRules(
+            extensions=parse_patterns(self.extensions_input.text()),
+            include=parse_patterns(self.include_input.text()),
+            exclude=parse_patterns(self.exclude_input.text()),
+            recursive=recursive,
+            max_depth=None if self.depth_spin.value() < 0 else self.depth_spin.value(),
+            min_size=self.min_size_spin.value() * 1024,
+            max_size=self.max_size_spin.value() * 1024 or None
+        )
+
+class SelectFilesDialog(QDialog):
+    # 按格式、名称、大小、修改日期批量选择文件
+    MODES = ["选中符合条件的文件", "取消选中符合条件的文件", "只选中符合条件的文件"]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("按条件选择")
+        layout = QFormLayout(self)
+        
+        self.extensions_input = QLineEdit()
+        self.extensions_input.setPlaceholderText("例如: pdf; docx，留空表示全部格式")
+        layout.addRow("文件格式:", self.extensions_input)
+        
+        self.patterns_input = QLineEdit()
+        self.patterns_input.setPlaceholderText("例如: *合同*; 2024/*")
+        layout.addRow("名称:", self.patterns_input)
+        
+        self.min_size_spin = QSpinBox()
+        self.min_size_spin.setRange(0, 10 * 1024 * 1024)
+        self.min_size_spin.setSuffix(" KB")
+        self.min_size_spin.setSpecialValueText("不限")
+        layout.addRow("最小大小:", self.min_size_spin)
+        
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 10 * 1024 * 1024)
+        self.max_size_spin.setSuffix(" KB")
+        self.max_size_spin.setSpecialValueText("不限")
+        layout.addRow("最大大小:", self.max_size_spin)
+        
+        # 日期等于最小值时表示不限
+        self.after_edit = self._date_edit()
+        layout.addRow("修改日期从:", self.after_edit)
+        self.before_edit = self._date_edit()
+        layout.addRow("修改日期到:", self.before_edit)
+        
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(self.MODES)
+        layout.addRow("操作:", self.mode_combo)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+    
+    @staticmethod
+    def _date_edit() -> QDateEdit:
+        edit = QDateEdit()
+        edit.setCalendarPopup(True)
+        edit.setDisplayFormat("yyyy-MM-dd")
+        edit.setMinimumDate(QDate(1990, 1, 1))
+        edit.setSpecialValueText("不限")
+        edit.setDate(edit.minimumDate())
+        return edit
+    
+    @staticmethod
+    def _timestamp(edit: QDateEdit, days: int = 0) -> Optional[float]:
+        if edit.date() == edit.minimumDate():
+            return None
+        return QDateTime(edit.date().addDays(days), QTime(0, 0)).toSecsSinceEpoch()
+    
+    def selection_filter(self) -> SelectionFilter:
+        return SelectionFilter(
+            extensions=parse_patterns(self.extensions_input.text()),
+            patterns=parse_patterns(self.patterns_input.text()),
+            min_size=self.min_size_spin.value() * 1024,
+            max_size=self.max_size_spin.value() * 1024 or None,
+            modified_after=self._timestamp(self.after_edit),
+            modified_before=self._timestamp(self.before_edit, 1)  # 包含结束日期当天
+        )
+    
+    def mode(self) -> int:
+        return self.mode_combo.currentIndex()
+
 class PrinterApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -990,14 +2160,6 @@ class PrinterApp(QMainWindow):
                 padding: 5px;
                 min-width: 80px;
             }
-            QWidget#list_item {
-                background-color: #f8f9fa;
-                border-radius: 4px;
-                margin: 2px 5px;
-            }
-            QWidget#list_item:hover {
-                background-color: #f1f2f6;
-            }
         """)
         
         # 创建主窗口部件
@@ -1030,10 +2192,20 @@ class PrinterApp(QMainWindow):
         printer_label.setObjectName("header_label")
         toolbar_row.addWidget(printer_label)
         
+        # 打印后端(Windows 打印机或本地模拟打印机)
+        self.backend = create_backend()
+        
         self.printer_combo = CustomComboBox()
         self.update_printer_list()
         toolbar_row.addWidget(self.printer_combo)
         
+        # 打印机池：选择多台打印机分担同一批任务
+        self.pool_btn = QPushButton("打印机池")
+        self.pool_menu = QMenu(self)
+        self.pool_menu.aboutToShow.connect(self.build_pool_menu)
+        self.pool_btn.setMenu(self.pool_menu)
+        toolbar_row.addWidget(self.pool_btn)
+        
         # 文件夹路径输入框
         path_label = QLabel("文件夹路径:")
         path_label.setObjectName("header_label")
@@ -1054,8 +2226,9 @@ class PrinterApp(QMainWindow):
         
         # 文件列表区域
         list_container = QFrame()
+        list_container.setObjectName("list_container")
         list_container.setStyleSheet("""
-            QFrame {
+            QFrame#list_container {
                 background-color: white;
                 border: 1px solid #dcdde1;
                 border-radius: 4px;
@@ -1065,44 +2238,51 @@ class PrinterApp(QMainWindow):
         list_layout = QVBoxLayout(list_container)
         list_layout.setSpacing(10)
         
-        # 添加表头
-        header = QWidget()
-        header_layout = QHBoxLayout(header)
-        header_layout.setContentsMargins(15, 5, 15, 5)
-        header_layout.setSpacing(15)
-        
-        # 设置表头标签
-        header_widths = [250, 80, 100, 100, 120, 100, 100, 100]  # 调整列宽
-        headers = ["文件名", "格式", "纸张", "方向", "页面范围", "颜色", "单双面", "份数"]
-        
-        for text, width in zip(headers, header_widths):
-            label = QLabel(text)
-            label.setObjectName("header_label")
-            label.setFixedWidth(width)
-            label.setStyleSheet("""
-                QLabel#header_label {
-                    font-weight: bold;
-                    color: #2c3e50;
-                    font-size: 14px;
-                    padding: 8px;
-                    background-color: transparent;
-                }
-            """)
-            header_layout.addWidget(label)
-        
-        header_layout.addStretch()
-        list_layout.addWidget(header)
-        
-        # 滚动区域
-        self.list_area = QScrollArea()
-        self.list_widget = QWidget()
-        self.list_layout = QVBoxLayout(self.list_widget)
-        self.list_layout.setSpacing(5)
-        self.list_layout.setContentsMargins(15, 5, 15, 5)
-        
-        self.list_area.setWidget(self.list_widget)
-        self.list_area.setWidgetResizable(True)
-        list_layout.addWidget(self.list_area)
+        # 文件列表：模型保存所有文件，视图只绘制可见的行
+        self.file_model = FileListModel(self)
+        self.file_model.checked_count_changed.connect(self.update_select_all_text)
+        self.file_model.rowsInserted.connect(self.update_select_all_text)
+        self.file_model.rowsRemoved.connect(self.update_select_all_text)
+        # 排序由模型按缓存的排序键完成，代理按搜索索引的结果筛选
+        self.file_proxy = FileFilterProxyModel(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        self.search_index = SearchIndex()
+        
+        self.file_view = QTableView()
+        self.file_view.setModel(self.file_proxy)
+        self.file_view.setItemDelegate(FileItemDelegate(self.file_view))
+        self.file_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.file_view.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked |
+                                       QAbstractItemView.EditTrigger.EditKeyPressed)
+        self.file_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.file_view.setMouseTracking(True)
+        self.file_view.setShowGrid(False)
+        self.file_view.setWordWrap(False)
+        self.file_view.verticalHeader().hide()
+        self.file_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.file_view.verticalHeader().setDefaultSectionSize(48)
+        header = self.file_view.horizontalHeader()
+        for column, width in enumerate(COLUMN_WIDTHS):
+            header.resizeSection(column, width)
+        header.setSectionResizeMode(COLUMN_NAME, QHeaderView.ResizeMode.Stretch)
+        header.setHighlightSections(False)
+        header.setDefaultAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
+        self.file_view.setStyleSheet("""
+            QTableView {
+                border: none;
+                background-color: #f8f9fa;
+            }
+            QHeaderView::section {
+                font-weight: bold;
+                color: #2c3e50;
+                font-size: 14px;
+                padding: 8px;
+                background-color: white;
+                border: none;
+            }
+        """)
+        self.file_view.clicked.connect(self.on_file_clicked)
+        list_layout.addWidget(self.file_view)
         
         layout.addWidget(list_container)
         
@@ -1131,9 +2311,6 @@ class PrinterApp(QMainWindow):
         btn_layout.addStretch()
         layout.addWidget(btn_container)
         
-        # 存储文件项的列表
-        self.file_items = []
-        
         # 在工具栏中添加搜索和排序控件
         toolbar_row2 = QHBoxLayout()
         toolbar_row2.setSpacing(20)
@@ -1144,8 +2321,13 @@ class PrinterApp(QMainWindow):
         toolbar_row2.addWidget(search_label)
         
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("输入文件名进行搜索")
-        self.search_input.textChanged.connect(self.filter_files)
+        self.search_input.setPlaceholderText("输入文件名或拼音进行搜索，.pdf 筛选类型")
+        # 停止输入一小段时间后再搜索，连续输入时不会每个字都查一遍
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.filter_files)
+        self.search_input.textChanged.connect(self.search_timer.start)
         toolbar_row2.addWidget(self.search_input)
         
         # 添加排序选项
@@ -1154,7 +2336,7 @@ class PrinterApp(QMainWindow):
         toolbar_row2.addWidget(sort_label)
         
         self.sort_combo = CustomComboBox()
-        self.sort_combo.addItems(["名称升序", "名称降序", "类型升序", "类型降序", "大小升序", "大小降序"])
+        self.sort_combo.addItems(list(SORT_OPTIONS))
         self.sort_combo.currentTextChanged.connect(self.sort_files)
         toolbar_row2.addWidget(self.sort_combo)
         
@@ -1164,11 +2346,59 @@ class PrinterApp(QMainWindow):
         self.select_all_btn.setFixedWidth(80)
         toolbar_row2.addWidget(self.select_all_btn)
         
+        self.invert_select_btn = QPushButton("反选")
+        self.invert_select_btn.clicked.connect(self.invert_selection)
+        toolbar_row2.addWidget(self.invert_select_btn)
+        
+        self.select_by_btn = QPushButton("按条件选择")
+        self.select_by_btn.setToolTip("按格式、名称、大小或修改日期批量选择；按住 Shift 单击勾选框可以选择一个范围")
+        self.select_by_btn.clicked.connect(self.select_by_filter)
+        toolbar_row2.addWidget(self.select_by_btn)
+        self.last_checked_row: Optional[int] = None  # 上一次单击勾选框的行，Shift+单击时作为范围起点
+        
+        # 相同打印设置的文件连续打印
+        self.group_checkbox = QCheckBox("按打印设置分组打印")
+        self.group_checkbox.toggled.connect(self.on_group_by_settings_changed)
+        toolbar_row2.addWidget(self.group_checkbox)
+        
+        # 连续的同设置 PDF/图片合并成一个打印任务
+        self.coalesce_checkbox = QCheckBox("合并小文件打印")
+        if not pdf_tools.is_available():
+            self.coalesce_checkbox.setEnabled(False)
+            self.coalesce_checkbox.setToolTip("需要安装 pypdf")
+        toolbar_row2.addWidget(self.coalesce_checkbox)
+        
+        # 扫描子文件夹和筛选规则
+        self.scan_rules = ScanRules()
+        self.recursive_checkbox = QCheckBox("包含子文件夹")
+        self.recursive_checkbox.toggled.connect(self.reload_file_list)
+        toolbar_row2.addWidget(self.recursive_checkbox)
+        
+        self.rules_btn = QPushButton("筛选规则")
+        self.rules_btn.clicked.connect(self.edit_scan_rules)
+        toolbar_row2.addWidget(self.rules_btn)
+        
+        # 监视文件夹，新增/删除/重命名的文件直接更新到列表
+        self.watch_checkbox = QCheckBox("监视文件夹")
+        self.watch_checkbox.toggled.connect(self.update_watcher)
+        toolbar_row2.addWidget(self.watch_checkbox)
+        
         toolbar_row2.addStretch()
         toolbar_layout.addLayout(toolbar_row2)
         
-        # 添加文件选择状态存储
-        self.file_selections = {}
+        # 后台扫描文件夹，扫描结果分批加入列表
+        self.scan_id = 0
+        self.scan_cancel_event: Optional[threading.Event] = None
+        self.scan_signals = FolderScanSignals(self)
+        self.scan_signals.batch_ready.connect(self.on_scan_batch)
+        self.scan_signals.files_removed.connect(self.on_files_removed)
+        self.scan_signals.finished.connect(self.on_scan_finished)
+        self.scan_signals.pages_ready.connect(self.on_folder_pages)
+        self.scan_signals.contents_indexed.connect(self.on_contents_indexed)
+        self.pages_requested = set()  # 已经交给后台统计页数的文件
+        self.watcher: Optional[folder_watcher.FolderWatcher] = None
+        self.watch_signals = FolderWatchSignals(self)
+        self.watch_signals.changes_ready.connect(self.on_watch_changes)
         
         # 添加定时器以定期更新打印机状态
         self.status_timer = QTimer()
@@ -1179,7 +2409,36 @@ class PrinterApp(QMainWindow):
         self.setAcceptDrops(True)
         
         # 创建打印队列
-        self.print_queue = PrintQueue()
+        # 设置 PRINT_ALL_COMPLETED_WINDOW 调整内存中保留的已结束任务数
+        self.print_queue = PrintQueue(int(os.environ.get("PRINT_ALL_COMPLETED_WINDOW", PrintQueue.COMPLETED_WINDOW)))
+        
+        # 打印调度线程池，打印过程不占用界面线程
+        self.dispatcher = PrintDispatcher(self.backend, parent=self)
+        self.dispatcher.task_progress.connect(self.on_task_progress)
+        self.dispatcher.task_completed.connect(self.on_task_completed)
+        self.dispatcher.task_failed.connect(self.on_task_failed)
+        self.dispatcher.task_cancelled.connect(self.on_task_cancelled)
+        self.dispatcher.task_printed.connect(self.print_queue.task_printed)
+        
+        # 打印机池，为空时只使用当前选择的打印机
+        # 调度时使用状态定时器查询到的打印机状态，派发任务时不再逐台查询
+        self.scheduler = PrinterPoolScheduler(self.print_queue, self.dispatcher, self.cached_printer_status)
+        self.pool_printers: List[str] = []
+        self.pool_limit = 1
+        self.update_scheduler_printers()
+        self.printer_combo.currentTextChanged.connect(self.update_scheduler_printers)
+        
+        # 文件元数据索引，页数等按 (路径, 大小, 修改时间) 缓存
+        self.file_index = FileIndex("file_index.db")
+        self.page_counter = PageCounter(self.file_index)
+        self.page_count_signals = PageCountSignals(self)
+        # 文件内容的全文索引，扫描完成后在后台补上新增和变化的文件
+        self.content_index = ContentIndex("content_index.db")
+        self.content_cancel_event = threading.Event()
+        # 单独的线程池，建索引的时间再长也不会挡住扫描和统计页数
+        self.content_pool = QThreadPool(self)
+        self.content_pool.setMaxThreadCount(1)
+        self.page_count_signals.finished.connect(self.on_pages_counted)
         
         # 添加打印任务管理按钮
         self.queue_btn = QPushButton("打印任务管理")
@@ -1219,331 +2478,276 @@ class PrinterApp(QMainWindow):
             QMessageBox.warning(self, "警告", "请先选择文件夹！")
             return
             
-        # 清除现有列表
-        for item in self.file_items:
-            item.deleteLater()
-        self.file_items.clear()
-        self.file_selections.clear()
-        
-        # 获取文件列表
-        files = []
-        supported_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.txt', '.jpg', '.jpeg', '.png']
+        # 取消上一次还没完成的扫描
+        if self.scan_cancel_event:
+            self.scan_cancel_event.set()
+        self.scan_id += 1
+        self.scan_cancel_event = threading.Event()
+        self.content_cancel_event.set()
+        self.content_cancel_event = threading.Event()
         
-        for file in os.listdir(path):
-            ext = os.path.splitext(file)[1].lower()
-            if ext not in supported_extensions:
-                continue
-            
-            file_path = os.path.join(path, file)
-            size = os.path.getsize(file_path)
-            files.append({
-                'name': file,
-                'ext': ext,
-                'size': size,
-                'path': file_path
-            })
-        
-        # 应用当前排序
-        self.sort_files(self.sort_combo.currentText(), files)
-        
-        # 创建文件列表项
-        for file_info in files:
-            item = self.create_file_item(file_info)
-            self.list_layout.addWidget(item)
-            self.file_items.append(item)
-            self.file_selections[file_info['name']] = False
-        
-        if not self.file_items:
+        # 清除现有列表
+        self.file_model.clear()
+        self.pages_requested.clear()
+        self.search_index = SearchIndex()
+        
+        # 扫描过的文件夹先按索引立即显示，后台扫描只补充差异
+        rules = replace(self.scan_rules, recursive=self.recursive_checkbox.isChecked())
+        known = [record for record in self.file_index.folder_records(path, rules.recursive)
+                 if rules.match_record(record)]
+        self.on_scan_batch(self.scan_id, known)
+        QThreadPool.globalInstance().start(
+            FolderScanRunnable(self.scan_id, path, rules, self.file_index, known, self.search_index,
+                               self.scan_cancel_event, self.scan_signals))
+        self.update_watcher()
+    
+    def update_watcher(self):
+        # 切换文件夹、筛选规则或监视开关后重新开始监视
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        path = self.path_input.text()
+        if not self.watch_checkbox.isChecked() or not path or not os.path.isdir(path):
+            return
+        rules = replace(self.scan_rules, recursive=self.recursive_checkbox.isChecked())
+        scan_id = self.scan_id
+        self.watcher = folder_watcher.create_watcher(
+            path, rules, lambda changes: self.handle_watch_changes(scan_id, path, changes))
+        self.watcher.start()
+    
+    def handle_watch_changes(self, scan_id: int, root: str, changes: List[folder_watcher.FileChange]):
+        # 在监视线程中调用：先更新索引，再交给界面线程更新列表
+        self.file_index.sync([change.record for change in changes if change.record])
+        removed = [change.old_name if change.kind == folder_watcher.RENAMED else change.name
+                   for change in changes
+                   if change.kind == folder_watcher.RENAMED or
+                   (change.kind == folder_watcher.REMOVED and not change.is_dir)]
+        self.file_index.remove(os.path.join(root, name) for name in removed)
+        self.content_index.remove(os.path.join(root, name) for name in removed)
+        self.watch_signals.changes_ready.emit(scan_id, changes)
+    
+    def on_watch_changes(self, scan_id: int, changes: List[folder_watcher.FileChange]):
+        if scan_id != self.scan_id:
+            return
+        added = []
+        for change in changes:
+            if change.kind == folder_watcher.RESCAN:
+                self.load_file_list()
+                return
+            if change.kind in (folder_watcher.ADDED, folder_watcher.MODIFIED):
+                added.append(change.record)
+                self.search_index.add([change.name])
+            elif change.kind == folder_watcher.RENAMED:
+                self.rename_file_item(change.old_name, change.record)
+            elif change.is_dir:
+                prefix = change.name + os.sep
+                self.remove_file_items({entry.name for entry in self.file_model.entries()
+                                        if entry.name.startswith(prefix)})
+            else:
+                self.remove_file_items({change.name})
+        self.on_scan_batch(scan_id, added)
+        self.index_file_contents(added)
+    
+    def reload_file_list(self):
+        if self.path_input.text():
+            self.load_file_list()
+    
+    def edit_scan_rules(self):
+        dialog = ScanRulesDialog(self.scan_rules, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.scan_rules = dialog.rules(self.recursive_checkbox.isChecked())
+            self.reload_file_list()
+    
+    def on_scan_batch(self, scan_id: int, files: List[Dict]):
+        if scan_id != self.scan_id or not files:
+            return  # 已经切换到其他文件夹
+        self.file_model.add_records(files)
+        if self.file_proxy.filtering:
+            self.search_timer.start()  # 新文件可能符合正在进行的搜索
+    
+    def on_files_removed(self, scan_id: int, paths: List[str]):
+        if scan_id != self.scan_id:
+            return
+        root = self.path_input.text()
+        self.remove_file_items({os.path.relpath(path, root) for path in paths})
+        self.content_index.remove(paths)
+    
+    def remove_file_items(self, names: set):
+        self.file_model.remove_names(names)
+        self.search_index.remove(names)
+    
+    def rename_file_item(self, old_name: str, file_info: Dict):
+        # 重命名后保留原来的选中状态和打印设置
+        self.search_index.rename(old_name, file_info['name'])
+        if not self.file_model.rename(old_name, file_info):
+            self.file_model.add_records([file_info])
+        if self.file_proxy.filtering:
+            self.search_timer.start()
+    
+    def on_scan_finished(self, scan_id: int):
+        if scan_id != self.scan_id:
+            return
+        self.scan_cancel_event = None
+        if not self.file_model.rowCount():
             QMessageBox.information(self, "提示", "未找到支持的文件格式！")
+            return
+        if self.file_model.sorts_by('pages'):
+            self.count_missing_pages()
+        self.index_file_contents(self.file_model.entries())
     
-    def create_file_item(self, file_info):
-        item = QWidget()
-        item.setObjectName("list_item")
-        item_layout = QHBoxLayout(item)
-        item_layout.setContentsMargins(15, 5, 15, 5)
-        item_layout.setSpacing(15)
-        
-        # 添加复选框
-        checkbox = QCheckBox()
-        checkbox.setStyleSheet("""
-            QCheckBox {
-                padding: 5px;
-            }
-            QCheckBox::indicator {
-                width: 20px;
-                height: 20px;
-            }
-            QCheckBox::indicator:unchecked {
-                border: 2px solid #dcdde1;
-                background: white;
-                border-radius: 4px;
-            }
-            QCheckBox::indicator:checked {
-                border: 2px solid #3498db;
-                background: #3498db;
-                border-radius: 4px;
-            }
-        """)
-        checkbox.stateChanged.connect(lambda state, name=file_info['name']: self.on_file_selection_changed(name, state))
-        item_layout.addWidget(checkbox)
-        
-        # 文件名
-        name_label = QLabel(file_info['name'])
-        name_label.setFixedWidth(250)
-        name_label.setStyleSheet("""
-            padding: 8px;
-            background: white;
-            border: 1px solid #dcdde1;
-            border-radius: 4px;
-        """)
-        name_label.setToolTip(file_info['name'])
-        item_layout.addWidget(name_label)
-        
-        # 文件格式
-        ext_label = QLabel(file_info['ext'][1:].upper())
-        ext_label.setFixedWidth(80)
-        ext_label.setStyleSheet("""
-            padding: 8px;
-            background: white;
-            border: 1px solid #dcdde1;
-            border-radius: 4px;
-        """)
-        item_layout.addWidget(ext_label)
-        
-        # 纸张大小选择
-        paper_combo = CustomComboBox()
-        paper_combo.addItems(["A4", "A3", "B5", "Letter", "Legal"])
-        paper_combo.setFixedWidth(100)
-        item_layout.addWidget(paper_combo)
-        
-        # 打印方向选择
-        orientation_combo = CustomComboBox()
-        orientation_combo.addItems(["纵向", "横向"])
-        orientation_combo.setFixedWidth(100)
-        item_layout.addWidget(orientation_combo)
-        
-        # 页面范围输入框
-        page_range_input = QLineEdit()
-        page_range_input.setPlaceholderText("全部")
-        page_range_input.setToolTip("输入格式：1-3,5,7-9")
-        page_range_input.setFixedWidth(120)
-        page_range_input.setStyleSheet("""
-            QLineEdit {
-                padding: 8px;
-                border: 1px solid #dcdde1;
-                border-radius: 4px;
-                background: white;
-            }
-            QLineEdit:focus {
-                border-color: #3498db;
-            }
-        """)
-        item_layout.addWidget(page_range_input)
-        
-        # 颜色模式选择
-        color_combo = CustomComboBox()
-        color_combo.addItems(["彩色", "黑白"])
-        color_combo.setFixedWidth(100)
-        item_layout.addWidget(color_combo)
-        
-        # 单双面选择
-        sides_combo = SidesComboBox()
-        sides_combo.addItems(["单面", "双面长边", "双面短边"])
-        sides_combo.setFixedWidth(100)
-        item_layout.addWidget(sides_combo)
-        
-        # 打印份数
-        copies_spin = QSpinBox()
-        copies_spin.setMinimum(1)
-        copies_spin.setMaximum(99)
-        copies_spin.setFixedWidth(100)
-        copies_spin.setStyleSheet("""
-            QSpinBox {
-                padding: 8px;
-                border: 1px solid #dcdde1;
-                border-radius: 4px;
-                background: white;
-            }
-            QSpinBox::up-button, QSpinBox::down-button {
-                width: 20px;
-                border: none;
-                background: #f8f9fa;
-            }
-            QSpinBox::up-button:hover, QSpinBox::down-button:hover {
-                background: #f1f2f6;
-            }
-        """)
-        item_layout.addWidget(copies_spin)
-        
-        # 添加预览按钮
-        preview_btn = QPushButton("预览")
-        preview_btn.setFixedWidth(60)
-        preview_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #3498db;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px;
-                font-size: 12px;
-                min-width: 60px;
-            }
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-        """)
-        preview_btn.clicked.connect(lambda checked, f=file_info['name']: self.preview_file(f))
-        item_layout.addWidget(preview_btn)
-        
-        item_layout.addStretch()
-        return item
+    def index_file_contents(self, files):
+        # files: FileEntry 或扫描记录
+        files = [(f['path'], f['size'], f['mtime']) if isinstance(f, dict) else (f.path, f.size, f.mtime)
+                 for f in files]
+        files = [f for f in files if os.path.splitext(f[0])[1].lower() in CONTENT_EXTENSIONS]
+        if files:
+            self.content_pool.start(
+                ContentIndexRunnable(self.scan_id, self.content_index, files,
+                                     self.content_cancel_event, self.scan_signals))
+    
+    def on_contents_indexed(self, scan_id: int, count: int):
+        # 新索引的文件可能符合正在进行的搜索
+        if scan_id == self.scan_id and self.file_proxy.filtering:
+            self.search_timer.start()
+    
+    def count_missing_pages(self):
+        # 按页数排序需要每个文件的页数，索引中没有的在后台统计
+        paths = [entry.path for entry in self.file_model.entries()
+                 if entry.pages is None and entry.path not in self.pages_requested]
+        if not paths:
+            return
+        self.pages_requested.update(paths)
+        if self.scan_cancel_event is None:
+            self.scan_cancel_event = threading.Event()
+        QThreadPool.globalInstance().start(
+            FolderPagesRunnable(self.scan_id, self.page_counter, paths, self.scan_cancel_event, self.scan_signals))
+    
+    def on_folder_pages(self, scan_id: int, counts: Dict[str, int]):
+        if scan_id == self.scan_id:
+            self.file_model.set_pages(counts)
+    
+    def on_file_clicked(self, proxy_index):
+        column = proxy_index.column()
+        if column == COLUMN_CHECK:
+            # 勾选框已经由视图切换过，Shift+单击时把同样的状态应用到上一次单击的行到这一行
+            row = proxy_index.row()
+            last = self.last_checked_row
+            if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier and \
+                    last is not None and last < self.file_proxy.rowCount():
+                checked = self.file_model.entry(self.file_proxy.mapToSource(proxy_index).row()).checked
+                rows = self.file_proxy.source_rows()[min(last, row):max(last, row) + 1]
+                self.file_model.set_rows_checked(rows, checked)
+            self.last_checked_row = row
+        elif column == COLUMN_PREVIEW:
+            entry = self.file_model.entry(self.file_proxy.mapToSource(proxy_index).row())
+            self.preview_file(entry.name)
+        elif column in FIELDS:
+            self.file_view.edit(proxy_index)
     
     def preview_file(self, file_name):
         file_path = os.path.join(self.path_input.text(), file_name)
         preview_window = PreviewWindow(file_path, self)
         preview_window.show()
     
+    def commit_open_editor(self):
+        # 正在编辑的单元格先写入模型并关闭编辑器，不依赖点击按钮时编辑器失去焦点
+        editor = self.file_view.indexWidget(self.file_view.currentIndex())
+        if editor is not None:
+            self.file_view.commitData(editor)
+            self.file_view.closeEditor(editor, QAbstractItemDelegate.EndEditHint.NoHint)
+    
     def print_files(self):
-        if not self.file_items:
+        if not self.file_model.rowCount():
             QMessageBox.warning(self, "警告", "请先选择要打印的文件！")
             return
         
-        printer_name = self.printer_combo.currentText()
-        folder_path = self.path_input.text()
+        self.commit_open_editor()
         
-        # 添加选中的文件到打印队列
-        for item in self.file_items:
-            layout = item.layout()
-            checkbox = layout.itemAt(0).widget()
-            
-            if not checkbox.isChecked():
-                continue
-            
-            file_name = layout.itemAt(1).widget().text()
+        # 添加选中的文件到打印队列，按列表当前的排序
+        tasks = []
+        for entry in self.file_model.checked_entries():
             settings = PrintSettings(
-                paper_size=layout.itemAt(3).widget().currentText(),
-                orientation=layout.itemAt(4).widget().currentText(),
-                page_range=layout.itemAt(5).widget().text(),
-                color_mode=layout.itemAt(6).widget().currentText(),
-                sides_option=layout.itemAt(7).widget().currentText(),
-                copies=layout.itemAt(8).widget().value()
+                paper_size=entry.paper_size,
+                orientation=entry.orientation,
+                page_range=entry.page_range,
+                color_mode=entry.color_mode,
+                sides_option=entry.sides_option,
+                copies=entry.copies
             )
-            
-            task = PrintTask(os.path.join(folder_path, file_name), settings)
+            tasks.append(PrintTask(entry.path, settings))
+        
+        if not tasks:
+            return
+        
+        # 先在后台统计页数，统计完成后再加入打印队列
+        self.print_btn.setEnabled(False)
+        self.print_btn.setText("正在统计页数...")
+        QThreadPool.globalInstance().start(PageCountRunnable(self.page_counter, tasks, self.page_count_signals))
+    
+    def on_pages_counted(self, tasks: List[PrintTask], counts: Dict[str, int]):
+        self.print_btn.setEnabled(True)
+        self.print_btn.setText("开始打印")
+        self.file_model.set_pages(counts)
+        for task in tasks:
+            task.set_page_count(counts.get(task.file_path, 1))
+        
+        # 合并时按真实页数计算预算
+        if self.coalesce_checkbox.isChecked():
+            tasks = coalesce_tasks(tasks)
+        for task in tasks:
             self.print_queue.add_task(task)
         
         # 开始打印队列中的第一个任务
         self.process_print_queue()
     
     def process_print_queue(self):
-        if self.print_queue.current_task or not self.print_queue.waiting_tasks:
-            return
-        
-        task = self.print_queue.start_next_task()
-        if not task:
-            return
-        
-        try:
-            printer_name = self.printer_combo.currentText()
-            
-            # 设置默认打印机
-            win32print.SetDefaultPrinter(printer_name)
-            
-            # 打开打印机
-            handle = win32print.OpenPrinter(printer_name)
-            try:
-                # 获取打印机默认设置
-                properties = win32print.GetPrinter(handle, 2)
-                devmode = properties['pDevMode']
-                
-                # 设置打印参数
-                PAPER_SIZES = {
-                    "A4": win32con.DMPAPER_A4,
-                    "A3": win32con.DMPAPER_A3,
-                    "B5": win32con.DMPAPER_B5,
-                    "Letter": win32con.DMPAPER_LETTER,
-                    "Legal": win32con.DMPAPER_LEGAL
-                }
-                
-                if task.settings.paper_size in PAPER_SIZES:
-                    devmode.PaperSize = PAPER_SIZES[task.settings.paper_size]
-                
-                if task.settings.orientation == "横向":
-                    devmode.Orientation = win32con.DMORIENT_LANDSCAPE
-                else:
-                    devmode.Orientation = win32con.DMORIENT_PORTRAIT
-                
-                if task.settings.sides_option == "单面":
-                    devmode.Duplex = win32con.DMDUP_SIMPLEX
-                elif task.settings.sides_option == "双面长边":
-                    devmode.Duplex = win32con.DMDUP_VERTICAL
-                elif task.settings.sides_option == "双面短边":
-                    devmode.Duplex = win32con.DMDUP_HORIZONTAL
-                
-                if task.settings.color_mode == "彩色":
-                    devmode.Color = 1
-                else:
-                    devmode.Color = 2
-                
-                try:
-                    win32print.SetPrinter(handle, 2, properties, 0)
-                except:
-                    pass
-                
-                # 打印文件
-                for _ in range(task.settings.copies):
-                    if task.status == PrintStatus.CANCELLED:
-                        break
-                    
-                    while task.status == PrintStatus.PAUSED:
-                        time.sleep(0.1)
-                    
-                    try:
-                        with open(task.file_path, 'rb') as f:
-                            data = f.read()
-                        
-                        job = win32print.StartDocPrinter(handle, 1, (task.file_name, None, "RAW"))
-                        try:
-                            win32print.StartPagePrinter(handle)
-                            win32print.WritePrinter(handle, data)
-                            win32print.EndPagePrinter(handle)
-                            task.update_progress(1, 1)  # 临时方案，后续添加实际页数统计
-                        finally:
-                            win32print.EndDocPrinter(handle)
-                    
-                    except Exception as e:
-                        raise Exception(f"打印失败: {str(e)}")
-                
-                if task.status != PrintStatus.CANCELLED:
-                    self.print_queue.complete_current_task()
-                
-            finally:
-                win32print.ClosePrinter(handle)
-        
-        except Exception as e:
-            self.print_queue.fail_current_task(str(e))
-        
+        if self.print_queue.waiting:
+            self.scheduler.schedule()
+    
+    def update_scheduler_printers(self, *args):
+        # 打印机池、并发数或选择的打印机变化时更新调度器
+        if self.pool_printers:
+            self.scheduler.set_printers(self.pool_printers, self.pool_limit)
+        elif self.printer_combo.currentText():
+            self.scheduler.set_printers([self.printer_combo.currentText()], skip_unavailable=False)
+    
+    def on_task_progress(self, task: PrintTask, bytes_sent: int, bytes_total: int):
+        current_page = task.total_pages * bytes_sent // bytes_total if bytes_total else task.total_pages
+        task.update_progress(current_page, task.total_pages, bytes_sent, bytes_total)
+    
+    def on_task_completed(self, task: PrintTask):
+        self.scheduler.task_finished(task)
+        self.print_queue.complete_task(task)
         # 继续处理下一个任务
-        QTimer.singleShot(100, self.process_print_queue)
+        self.process_print_queue()
+    
+    def on_task_failed(self, task: PrintTask, error_message: str):
+        self.scheduler.task_finished(task)
+        self.print_queue.fail_task(task, error_message)
+        self.process_print_queue()
+    
+    def on_task_cancelled(self, task: PrintTask):
+        # 取消时任务已由打印队列移入历史记录
+        self.scheduler.task_finished(task)
+        self.process_print_queue()
     
     def get_printer_status(self, printer_name):
-        try:
-            handle = win32print.OpenPrinter(printer_name)
-            try:
-                info = win32print.GetPrinter(handle, 2)
-                return info['Status']
-            finally:
-                win32print.ClosePrinter(handle)
-        except:
-            return 0
+        return self.backend.get_status(printer_name)
+    
+    def cached_printer_status(self, printer_name):
+        # 打印机列表中保存的状态(update_printer_status 每 5 秒刷新)，列表中没有时才查询
+        for i in range(self.printer_combo.count()):
+            data = self.printer_combo.itemData(i, Qt.ItemDataRole.UserRole)
+            if data and data[0] == printer_name:
+                return data[1]
+        return self.get_printer_status(printer_name)
             
     def update_printer_list(self):
         self.printer_combo.clear()
         self.printers = []
         
         # 获取打印机列表和状态
-        for printer in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS):
-            name = printer[2]
+        for name in self.backend.enum_printers():
             status = self.get_printer_status(name)
             self.printers.append((name, status))
             
@@ -1553,7 +2757,7 @@ class PrinterApp(QMainWindow):
             self.printer_combo.setItemData(index, (name, status), Qt.ItemDataRole.UserRole)
             
         # 设置默认打印机
-        self.default_printer = win32print.GetDefaultPrinter()
+        self.default_printer = self.backend.get_default_printer()
         default_index = next((i for i, p in enumerate(self.printers) if p[0] == self.default_printer), 0)
         self.printer_combo.setCurrentIndex(default_index)
         
@@ -1563,6 +2767,42 @@ class PrinterApp(QMainWindow):
             status = self.get_printer_status(name)
             self.printer_combo.setItemData(i, (name, status), Qt.ItemDataRole.UserRole)
         self.printer_combo.update()
+        
+        # 打印机恢复就绪后继续派发等待中的任务
+        if self.pool_printers:
+            self.process_print_queue()
+    
+    def on_group_by_settings_changed(self, checked):
+        self.print_queue.set_group_by_settings(checked)
+    
+    def build_pool_menu(self):
+        self.pool_menu.clear()
+        for name, _ in self.printers:
+            action = self.pool_menu.addAction(name)
+            action.setCheckable(True)
+            action.setChecked(name in self.pool_printers)
+            action.toggled.connect(lambda checked, n=name: self.toggle_pool_printer(n, checked))
+        self.pool_menu.addSeparator()
+        limit_action = self.pool_menu.addAction(f"每台打印机并发任务数: {self.pool_limit}")
+        limit_action.triggered.connect(self.set_pool_limit)
+    
+    def toggle_pool_printer(self, printer_name, checked):
+        if checked and printer_name not in self.pool_printers:
+            self.pool_printers.append(printer_name)
+        elif not checked and printer_name in self.pool_printers:
+            self.pool_printers.remove(printer_name)
+        
+        self.printer_combo.setEnabled(not self.pool_printers)
+        self.pool_btn.setText(f"打印机池 ({len(self.pool_printers)})" if self.pool_printers else "打印机池")
+        self.update_scheduler_printers()
+        self.process_print_queue()
+    
+    def set_pool_limit(self):
+        limit, ok = QInputDialog.getInt(self, "打印机池", "每台打印机同时打印的任务数:", self.pool_limit, 1, 16)
+        if ok:
+            self.pool_limit = limit
+            self.update_scheduler_printers()
+            self.process_print_queue()
     
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -1587,17 +2827,21 @@ class PrinterApp(QMainWindow):
                 QMessageBox.warning(self, "警告", "请先选择目标文件夹！")
                 return
             
+            copied = []
             for file_path in files:
                 file_name = os.path.basename(file_path)
                 target_path = os.path.join(current_path, file_name)
                 try:
-                    import shutil
                     shutil.copy2(file_path, target_path)
+                    copied.append(record_for_path(target_path, file_name))
                 except Exception as e:
                     QMessageBox.warning(self, "错误", f"复制文件失败: {str(e)}")
             
-            # 重新加载文件列表
-            self.load_file_list()
+            # 只把复制进来的文件加入列表(已经显示的同名文件保持不变)
+            rules = replace(self.scan_rules, recursive=self.recursive_checkbox.isChecked())
+            copied = [record for record in copied if rules.match_record(record)]
+            self.file_index.sync(copied)
+            self.on_scan_batch(self.scan_id, copied)
     
     def on_page_range_changed(self, text):
         if text == "指定页面":
@@ -1605,93 +2849,90 @@ class PrinterApp(QMainWindow):
         else:
             self.page_range_input.hide()
     
-    def on_file_selection_changed(self, file_name, state):
-        self.file_selections[file_name] = (state == Qt.CheckState.Checked.value)
-        
+    def update_select_all_text(self, *args):
         # 更新全选按钮状态
-        all_selected = all(self.file_selections.values())
-        any_selected = any(self.file_selections.values())
-        
-        if all_selected:
-            self.select_all_btn.setText("取消全选")
-        elif any_selected:
-            self.select_all_btn.setText("全选")
-        else:
-            self.select_all_btn.setText("全选")
+        count = self.file_model.rowCount()
+        all_selected = count > 0 and self.file_model.checked_count == count
+        self.select_all_btn.setText("取消全选" if all_selected else "全选")
     
     def toggle_select_all(self):
+        # 搜索时只切换搜索结果的选中状态
+        if self.file_proxy.filtering:
+            rows = self.file_proxy.source_rows()
+            all_selected = bool(rows) and all(self.file_model.entry(row).checked for row in rows)
+            self.file_model.set_rows_checked(rows, not all_selected)
+            return
+        
         # 检查当前是否全部选中
-        all_selected = all(self.file_selections.values())
+        count = self.file_model.rowCount()
+        all_selected = count > 0 and self.file_model.checked_count == count
         
         # 切换所有文件的选中状态
-        for item in self.file_items:
-            checkbox = item.layout().itemAt(0).widget()
-            checkbox.setChecked(not all_selected)
-        
-        # 更新按钮文本
-        self.select_all_btn.setText("取消全选" if not all_selected else "全选")
+        self.file_model.set_all_checked(not all_selected)
+    
+    def visible_rows(self):
+        # 搜索时批量选择只作用于搜索结果
+        return self.file_proxy.source_rows() if self.file_proxy.filtering else None
+    
+    def invert_selection(self):
+        self.file_model.invert_checked(self.visible_rows())
+    
+    def select_by_filter(self):
+        dialog = SelectFilesDialog(self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        mode = dialog.mode()
+        self.file_model.set_checked_where(dialog.selection_filter(), checked=mode != 1,
+                                          rows=self.visible_rows(), only=mode == 2)
     
     def filter_files(self):
-        search_text = self.search_input.text().lower()
-        
-        for item in self.file_items:
-            file_name = item.layout().itemAt(1).widget().text().lower()
-            item.setVisible(search_text in file_name)
-    
-    def sort_files(self, sort_option, files=None):
-        if files is None:
-            # 获取当前显示的文件列表
-            files = []
-            for item in self.file_items:
-                layout = item.layout()
-                name = layout.itemAt(1).widget().text()
-                ext = layout.itemAt(2).widget().text().lower()
-                path = os.path.join(self.path_input.text(), name)
-                size = os.path.getsize(path)
-                files.append({
-                    'name': name,
-                    'ext': f".{ext}",
-                    'size': size,
-                    'path': path
-                })
-        
-        # 根据选项排序
-        if sort_option == "名称升序":
-            files.sort(key=lambda x: x['name'].lower())
-        elif sort_option == "名称降序":
-            files.sort(key=lambda x: x['name'].lower(), reverse=True)
-        elif sort_option == "类型升序":
-            files.sort(key=lambda x: x['ext'].lower())
-        elif sort_option == "类型降序":
-            files.sort(key=lambda x: x['ext'].lower(), reverse=True)
-        elif sort_option == "大小升序":
-            files.sort(key=lambda x: x['size'])
-        elif sort_option == "大小降序":
-            files.sort(key=lambda x: x['size'], reverse=True)
-        
-        if files is not None:
+        # 先按文件名匹配，再加上只有内容包含搜索词的文件(排在后面，名称下显示摘要)
+        text = self.search_input.text()
+        if not text.strip():
+            self.file_proxy.set_matches(None)
             return
-            
-        # 重新排列文件列表
-        for item in self.file_items:
-            self.list_layout.removeWidget(item)
-            item.hide()
-        
-        # 按新顺序添加文件
-        for file_info in files:
-            for item in self.file_items:
-                if item.layout().itemAt(1).widget().text() == file_info['name']:
-                    self.list_layout.addWidget(item)
-                    item.show()
-                    break
+        matches = self.search_index.search(text)
+        root = self.path_input.text()
+        snippets = {}
+        # 名称匹配程度是各搜索词之和，没有上限，只有内容匹配的文件用比所有名称匹配都大的值
+        content_score = max(matches.values(), default=0) + 1
+        for path, snippet in self.content_index.search(text, root).items():
+            name = os.path.relpath(path, root)
+            snippets[name] = snippet
+            matches.setdefault(name, content_score)
+        self.file_proxy.set_matches(matches, snippets)
+    
+    def sort_files(self, sort_option):
+        # 由模型按缓存的排序键重新排列，切换回用过的排序方式时直接使用缓存的结果
+        self.file_model.sort_by(SORT_OPTIONS[sort_option])
+        if self.file_model.sorts_by('pages') and self.scan_cancel_event is None:
+            self.count_missing_pages()
+    
+    def closeEvent(self, event):
+        # 取消正在打印的任务并等待打印线程退出
+        for task in list(self.print_queue.active_tasks):
+            self.print_queue.cancel_task(task)
+        self.dispatcher.shutdown()
+        if self.scan_cancel_event:
+            self.scan_cancel_event.set()
+        self.content_cancel_event.set()
+        if self.watcher:
+            self.watcher.stop()
+        QThreadPool.globalInstance().waitForDone(5000)
+        self.content_pool.waitForDone(5000)
+        self.file_index.close()
+        self.content_index.close()
+        self.print_queue.history.close()
+        super().closeEvent(event)
     
     def show_queue_window(self):
         if not self.queue_window:
-            self.queue_window = PrintQueueWindow(self.print_queue, self)
+            self.queue_window = PrintQueueWindow(self.print_queue, self.dispatcher, self)
         self.queue_window.show()
         self.queue_window.activateWindow()  # 将窗口提升到最前
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后全文索引的提取进程也从这里启动
     app = QApplication(sys.argv)
     app.setStyle("Fusion")  # 使用Fusion风格
     window = PrinterApp()
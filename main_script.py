@@ -8,6 +8,7 @@ from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton,
                                QFileDialog, QTableWidget, QTableWidgetItem, QCheckBox, QHeaderView, QMessageBox,
                                QSpinBox, QLineEdit, QHBoxLayout, QAbstractItemView)
 from PySide6.QtCore import Qt
+from file_scanner import scan_folder, ScanRules
 
 # Check for admin privileges
 def is_admin():
@@ -120,9 +121,10 @@ class PrintApp(QMainWindow):
         folder_path = QFileDialog.getExistingDirectory(self, "选择文件夹")
         if folder_path:
             self.folder_input.setText(folder_path)
-            for root, _, files in os.walk(folder_path):
-                for file_name in files:
-                    self.add_file_to_list(os.path.join(root, file_name))
+            # 并行列出子文件夹，网络共享上比逐个 os.walk 快得多
+            for batch in scan_folder(folder_path, ScanRules(extensions=[], recursive=True)):
+                for record in batch:
+                    self.add_file_to_list(record['path'])
 
     def add_file_to_list(self, file_path):
         row_position = self.file_list.rowCount()
@@ -0,0 +1,313 @@
+import os
+import re
+import math
+import mmap
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+from PIL import Image
+
+from file_index import FileIndex, sniff_type
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# 纯文本按每页行数估算
+TEXT_LINES_PER_PAGE = 60
+# Excel 默认 A4 纵向大约每页 50 行、10 列
+EXCEL_ROWS_PER_PAGE = 50
+EXCEL_COLUMNS_PER_PAGE = 10
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.tif', '.tiff', '.gif', '.bmp']
+
+
+def count_pages(file_path: str) -> int:
+    # 按格式走快速路径，无法识别时返回 1
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext == '.pdf':
+            pages = pdf_page_count(file_path)
+        elif ext == '.docx':
+            pages = docx_page_count(file_path)
+        elif ext == '.xlsx':
+            pages = xlsx_page_count(file_path)
+        elif ext in IMAGE_EXTENSIONS:
+            pages = image_page_count(file_path)
+        elif ext == '.txt':
+            pages = text_page_count(file_path)
+        else:
+            pages = None
+    except Exception:
+        pages = None
+    return max(1, pages or 1)
+
+
+# ---------------------------------------------------------------- PDF
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)\s*[\r\n]+")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_PAGES_REF = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)(?![\d\s]*\s\d+\s+R)")
+_PAGES_NODE = re.compile(rb"/Type\s*/Pages\b")
+
+
+def pdf_page_count(file_path: str) -> Optional[int]:
+    # 先只读尾部的 trailer/xref 找到页树根节点的 /Count，
+    # 交叉引用流等情况交给 pypdf，最后才整文件扫描
+    with open(file_path, 'rb') as f:
+        try:
+            pages = _pdf_count_from_xref(f)
+        except (ValueError, OSError):
+            pages = None
+        if pages:
+            return pages
+
+        if PdfReader is not None:
+            try:
+                return len(PdfReader(f).pages)
+            except Exception:
+                pass
+
+        return _pdf_count_by_scan(f)
+
+
+def _pdf_count_from_xref(f) -> Optional[int]:
+    size = f.seek(0, os.SEEK_END)
+    tail_size = min(size, 2048)
+    f.seek(size - tail_size)
+    matches = _STARTXREF.findall(f.read(tail_size))
+    if not matches:
+        return None
+
+    # 依次读取各个 xref 段(增量更新时新的在前)
+    sections = []
+    root = None
+    offset = int(matches[-1])
+    visited = set()
+    while offset is not None and offset not in visited and len(visited) < 64:
+        visited.add(offset)
+        subsections, trailer = _read_xref_section(f, offset)
+        if subsections is None:
+            return None
+        sections.append(subsections)
+        if root is None:
+            match = _ROOT.search(trailer)
+            root = int(match.group(1)) if match else None
+        match = _PREV.search(trailer)
+        offset = int(match.group(1)) if match else None
+
+    if root is None:
+        return None
+
+    catalog = _read_object(f, _lookup_object(f, sections, root))
+    match = _PAGES_REF.search(catalog or b"")
+    if not match:
+        return None
+    pages_node = _read_object(f, _lookup_object(f, sections, int(match.group(1))))
+    match = _COUNT.search(pages_node or b"")
+    return int(match.group(1)) if match else None
+
+
+def _read_xref_section(f, offset: int):
+    # 只记录子段的位置，条目按固定 20 字节随用随读
+    f.seek(offset)
+    data = f.read(64)
+    if not data.startswith(b"xref"):
+        return None, None  # 交叉引用流
+
+    position = offset + 4
+    subsections = []
+    while True:
+        f.seek(position)
+        header = f.read(64)
+        if header.lstrip().startswith(b"trailer"):
+            break
+        match = _SUBSECTION.match(header)
+        if not match:
+            return None, None
+        start, count = int(match.group(1)), int(match.group(2))
+        entries_offset = position + match.end()
+        subsections.append((start, count, entries_offset))
+        position = entries_offset + count * 20
+
+    f.seek(position)
+    trailer = f.read(4096)
+    end = trailer.find(b"startxref")
+    return subsections, trailer[:end] if end > 0 else trailer
+
+
+def _lookup_object(f, sections, number: int) -> Optional[int]:
+    for subsections in sections:
+        for start, count, entries_offset in subsections:
+            if start <= number < start + count:
+                f.seek(entries_offset + (number - start) * 20)
+                entry = f.read(20)
+                parts = entry.split()
+                if len(parts) < 3 or parts[2] not in (b"n", b"f"):
+                    raise ValueError("xref 条目格式不标准")
+                if parts[2] == b"n":
+                    return int(parts[0])
+                return None
+    return None
+
+
+def _read_object(f, offset: Optional[int]) -> Optional[bytes]:
+    if offset is None:
+        return None
+    f.seek(offset)
+    data = f.read(16384)
+    end = data.find(b"endobj")
+    return data[:end] if end > 0 else data
+
+
+def _pdf_count_by_scan(f) -> Optional[int]:
+    # 页树根节点的 /Count 是所有 Pages 节点中最大的
+    if f.seek(0, os.SEEK_END) == 0:
+        return None
+    best = None
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for match in _PAGES_NODE.finditer(data):
+            start = data.rfind(b"<<", 0, match.start())
+            end = data.find(b">>", match.end())
+            if start < 0 or end < 0:
+                continue
+            count = _COUNT.search(data[start:end])
+            if count:
+                best = max(best or 0, int(count.group(1)))
+    return best
+
+
+# ---------------------------------------------------------------- Office
+
+_DOCX_PAGES = re.compile(rb"<(?:\w+:)?Pages>(\d+)</(?:\w+:)?Pages>")
+_DOCX_PAGE_BREAK = re.compile(rb"<w:lastRenderedPageBreak/>|<w:br [^>]*w:type=\"page\"")
+_DEFINED_NAME = re.compile(r'<definedName\b([^>]*)>([^<]+)</definedName>')
+_SHEET_TAG = re.compile(r'<sheet\b([^>]*)>')
+_CELL_RANGE = re.compile(r"\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?")
+
+
+def docx_page_count(file_path: str) -> Optional[int]:
+    # Word 保存时会把页数写进 docProps/app.xml
+    with zipfile.ZipFile(file_path) as archive:
+        try:
+            match = _DOCX_PAGES.search(archive.read("docProps/app.xml"))
+            if match and int(match.group(1)) > 0:
+                return int(match.group(1))
+        except KeyError:
+            pass
+        # 没有统计信息时按分页符估算
+        document = archive.read("word/document.xml")
+        return len(_DOCX_PAGE_BREAK.findall(document)) + 1
+
+
+def xlsx_page_count(file_path: str) -> Optional[int]:
+    from openpyxl import load_workbook
+
+    # 只读模式下 openpyxl 不提供打印区域，直接读 workbook.xml 里的定义名称
+    with zipfile.ZipFile(file_path) as archive:
+        workbook_xml = archive.read("xl/workbook.xml").decode("utf-8", "ignore")
+    print_areas = {}
+    for attributes, ref in _DEFINED_NAME.findall(workbook_xml):
+        sheet_id = re.search(r'localSheetId="(\d+)"', attributes)
+        if 'name="_xlnm.Print_Area"' in attributes and sheet_id:
+            print_areas[int(sheet_id.group(1))] = ref
+    hidden = ['state="hidden"' in tag or 'state="veryHidden"' in tag for tag in _SHEET_TAG.findall(workbook_xml)]
+
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        total = 0
+        for index, worksheet in enumerate(workbook.worksheets):
+            if index < len(hidden) and hidden[index]:
+                continue
+            ref = print_areas.get(index)
+            area = ref.split("!")[-1].split(",")[0] if ref else worksheet.calculate_dimension()
+            total += _estimate_sheet_pages(area)
+        return total
+    finally:
+        workbook.close()
+
+
+def _estimate_sheet_pages(area: str) -> int:
+    match = _CELL_RANGE.search(area or "")
+    if not match:
+        return 1
+    first_col, first_row, last_col, last_row = match.groups()
+    rows = int(last_row or first_row) - int(first_row) + 1
+    columns = _column_index(last_col or first_col) - _column_index(first_col) + 1
+    return math.ceil(rows / EXCEL_ROWS_PER_PAGE) * math.ceil(columns / EXCEL_COLUMNS_PER_PAGE)
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+# ---------------------------------------------------------------- 图片 / 文本
+
+def image_page_count(file_path: str) -> int:
+    # 多帧 TIFF 每帧一页
+    with Image.open(file_path) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def text_page_count(file_path: str) -> int:
+    lines = 0
+    last = b""
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            lines += chunk.count(b"\n")
+            last = chunk
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    return math.ceil(lines / TEXT_LINES_PER_PAGE)
+
+
+# ---------------------------------------------------------------- 缓存
+
+class PageCounter:
+    # 页数保存在文件元数据索引中，(大小, 修改时间) 不变时直接使用
+    def __init__(self, index: FileIndex):
+        self.index = index
+
+    def count(self, file_path: str) -> int:
+        pages, row = self._count(file_path)
+        if row:
+            self.index.set_pages([row])
+        return pages
+
+    def _count(self, file_path: str):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return 1, None
+        cached = self.index.get_pages(file_path, stat.st_size, stat.st_mtime)
+        if cached is not None:
+            return cached, None
+        pages = count_pages(file_path)
+        try:
+            kind = sniff_type(file_path)
+        except OSError:
+            kind = None
+        return pages, (file_path, stat.st_size, stat.st_mtime, pages, kind)
+
+    def iter_counts(self, file_paths: Iterable[str], max_workers: int = 4,
+                    batch_size: int = 200) -> Iterator[Tuple[str, int]]:
+        # 多线程统计(网络共享上主要耗时在 IO)，按输入顺序产出，新结果批量写入索引
+        file_paths = list(file_paths)
+        pending = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for file_path, (pages, row) in zip(file_paths, executor.map(self._count, file_paths)):
+                if row:
+                    pending.append(row)
+                    if len(pending) >= batch_size:
+                        self.index.set_pages(pending)
+                        pending = []
+                yield file_path, pages
+        self.index.set_pages(pending)
@@ -0,0 +1,131 @@
+import io
+import os
+import re
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # 合并/提取页面需要 pypdf，没有安装时相关功能不可用
+    PdfReader = None
+    PdfWriter = None
+
+PDF_EXTENSIONS = ['.pdf']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+
+
+class PageRangeError(ValueError):
+    pass
+
+
+def parse_page_range(text: str, page_count: Optional[int] = None) -> List[Tuple[int, int]]:
+    # "1-3,5,7-9" -> [(1, 3), (5, 5), (7, 9)]，区间排序并合并重叠/相邻部分
+    # 返回空列表表示全部页面；给出 page_count 时校验页码是否越界
+    text = (text or "").strip()
+    if not text or text == "全部":
+        return []
+
+    # 兼容中文输入法的标点和全角数字
+    text = text.translate(str.maketrans("０１２３４５６７８９，、；－～—", "0123456789,,,---"))
+    text = re.sub(r"\s*([-~])\s*", r"\1", text)
+    ranges = []
+    for part in re.split(r"[,;\s]+", text):
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d+)?(?:(-|~)(\d+)?)?", part)
+        if not match or not (match.group(1) or match.group(3)):
+            raise PageRangeError(f"无法识别的页面范围: {part}")
+        start = int(match.group(1)) if match.group(1) else 1
+        if match.group(2):
+            if match.group(3):
+                end = int(match.group(3))
+            elif page_count is not None:
+                end = page_count  # "5-" 表示到最后一页
+            else:
+                end = start
+        else:
+            end = start
+        if start < 1 or start > end:
+            raise PageRangeError(f"页面范围无效: {part}")
+        if page_count is not None and end > page_count:
+            raise PageRangeError(f"页面范围 {part} 超出文档页数 {page_count}")
+        ranges.append((start, end))
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def count_range_pages(ranges: List[Tuple[int, int]], page_count: int) -> int:
+    if not ranges:
+        return page_count
+    return sum(end - start + 1 for start, end in ranges)
+
+
+def is_available() -> bool:
+    return PdfWriter is not None
+
+
+def can_merge(file_path: str) -> bool:
+    ext = os.path.splitext(file_path)[1].lower()
+    return is_available() and ext in PDF_EXTENSIONS + IMAGE_EXTENSIONS
+
+
+def image_to_pdf_reader(file_path: str):
+    # 图片先在内存中转成单页 PDF
+    buffer = io.BytesIO()
+    with Image.open(file_path) as img:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(buffer, "PDF", resolution=100.0)
+    buffer.seek(0)
+    return PdfReader(buffer)
+
+
+def open_reader(file_path: str):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return image_to_pdf_reader(file_path)
+    return PdfReader(file_path)
+
+
+def add_pages(writer, file_path: str, page_range: str = "") -> int:
+    # 只把页面范围内的页加入 writer，返回加入的页数
+    reader = open_reader(file_path)
+    ranges = parse_page_range(page_range, len(reader.pages))
+    if not ranges:
+        ranges = [(1, len(reader.pages))]
+    for start, end in ranges:
+        for index in range(start - 1, end):
+            writer.add_page(reader.pages[index])
+    return count_range_pages(ranges, len(reader.pages))
+
+
+def extract_pages(file_path: str, page_range: str, output_path: str) -> int:
+    # 生成只包含指定页面的 PDF，只发送需要的页
+    writer = PdfWriter()
+    page_count = add_pages(writer, file_path, page_range)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return page_count
+
+
+def merge_documents(file_paths: List[str], output_path: str,
+                    page_ranges: Optional[List[str]] = None) -> List[int]:
+    # 把多个 PDF/图片合并成一个 PDF，返回每个源文件贡献的页数
+    writer = PdfWriter()
+    page_counts = []
+    for i, file_path in enumerate(file_paths):
+        page_range = page_ranges[i] if page_ranges else ""
+        page_counts.append(add_pages(writer, file_path, page_range))
+
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return page_counts
@@ -0,0 +1,478 @@
+import os
+import re
+import time
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import win32print
+    import win32con
+except ImportError:  # 非 Windows 环境(如 Linux CI)下没有 pywin32
+    win32print = None
+    win32con = None
+
+# 打印机状态位，与 win32print 的 PRINTER_STATUS_* 取值一致
+PRINTER_STATUS_READY = 0
+PRINTER_STATUS_PAUSED = 1
+PRINTER_STATUS_ERROR = 2
+PRINTER_STATUS_PAPER_JAM = 8
+PRINTER_STATUS_PAPER_OUT = 16
+PRINTER_STATUS_PAPER_PROBLEM = 64
+PRINTER_STATUS_OFFLINE = 128
+PRINTER_STATUS_OUTPUT_BIN_FULL = 2048
+PRINTER_STATUS_NO_TONER = 262144
+PRINTER_STATUS_DOOR_OPEN = 4194304
+
+# 处于这些状态的打印机不再派发新任务
+PRINTER_STATUS_UNAVAILABLE = (PRINTER_STATUS_PAUSED | PRINTER_STATUS_ERROR | PRINTER_STATUS_PAPER_JAM |
+                              PRINTER_STATUS_PAPER_OUT | PRINTER_STATUS_OFFLINE | PRINTER_STATUS_NO_TONER |
+                              PRINTER_STATUS_DOOR_OPEN)
+
+# 打印任务状态位，与 win32print 的 JOB_STATUS_* 取值一致
+JOB_STATUS_PAUSED = 0x1
+JOB_STATUS_ERROR = 0x2
+JOB_STATUS_DELETING = 0x4
+JOB_STATUS_SPOOLING = 0x8
+JOB_STATUS_PRINTING = 0x10
+JOB_STATUS_PRINTED = 0x80
+JOB_STATUS_DELETED = 0x100
+
+# EnumJobs 一次最多列出的任务数
+_MAX_ENUM_JOBS = 0x7FFFFFFF
+
+# 流式写入时每次发送的字节数
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+PAPER_SIZES = {
+    "A4": 9,       # DMPAPER_A4
+    "A3": 8,       # DMPAPER_A3
+    "B5": 13,      # DMPAPER_B5
+    "Letter": 1,   # DMPAPER_LETTER
+    "Legal": 5,    # DMPAPER_LEGAL
+}
+
+
+def settings_key(settings, native_copies: bool = False) -> Tuple:
+    # 影响打印机配置的字段，页面范围只影响发送的内容
+    key = (settings.paper_size, settings.orientation, settings.color_mode, settings.sides_option)
+    if native_copies:
+        key += (settings.copies, settings.collate)
+    return key
+
+
+class PrintJob:
+    def __init__(self, printer_name: str, doc_name: str, job_id: int, handle=None):
+        self.printer_name = printer_name
+        self.doc_name = doc_name
+        self.job_id = job_id
+        self.handle = handle
+        self.pages = 1
+        self.settings = None
+        self.copies = 1  # 由驱动完成的份数
+        self.bytes_written = 0
+        self.opened_at = time.time()
+        self.closed_at: Optional[float] = None
+
+
+class PrintBackend:
+    """打印后端接口，调度代码只通过它访问打印机"""
+
+    def enum_printers(self) -> List[str]:
+        raise NotImplementedError
+
+    def get_default_printer(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_status(self, printer_name: str) -> int:
+        raise NotImplementedError
+
+    def get_capabilities(self, printer_name: str) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def open_job(self, printer_name: str, doc_name: str, pages: int = 1,
+                 settings=None, native_copies: bool = False) -> PrintJob:
+        # settings 只作用于这一个任务，不修改打印机的全局默认设置
+        raise NotImplementedError
+
+    def write(self, job: PrintJob, data: bytes) -> int:
+        raise NotImplementedError
+
+    def close_job(self, job: PrintJob) -> None:
+        raise NotImplementedError
+
+    def abort_job(self, job: PrintJob) -> None:
+        # 取消没有写完的任务，不把已写入的部分交给打印机
+        raise NotImplementedError
+
+    def get_job_status(self, printer_name: str, job_id: int) -> Optional[int]:
+        raise NotImplementedError
+
+    def get_job_statuses(self, printer_name: str) -> Dict[int, int]:
+        # 打印机队列中所有任务的状态：任务 id -> 状态位，一次查询代替逐个任务查询
+        raise NotImplementedError
+
+
+class Win32PrintBackend(PrintBackend):
+    def __init__(self):
+        # DeviceCapabilities 要逐项询问驱动，结果按打印机缓存
+        self.capabilities: Dict[str, Dict[str, object]] = {}
+        # 按 (打印机, 打印设置) 缓存准备好的 DEVMODE，驱动配置变化时失效
+        self.devmodes: Dict[Tuple, object] = {}
+        self.driver_signatures: Dict[str, Tuple] = {}
+        self._cache_lock = threading.Lock()
+
+    def invalidate(self, printer_name: Optional[str] = None):
+        with self._cache_lock:
+            if printer_name is None:
+                self.capabilities.clear()
+                self.devmodes.clear()
+                self.driver_signatures.clear()
+                return
+            self.capabilities.pop(printer_name, None)
+            self.driver_signatures.pop(printer_name, None)
+            for key in [key for key in self.devmodes if key[0] == printer_name]:
+                del self.devmodes[key]
+
+    def _check_driver_signature(self, printer_name: str, info: Dict) -> None:
+        # 驱动或打印机默认设置被修改后，已缓存的 DEVMODE 模板不再可靠
+        devmode = info.get('pDevMode')
+        signature = (info.get('pDriverName'),)
+        if devmode is not None:
+            signature += (devmode.DriverVersion, devmode.Size, devmode.DriverExtra, devmode.Fields,
+                          devmode.PaperSize, devmode.Orientation, devmode.Duplex, devmode.Color,
+                          devmode.DefaultSource, devmode.PrintQuality, bytes(devmode.DriverData or b''))
+        previous = self.driver_signatures.get(printer_name)
+        if previous is not None and previous != signature:
+            self.invalidate(printer_name)
+        self.driver_signatures[printer_name] = signature
+
+    def enum_printers(self) -> List[str]:
+        flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
+        return [printer[2] for printer in win32print.EnumPrinters(flags)]
+
+    def get_default_printer(self) -> Optional[str]:
+        try:
+            return win32print.GetDefaultPrinter()
+        except Exception:
+            return None
+
+    def get_status(self, printer_name: str) -> int:
+        try:
+            handle = win32print.OpenPrinter(printer_name)
+            try:
+                info = win32print.GetPrinter(handle, 2)
+                # 状态轮询顺带检查驱动配置是否变化
+                self._check_driver_signature(printer_name, info)
+                return info['Status']
+            finally:
+                win32print.ClosePrinter(handle)
+        except Exception:
+            return PRINTER_STATUS_READY
+
+    def get_capabilities(self, printer_name: str) -> Dict[str, object]:
+        if printer_name in self.capabilities:
+            return self.capabilities[printer_name]
+
+        def capability(constant, default=None):
+            try:
+                return win32print.DeviceCapabilities(printer_name, '', constant)
+            except Exception:
+                return default
+
+        capabilities = {
+            'copies': capability(win32con.DC_COPIES, 1),
+            'collate': bool(capability(win32con.DC_COLLATE, 0)),
+            'duplex': bool(capability(win32con.DC_DUPLEX, 0)),
+            'color': bool(capability(win32con.DC_COLORDEVICE, 0)),
+            'ppm': capability(win32con.DC_PRINTRATEPPM, 0),
+            'papers': list(capability(win32con.DC_PAPERS, []) or []),
+        }
+        self.capabilities[printer_name] = capabilities
+        return capabilities
+
+    def build_devmode(self, printer_name: str, settings, native_copies: bool = False):
+        key = (printer_name, settings_key(settings, native_copies))
+        with self._cache_lock:
+            devmode = self.devmodes.get(key)
+        if devmode is not None:
+            return devmode
+
+        handle = win32print.OpenPrinter(printer_name)
+        try:
+            # 以打印机默认设置为模板，只修改副本
+            info = win32print.GetPrinter(handle, 2)
+            self._check_driver_signature(printer_name, info)
+            devmode = info['pDevMode']
+
+            if settings.paper_size in PAPER_SIZES:
+                devmode.PaperSize = PAPER_SIZES[settings.paper_size]
+                devmode.Fields |= win32con.DM_PAPERSIZE
+
+            if settings.orientation == "横向":
+                devmode.Orientation = win32con.DMORIENT_LANDSCAPE
+            else:
+                devmode.Orientation = win32con.DMORIENT_PORTRAIT
+            devmode.Fields |= win32con.DM_ORIENTATION
+
+            if settings.sides_option == "单面":
+                devmode.Duplex = win32con.DMDUP_SIMPLEX
+            elif settings.sides_option == "双面长边":
+                devmode.Duplex = win32con.DMDUP_VERTICAL
+            elif settings.sides_option == "双面短边":
+                devmode.Duplex = win32con.DMDUP_HORIZONTAL
+            devmode.Fields |= win32con.DM_DUPLEX
+
+            if settings.color_mode == "彩色":
+                devmode.Color = win32con.DMCOLOR_COLOR
+            else:
+                devmode.Color = win32con.DMCOLOR_MONOCHROME
+            devmode.Fields |= win32con.DM_COLOR
+
+            # 打印机支持时由驱动完成多份和逐份打印
+            if native_copies:
+                devmode.Copies = settings.copies
+                devmode.Collate = win32con.DMCOLLATE_TRUE if settings.collate else win32con.DMCOLLATE_FALSE
+                devmode.Fields |= win32con.DM_COPIES | win32con.DM_COLLATE
+            else:
+                devmode.Copies = 1
+
+            # 交给驱动校验并合并私有数据
+            win32print.DocumentProperties(0, handle, printer_name, devmode, devmode,
+                                          win32con.DM_IN_BUFFER | win32con.DM_OUT_BUFFER)
+            # OpenPrinter 会复制 DEVMODE，缓存的模板可以被多个任务共用
+            with self._cache_lock:
+                self.devmodes[key] = devmode
+            return devmode
+        finally:
+            win32print.ClosePrinter(handle)
+
+    def open_job(self, printer_name: str, doc_name: str, pages: int = 1,
+                 settings=None, native_copies: bool = False) -> PrintJob:
+        # 任务级 DEVMODE 通过 OpenPrinter 的 PRINTER_DEFAULTS 传入，只影响这个句柄提交的任务，
+        # 不需要管理员权限，同一台打印机上可以同时有不同设置的任务
+        defaults = {"DesiredAccess": win32print.PRINTER_ACCESS_USE}
+        if settings is not None:
+            defaults["pDevMode"] = self.build_devmode(printer_name, settings, native_copies)
+
+        handle = win32print.OpenPrinter(printer_name, defaults)
+        try:
+            job_id = win32print.StartDocPrinter(handle, 1, (doc_name, None, "RAW"))
+            try:
+                win32print.StartPagePrinter(handle)
+            except Exception:
+                win32print.EndDocPrinter(handle)
+                raise
+        except Exception:
+            win32print.ClosePrinter(handle)
+            raise
+        job = PrintJob(printer_name, doc_name, job_id, handle)
+        job.pages = pages
+        job.settings = settings
+        job.copies = settings.copies if settings is not None and native_copies else 1
+        return job
+
+    def write(self, job: PrintJob, data: bytes) -> int:
+        written = win32print.WritePrinter(job.handle, data)
+        job.bytes_written += written
+        return written
+
+    def close_job(self, job: PrintJob) -> None:
+        try:
+            try:
+                win32print.EndPagePrinter(job.handle)
+            finally:
+                win32print.EndDocPrinter(job.handle)
+        finally:
+            win32print.ClosePrinter(job.handle)
+            job.handle = None
+            job.closed_at = time.time()
+
+    def abort_job(self, job: PrintJob) -> None:
+        # 不能调用 EndDocPrinter，否则打印机会收到并打印不完整的 RAW 数据
+        try:
+            try:
+                win32print.AbortPrinter(job.handle)
+            except Exception:
+                win32print.SetJob(job.handle, job.job_id, 0, None, win32print.JOB_CONTROL_DELETE)
+        finally:
+            win32print.ClosePrinter(job.handle)
+            job.handle = None
+            job.closed_at = time.time()
+
+    def get_job_status(self, printer_name: str, job_id: int) -> Optional[int]:
+        handle = win32print.OpenPrinter(printer_name)
+        try:
+            return win32print.GetJob(handle, job_id, 1)['Status']
+        except Exception:
+            # 任务已从后台处理队列中移除
+            return None
+        finally:
+            win32print.ClosePrinter(handle)
+
+    def get_job_statuses(self, printer_name: str) -> Dict[int, int]:
+        handle = win32print.OpenPrinter(printer_name)
+        try:
+            return {job['JobId']: job['Status'] for job in win32print.EnumJobs(handle, 0, _MAX_ENUM_JOBS, 1)}
+        finally:
+            win32print.ClosePrinter(handle)
+
+
+class FileSinkBackend(PrintBackend):
+    """本地模拟打印机：任务写入目录，可配置模拟延迟和每分钟页数"""
+
+    def __init__(self, spool_dir: str, printers: Optional[List[str]] = None,
+                 latency: float = 0.0, pages_per_minute: float = 0.0,
+                 max_copies: int = 1, collate: bool = False):
+        self.spool_dir = spool_dir
+        self.printers = list(printers or ["本地模拟打印机"])
+        self.latency = latency  # 每个任务的后台处理/驱动准备耗时(秒)
+        self.pages_per_minute = pages_per_minute  # 0 表示不模拟出纸耗时
+        self.max_copies = max_copies  # 模拟的硬件多份打印能力
+        self.collate = collate
+        self.statuses: Dict[str, int] = {name: PRINTER_STATUS_READY for name in self.printers}
+        self.job_statuses: Dict[int, int] = {}
+        self.job_printers: Dict[int, str] = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # 同一台打印机同一时间只能输出一个任务
+        self._device_locks = {name: threading.Lock() for name in self.printers}
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def enum_printers(self) -> List[str]:
+        return list(self.printers)
+
+    def get_default_printer(self) -> Optional[str]:
+        return self.printers[0] if self.printers else None
+
+    def get_status(self, printer_name: str) -> int:
+        return self.statuses.get(printer_name, PRINTER_STATUS_OFFLINE)
+
+    def set_status(self, printer_name: str, status: int):
+        self.statuses[printer_name] = status
+
+    def get_capabilities(self, printer_name: str) -> Dict[str, object]:
+        return {
+            'copies': self.max_copies,
+            'collate': self.collate,
+            'duplex': True,
+            'color': True,
+            'ppm': int(self.pages_per_minute),
+            'papers': list(PAPER_SIZES.values()),
+        }
+
+    def open_job(self, printer_name: str, doc_name: str, pages: int = 1,
+                 settings=None, native_copies: bool = False) -> PrintJob:
+        if printer_name not in self.statuses:
+            raise OSError(f"打印机不存在: {printer_name}")
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            job_id = next(self._job_ids)
+            self.job_statuses[job_id] = JOB_STATUS_SPOOLING
+            self.job_printers[job_id] = printer_name
+
+        printer_dir = os.path.join(self.spool_dir, _safe_name(printer_name))
+        os.makedirs(printer_dir, exist_ok=True)
+        path = os.path.join(printer_dir, f"{job_id:06d}_{_safe_name(doc_name)}.prn")
+        job = PrintJob(printer_name, doc_name, job_id, open(path, 'wb'))
+        job.pages = pages
+        job.settings = settings
+        job.copies = settings.copies if settings is not None and native_copies else 1
+        job.path = path
+        return job
+
+    def write(self, job: PrintJob, data: bytes) -> int:
+        written = job.handle.write(data)
+        job.bytes_written += written
+        return written
+
+    def close_job(self, job: PrintJob) -> None:
+        job.handle.close()
+        job.handle = None
+        self.job_statuses[job.job_id] = JOB_STATUS_PRINTING
+
+        # 模拟出纸，close_job 阻塞到该任务打印完成
+        if self.pages_per_minute:
+            with self._device_locks[job.printer_name]:
+                time.sleep(job.pages * job.copies * 60.0 / self.pages_per_minute)
+
+        self.job_statuses[job.job_id] = JOB_STATUS_PRINTED
+        job.closed_at = time.time()
+
+    def abort_job(self, job: PrintJob) -> None:
+        job.handle.close()
+        job.handle = None
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+        self.job_statuses[job.job_id] = JOB_STATUS_DELETED
+        job.closed_at = time.time()
+
+    def get_job_status(self, printer_name: str, job_id: int) -> Optional[int]:
+        return self.job_statuses.get(job_id)
+
+    def get_job_statuses(self, printer_name: str) -> Dict[int, int]:
+        with self._lock:
+            return {job_id: status for job_id, status in self.job_statuses.items()
+                    if self.job_printers.get(job_id) == printer_name}
+
+
+def supports_native_copies(capabilities: Dict[str, object], copies: int, collate: bool) -> bool:
+    # DC_COPIES 给出驱动支持的最大份数，需要逐份打印时还要求 DC_COLLATE
+    if copies <= 1:
+        return False
+    if (capabilities.get('copies') or 1) < copies:
+        return False
+    return not collate or bool(capabilities.get('collate'))
+
+
+def spool_file(backend: PrintBackend, job: PrintJob, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               on_chunk=None) -> int:
+    # 分块把文件写入打印任务，内存占用只与块大小有关，与文件大小无关
+    # on_chunk(已发送字节数) 返回 False 时停止写入
+    sent = 0
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            _write_all(backend, job, view[:count])
+            sent += count
+            if on_chunk and on_chunk(sent) is False:
+                break
+    return sent
+
+
+def _write_all(backend: PrintBackend, job: PrintJob, data):
+    # WritePrinter 可能只写入部分数据
+    offset = 0
+    while offset < len(data):
+        written = backend.write(job, data[offset:])
+        if not written:
+            raise OSError("写入打印任务失败")
+        offset += written
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name)
+
+
+def create_backend() -> PrintBackend:
+    # 设置 PRINT_ALL_SPOOL_DIR 或没有 pywin32 时使用本地模拟打印机
+    spool_dir = os.environ.get("PRINT_ALL_SPOOL_DIR")
+    if spool_dir or win32print is None:
+        printers = os.environ.get("PRINT_ALL_SPOOL_PRINTERS")
+        return FileSinkBackend(
+            spool_dir or os.path.join(os.getcwd(), "spool"),
+            printers=printers.split(",") if printers else None,
+            latency=float(os.environ.get("PRINT_ALL_SPOOL_LATENCY", 0)),
+            pages_per_minute=float(os.environ.get("PRINT_ALL_SPOOL_PPM", 0)),
+            max_copies=int(os.environ.get("PRINT_ALL_SPOOL_MAX_COPIES", 1)),
+            collate=os.environ.get("PRINT_ALL_SPOOL_COLLATE") == "1",
+        )
+    return Win32PrintBackend()
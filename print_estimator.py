@@ -0,0 +1,71 @@
+from typing import Dict, List, Optional
+
+# 调度策略
+POLICY_FIFO = "fifo"  # 先到先打
+POLICY_SJF = "sjf"  # 短任务优先
+POLICY_EDF = "edf"  # 截止时间优先
+POLICY_NAMES = {POLICY_FIFO: "先到先打", POLICY_SJF: "短任务优先", POLICY_EDF: "截止时间优先"}
+
+# 驱动没有报告打印速度时使用的每分钟页数
+DEFAULT_PPM = 20.0
+# 新的观测值所占的权重
+EWMA_ALPHA = 0.3
+# 双面打印一页按这么多页的时间计算(翻面要额外走纸)
+DUPLEX_COST = 1.25
+# 每个任务固定的准备时间(传输、预热、出纸)，秒
+JOB_OVERHEAD_SECONDS = 5.0
+# 观测到的速度超出这个范围时认为是异常值(如打印机内存缓存了整个任务后立即返回)
+MIN_PPM, MAX_PPM = 0.5, 300.0
+
+
+def work_pages(pages: int, copies: int, sides_option: str) -> float:
+    # 折算成单面页数的工作量
+    work = max(1, pages) * max(1, copies)
+    return work * DUPLEX_COST if sides_option != "单面" else float(work)
+
+
+class ThroughputModel:
+    # 每台打印机的打印速度(页/分钟)：先用驱动报告的速度，之后按完成的任务用指数加权平均修正
+    def __init__(self):
+        self.rates: Dict[str, float] = {}
+        self.samples: Dict[str, int] = {}  # 参与修正的任务数
+
+    def seed(self, printer_name: str, driver_ppm: Optional[float]):
+        # 只在还没有速度时使用驱动的值，已经学到的速度优先
+        if printer_name not in self.rates:
+            self.rates[printer_name] = float(driver_ppm) if driver_ppm and driver_ppm > 0 else DEFAULT_PPM
+
+    def has_rate(self, printer_name: str) -> bool:
+        return printer_name in self.rates
+
+    def rate(self, printer_name: Optional[str] = None) -> float:
+        if printer_name in self.rates:
+            return self.rates[printer_name]
+        return sum(self.rates.values()) / len(self.rates) if self.rates else DEFAULT_PPM
+
+    def observe(self, printer_name: str, work: float, seconds: float):
+        # work: 折算后的页数；seconds: 打印机处理这个任务的时间(到打印机报告打印完为止，不是写完后台处理文件)
+        printing = seconds - JOB_OVERHEAD_SECONDS
+        if not printer_name or printing <= 0:
+            return
+        ppm = work * 60 / printing
+        if not MIN_PPM <= ppm <= MAX_PPM:
+            return
+        current = self.rates.get(printer_name)
+        self.rates[printer_name] = ppm if current is None else current + EWMA_ALPHA * (ppm - current)
+        self.samples[printer_name] = self.samples.get(printer_name, 0) + 1
+
+    def state(self) -> Dict[str, Dict]:
+        # 保存学到的速度，下次启动时继续使用
+        return {'rates': dict(self.rates), 'samples': dict(self.samples)}
+
+    def restore(self, state: Dict[str, Dict]):
+        self.rates.update(state.get('rates', {}))
+        self.samples.update(state.get('samples', {}))
+
+    def seconds(self, work: float, printer_name: Optional[str] = None) -> float:
+        return JOB_OVERHEAD_SECONDS + work * 60 / self.rate(printer_name)
+
+    def combined_rate(self, printers: List[str]) -> float:
+        # 打印机池的总速度
+        return sum(self.rate(name) for name in printers) if printers else self.rate()
@@ -0,0 +1,161 @@
+import os
+import threading
+from array import array
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from collation import pinyin_full, pinyin_initials
+
+# 全拼和首字母之间的分隔符，避免三元组跨越两个字段
+_SEPARATOR = "\x00"
+
+# 匹配程度，越小越靠前
+MATCH_PREFIX = 0  # 名称以搜索词开头
+MATCH_SUBSTRING = 1  # 名称包含搜索词
+MATCH_PINYIN_PREFIX = 2  # 拼音全拼或首字母以搜索词开头
+MATCH_PINYIN = 3  # 拼音全拼或首字母包含搜索词
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _append(index: Dict[str, array], keys, doc_id: int):
+    for key in keys:
+        postings = index.get(key)
+        if postings is None:
+            index[key] = array('I', (doc_id,))
+        else:
+            postings.append(doc_id)
+
+
+class SearchIndex:
+    # 文件名搜索索引：小写名称、拼音全拼、拼音首字母上的三元组倒排索引，
+    # 一两个字的搜索词用单字倒排索引，另外有扩展名索引
+    # 扫描线程写入、界面线程查询，用锁保护；删除只做标记，删除的多了再整体重建
+    # 倒排表用 array 保存，几百万个编号不会拖慢垃圾回收
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}  # 名称 -> 文档编号
+        self._names: Dict[int, str] = {}
+        self._folded: Dict[int, str] = {}  # 小写名称
+        self._spelled: Dict[int, str] = {}  # 全拼 + 分隔符 + 首字母，只有名称中有汉字的文档
+        self._grams: Dict[str, array] = {}
+        self._chars: Dict[str, array] = {}
+        self._extensions: Dict[str, array] = {}
+        self._next_id = 0
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, names: Iterable[str]):
+        # 已有的名称忽略；先在锁外计算拼音，锁内只更新索引
+        prepared = []
+        for name in names:
+            folded = name.casefold()
+            full = pinyin_full(folded)
+            spelled = full + _SEPARATOR + pinyin_initials(folded) if full != folded else None
+            prepared.append((name, folded, spelled))
+        with self._lock:
+            for name, folded, spelled in prepared:
+                if name in self._ids:
+                    continue
+                doc_id = self._next_id
+                self._next_id += 1
+                self._ids[name] = doc_id
+                self._names[doc_id] = name
+                self._folded[doc_id] = folded
+                if spelled is not None:
+                    self._spelled[doc_id] = spelled
+                self._index(doc_id, folded, spelled)
+
+    def _index(self, doc_id: int, folded: str, spelled: Optional[str]):
+        text = folded if spelled is None else folded + _SEPARATOR + spelled
+        _append(self._grams, _trigrams(text), doc_id)
+        _append(self._chars, set(text), doc_id)
+        ext = os.path.splitext(folded)[1]
+        if ext:
+            _append(self._extensions, (ext,), doc_id)
+
+    def remove(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                doc_id = self._ids.pop(name, None)
+                if doc_id is not None:
+                    del self._names[doc_id]
+                    del self._folded[doc_id]
+                    self._spelled.pop(doc_id, None)
+                    self._dead += 1
+            if self._dead > max(1000, len(self._names)):
+                self._rebuild()
+
+    def rename(self, old_name: str, new_name: str):
+        self.remove([old_name])
+        self.add([new_name])
+
+    def _rebuild(self):
+        # 去掉已删除文档留下的编号
+        self._grams = {}
+        self._chars = {}
+        self._extensions = {}
+        for doc_id, folded in self._folded.items():
+            self._index(doc_id, folded, self._spelled.get(doc_id))
+        self._dead = 0
+
+    def search(self, query: str) -> Dict[str, int]:
+        # 返回 名称 -> 匹配程度(各搜索词之和，越小越靠前)；多个搜索词之间是"并且"的关系，
+        # 以 "." 开头的词(如 ".pdf")只匹配扩展名
+        terms = query.casefold().split()
+        ext_terms = [term for term in terms if term.startswith(".") and len(term) > 1]
+        text_terms = sorted((term for term in terms if term not in ext_terms), key=len, reverse=True)
+        if not terms:
+            return {}
+
+        with self._lock:
+            restrict: Optional[Set[int]] = None
+            for ext in ext_terms:
+                ids = set(self._extensions.get(ext, ()))
+                restrict = ids if restrict is None else restrict & ids
+            scores: Optional[Dict[int, int]] = None
+            for term in text_terms:
+                term_scores = self._match(term, restrict)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc_id: score + scores[doc_id] for doc_id, score in term_scores.items()}
+                restrict = scores.keys()
+            if scores is None:
+                scores = dict.fromkeys(restrict, MATCH_PREFIX)
+            names = self._names
+            return {names[doc_id]: score for doc_id, score in scores.items() if doc_id in names}
+
+    def _match(self, term: str, restrict) -> Dict[int, int]:
+        # 先用倒排表缩小范围(取最短的两个求交集)，再批量确认并分出匹配程度
+        index, keys = (self._grams, _trigrams(term)) if len(term) >= 3 else (self._chars, set(term))
+        postings = []
+        for key in keys:
+            ids = index.get(key)
+            if ids is None:
+                return {}
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        if len(postings) > 1:
+            candidates.intersection_update(postings[1])
+        if restrict is not None:
+            candidates.intersection_update(restrict)
+
+        folded = self._folded
+        spelled = self._spelled
+        in_name = {doc_id for doc_id in candidates if term in folded.get(doc_id, "")}
+        in_spelled = {doc_id for doc_id in (candidates - in_name).intersection(spelled)
+                      if term in spelled[doc_id]}
+        initial = _SEPARATOR + term
+        scores = dict.fromkeys(in_spelled, MATCH_PINYIN)
+        scores.update(dict.fromkeys((doc_id for doc_id in in_spelled
+                                     if spelled[doc_id].startswith(term) or initial in spelled[doc_id]),
+                                    MATCH_PINYIN_PREFIX))
+        scores.update(dict.fromkeys(in_name, MATCH_SUBSTRING))
+        scores.update(dict.fromkeys((doc_id for doc_id in in_name if folded[doc_id].startswith(term)),
+                                    MATCH_PREFIX))
+        return scores
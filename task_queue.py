@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, Generic, Hashable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T', bound=Hashable)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_NAMES = {PRIORITY_HIGH: "高", PRIORITY_NORMAL: "普通", PRIORITY_LOW: "低"}
+
+# 每低一级优先级相当于晚到这么多秒：低优先级的任务等得足够久以后会排到新来的高优先级任务前面，
+# 不会一直等下去；排序值在入队时算好，不需要定时调整
+AGING_SECONDS = 300.0
+
+# 已取消的条目超过这个数量并且多于有效条目时重建堆
+_COMPACT_THRESHOLD = 1000
+
+_REMOVED = object()
+
+
+def aging_rank(item, priority: int, enqueued: float) -> float:
+    return enqueued + priority * AGING_SECONDS
+
+
+class TaskQueue(Generic[T]):
+    # 等待中的任务：按排序值组织的堆，另有 任务 -> 堆条目 的索引
+    # 入队、出队 O(log n)；取消只把条目标记为无效(O(1))，出队时跳过
+    # 堆条目: [(是否普通排序, 排序值), 序号, 任务, 优先级, 入队时间]，序号保证排序值相同时先到先出
+    def __init__(self, rank: Callable[[T, int, float], object] = aging_rank):
+        self.rank = rank
+        self._heap: List[list] = []
+        self._entries: Dict[T, list] = {}
+        self._seq = itertools.count()
+        self._pinned = itertools.count()  # 移到最前的任务，后移的排在更前面
+        self._removed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __contains__(self, item: T):
+        return item in self._entries
+
+    def push(self, item: T, priority: int = PRIORITY_NORMAL, enqueued: Optional[float] = None):
+        if item in self._entries:
+            self.remove(item)
+        enqueued = time.time() if enqueued is None else enqueued
+        self._push(item, (1, self.rank(item, priority, enqueued)), priority, enqueued)
+
+    def _push(self, item: T, order, priority: int, enqueued: float):
+        entry = [order, next(self._seq), item, priority, enqueued]
+        self._entries[item] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self) -> Optional[T]:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            item = entry[2]
+            if item is not _REMOVED:
+                del self._entries[item]
+                return item
+            self._removed -= 1
+        return None
+
+    def peek(self) -> Optional[T]:
+        while self._heap and self._heap[0][2] is _REMOVED:
+            heapq.heappop(self._heap)
+            self._removed -= 1
+        return self._heap[0][2] if self._heap else None
+
+    def remove(self, item: T) -> bool:
+        entry = self._entries.pop(item, None)
+        if entry is None:
+            return False
+        entry[2] = _REMOVED
+        self._removed += 1
+        if self._removed > _COMPACT_THRESHOLD and self._removed > len(self._entries):
+            self._heap = [entry for entry in self._heap if entry[2] is not _REMOVED]
+            heapq.heapify(self._heap)
+            self._removed = 0
+        return True
+
+    def move_to_front(self, item: T) -> bool:
+        entry = self._entries.get(item)
+        if entry is None:
+            return False
+        _, _, _, priority, enqueued = entry
+        self.remove(item)
+        self._push(item, (0, -next(self._pinned)), priority, enqueued)
+        return True
+
+    def set_priority(self, item: T, priority: int) -> bool:
+        # 保留原来的入队时间，已经等待的时间继续计入
+        entry = self._entries.get(item)
+        if entry is None:
+            return False
+        priority = min(max(priority, PRIORITY_HIGH), PRIORITY_LOW)
+        enqueued = entry[4]
+        self.remove(item)
+        self._push(item, (1, self.rank(item, priority, enqueued)), priority, enqueued)
+        return True
+
+    def priority(self, item: T) -> Optional[int]:
+        entry = self._entries.get(item)
+        return entry[3] if entry else None
+
+    def rerank(self):
+        # 排序规则变化后重新计算所有排序值，O(n)；移到最前的任务保持在最前
+        self._heap = [entry for entry in self._heap if entry[2] is not _REMOVED]
+        for entry in self._heap:
+            if entry[0][0]:
+                entry[0] = (1, self.rank(entry[2], entry[3], entry[4]))
+        heapq.heapify(self._heap)
+        self._removed = 0
+
+    def ordered(self, limit: Optional[int] = None) -> List[T]:
+        # 按出队顺序列出任务，只需要前几个时用 limit，不必对整个队列排序
+        entries = self._entries.values()
+        entries = sorted(entries) if limit is None else heapq.nsmallest(limit, entries)
+        return [entry[2] for entry in entries]
+
+    def __iter__(self) -> Iterator[T]:
+        # 不保证顺序
+        return iter(list(self._entries))